@@ -1,5 +1,4 @@
 from typing import Optional
-import numpy as np
 
 
 """
@@ -197,19 +196,23 @@ class AbsoluteAddressing(Addressing):
 
     @classmethod
     def get_address(cls, cpu, data_bytes: bytes) -> Optional[int]:
-        return np.uint16(int.from_bytes(data_bytes, byteorder='little') + cls.get_offset(cpu))
+        base = int.from_bytes(data_bytes, byteorder='little')
+        address = (base + cls.get_offset(cpu)) & 0xFFFF
+        if (base ^ address) & 0xFF00:
+            cpu.cycles += cls.page_cross_cycles
+        return address
 
 
 class XRegOffset(object):
     @classmethod
     def get_offset(cls, cpu):
-        return np.uint16(cpu.x_reg)
+        return cpu.x_reg
 
 
 class YRegOffset(object):
     @classmethod
     def get_offset(cls, cpu):
-        return np.uint16(cpu.y_reg)
+        return cpu.y_reg
 
 
 class AbsoluteAddressingXOffset(XRegOffset, AbsoluteAddressing):
@@ -242,9 +245,8 @@ class ZeroPageAddressing(Addressing):
 
     @classmethod
     def get_address(cls, cpu, data_bytes: bytes) -> Optional[int]:
-        address = np.uint8(int.from_bytes(data_bytes, byteorder='little') + cls.get_offset(cpu))
-        # check for overflow
-        return address
+        # wrap around inside the zero page
+        return (int.from_bytes(data_bytes, byteorder='little') + cls.get_offset(cpu)) & 0xFF
 
 
 class ZeroPageAddressingWithX(XRegOffset, ZeroPageAddressing):
@@ -271,24 +273,25 @@ class RelativeAddressing(Addressing):
         current_address = cpu.pc_reg
 
         # offset by value in instructions, signed 8 bit vlalue
-        return current_address + np.int8(int.from_bytes(data_bytes, byteorder='little'))
+        offset = data_bytes[0]
+        if offset & 0x80:
+            offset -= 0x100
+        return (current_address + offset) & 0xFFFF
 
 
 class IndirectBase(Addressing):
     @classmethod
     def get_address(cls, cpu, data_bytes: bytes):
         # look up the bytes at [original_address, original_address + 1]
-        lsb_location = np.uint16(super().get_address(cpu, data_bytes))
-        msb_location = np.uint16(lsb_location + 1)
+        lsb_location = super().get_address(cpu, data_bytes)
 
         # wrap around on page boundaries
-        if msb_location % 0x100 == 0:
-            msb_location = np.uint16(lsb_location - 0xFF)
+        msb_location = (lsb_location & 0xFF00) | ((lsb_location + 1) & 0xFF)
 
         lsb = cpu.get_memory(lsb_location)
         msb = cpu.get_memory(msb_location)
 
-        return np.uint16(int.from_bytes(bytes([lsb, msb]), byteorder='little'))
+        return (msb << 8) | lsb
 
 
 class IndirectAddressing(IndirectBase, AbsoluteAddressing):
@@ -309,5 +312,9 @@ class IndirectAddressingWithY(IndirectBase, ZeroPageAddressing):
     """
     @classmethod
     def get_address(cls, cpu, data_bytes: bytes):
-        return super().get_address(cpu, data_bytes) + cpu.y_reg
+        base = super().get_address(cpu, data_bytes)
+        address = (base + cpu.y_reg) & 0xFFFF
+        if (base ^ address) & 0xFF00:
+            cpu.cycles += cls.page_cross_cycles
+        return address
 
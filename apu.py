@@ -1,14 +1,55 @@
-from typing import List
+from typing import Callable, List, Optional
 
 from memory_owner import MemoryOwnerMixin
 
+OAMDMA = 0x4014
+
 
 class APU(MemoryOwnerMixin, object):
     memory_start_location = 0x4000
     memory_end_location = 0x401F
 
+    # struct format of get_state, for save states
+    state_format = 'Q32B'
+
     def __init__(self):
         self.memory = [0] * 0x20  # type: List[int]
 
+        # cpu cycles run since power up
+        self.cycles = 0
+
+        # called with the page written to $4014, see NES.oam_dma
+        self.oam_dma = None  # type: Optional[Callable[[int], None]]
+
+    def get_state(self) -> tuple:
+        return (self.cycles,) + tuple(self.memory)
+
+    def set_state(self, state: tuple):
+        self.cycles = state[0]
+        self.memory[:] = state[1:]
+
     def get_memory(self) -> List[int]:
         return self.memory
+
+    def get(self, position: int, size: int=1):
+        # the bus hands over the whole $40xx page, only the registers up to $401F are here
+        if position > self.memory_end_location:
+            raise Exception('Cannot find memory owner')
+        return super().get(position, size)
+
+    def set(self, position: int, value: int, size: int=1):
+        if position > self.memory_end_location:
+            raise Exception('Cannot find memory owner')
+        if position == OAMDMA and self.oam_dma is not None:
+            self.oam_dma(value)
+        super().set(position, value, size)
+
+    def read_has_side_effects(self, position: int) -> bool:
+        # reading the controllers shifts the next button in
+        return position in (0x4016, 0x4017)
+
+    def run(self, cycles: int):
+        """
+        advance by cycles, there is no sound output so this only keeps time
+        """
+        self.cycles += cycles
@@ -0,0 +1,37 @@
+import argparse
+import timeit
+
+from nes import NES
+from rom import ROM
+
+
+def make_rom() -> ROM:
+    """
+    128KB MMC1 board with chr ram, running JMP $C000
+    """
+    prg = bytearray(0x20000)
+    prg[0x1C000:0x1C003] = bytes([0x4C, 0x00, 0xC0])
+    prg[0x1FFFC:0x1FFFE] = bytes([0x00, 0xC0])
+    return ROM(b'NES\x1a\x08\x00\x10' + bytes(9) + bytes(prg))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Save state benchmark.')
+    parser.add_argument('rom_path', nargs='?', help='path to nes rom, a small MMC1 rom without one')
+    parser.add_argument('--count', type=int, default=20000, help='snapshots to take and restore')
+    args = parser.parse_args()
+
+    nes = NES(ROM.from_file(args.rom_path) if args.rom_path else make_rom())
+    nes.run_frame()
+    buffer = nes.save_state()
+
+    save_time = timeit.timeit(lambda: nes.save_state(buffer), number=args.count)
+    load_time = timeit.timeit(lambda: nes.load_state(buffer), number=args.count)
+
+    print('state size: {} bytes'.format(len(buffer)))
+    print('save: {:.0f} snapshots/s'.format(args.count / save_time))
+    print('load: {:.0f} restores/s'.format(args.count / load_time))
+
+
+if __name__ == '__main__':
+    main()
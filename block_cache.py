@@ -0,0 +1,186 @@
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from addressing import ImmediateReadAddressing, ImpliedAddressing, AccumulatorAdressing, ZeroPageAddressing, \
+    ZeroPageAddressingWithX, ZeroPageAddressingWithY, AbsoluteAddressing
+from instructions.base_instructions import BranchSet, BranchClear, Jmp, Jsr, Rts, Rti, Ld, Compare, Bit, And, Ora, Eor, Nop, \
+    SetBit, ClearBit, RegisterModifier
+
+# instructions that never write memory, an idle loop is made of nothing else
+IDLE_INSTRUCTIONS = (Ld, Compare, Bit, And, Ora, Eor, Nop, SetBit, ClearBit, RegisterModifier, BranchSet, BranchClear)
+
+# addressing that can only read ram
+ZERO_PAGE_ADDRESSING = (ImmediateReadAddressing, ImpliedAddressing, AccumulatorAdressing, ZeroPageAddressing,
+                        ZeroPageAddressingWithX, ZeroPageAddressingWithY)
+
+
+class Block(object):
+    """
+    a straight line run of decoded instructions, ending at the first one that changes the flow of the program
+    each entry holds the opcode, its data bytes and the pc reg after it
+    """
+    def __init__(self, start: int, instructions: List[Tuple['cpu.Opcode', bytes, int]], writable: bool):
+        self.start = start
+        self.instructions = instructions
+
+        # where each instruction starts, and the most cycles the block can take
+        self.addresses = {start} | {next_pc_reg for _, _, next_pc_reg in instructions[:-1]}  # type: Set[int]
+        self.pages = {start >> 8, ((instructions[-1][2] - 1) & 0xFFFF) >> 8}  # type: Set[int]
+        self.max_cycles = sum(opcode.cycles + opcode.instruction.page_cross_cycles +
+                              (2 if issubclass(opcode.instruction, (BranchSet, BranchClear)) else 0)
+                              for opcode, _, _ in instructions)
+
+        # decoded from memory the program can write to, so it has to be dropped once that memory changes
+        self.writable = writable
+        self.valid = True
+
+        # how often the block ran, and the recompiled function once it got hot
+        self.executions = 0
+        self.compiled = None  # type: Optional[Callable[['cpu.CPU'], int]]
+
+        # jumps back to its own start without writing anything, see BlockCache.is_idle_loop
+        self.idle = False
+
+
+class BlockCache(object):
+    """
+    decodes each block once and keeps it, keyed by start pc and the physical page (the bank) it was decoded from
+    blocks decoded from writable memory are dropped on the first write to their page, so self modifying
+    code is decoded again
+    """
+    max_block_length = 64
+
+    def __init__(self, cpu: 'cpu.CPU'):
+        self.cpu = cpu
+        self.blocks = {}  # type: Dict[int, Block]
+
+        # blocks decoded from each watched (owner, physical page)
+        self.page_blocks = {}  # type: Dict[Tuple[object, int], List[Block]]
+
+        # the block the cpu is running, a bank switch under it has to end it
+        self.running = None  # type: Optional[Block]
+
+    def clear(self):
+        for blocks in self.page_blocks.values():
+            for block in blocks:
+                block.valid = False
+        self.blocks = {}
+        self.page_blocks = {}
+        self.running = None
+
+    def lookup(self, pc: int) -> Block:
+        """
+        the decoded block starting at pc
+        """
+        block = self.blocks.get((self.cpu.bus.physical_pages[pc >> 8] << 16) | pc)
+        if block is None:
+            block = self.decode(pc)
+        return block
+
+    def decode(self, pc: int) -> Block:
+        """
+        decode the instructions from pc up to the end of the block,
+        stopping early rather than running into the next page
+        """
+        cpu = self.cpu
+        bus = cpu.bus
+        page = pc >> 8
+
+        instructions = []
+        location = pc
+        in_page = True
+        while True:
+            opcode = cpu.opcodes[cpu.get_memory(location)]
+            end = location + opcode.data_length
+            if end >> 8 != page:
+                if instructions:
+                    break
+                in_page = False
+            data_bytes = bytes([cpu.get_memory(l & 0xFFFF) for l in range(location + 1, end + 1)])
+            location = (end + 1) & 0xFFFF
+            instructions.append((opcode, data_bytes, location))
+            if opcode.instruction.ends_block or len(instructions) >= self.max_block_length or location >> 8 != page:
+                break
+
+        # only blocks held in a single buffered page can be kept, anything else is decoded every time
+        writable = bus.write_pages[page] is not None or bus.watched[page]
+        block = Block(pc, instructions, writable)
+        block.idle = self.is_idle_loop(block)
+        if bus.read_pages[page] is None or not in_page:
+            return block
+
+        self.blocks[(bus.physical_pages[page] << 16) | pc] = block
+        if writable:
+            key = (bus.owners[page], bus.physical_pages[page])
+            if key not in self.page_blocks:
+                self.page_blocks[key] = []
+                bus.watch_writes(page, self.invalidate_page)
+            self.page_blocks[key].append(block)
+        return block
+
+    def invalidate_page(self, page: int):
+        """
+        drop every block decoded from the memory shown at a page
+        """
+        bus = self.cpu.bus
+        for block in self.page_blocks.pop((bus.owners[page], bus.physical_pages[page]), []):
+            block.valid = False
+            self.blocks.pop((bus.physical_pages[page] << 16) | block.start, None)
+
+    def remap_page(self, page: int):
+        """
+        refresh a page of the bus after the mapper switched its bank
+        the running block ends when the switch replaced the rest of it, and is decoded again the next time round
+        """
+        bus = self.cpu.bus
+        block = self.running
+        if block is not None and block.valid and page in block.pages:
+            block.valid = False
+            key = (bus.physical_pages[block.start >> 8] << 16) | block.start
+            if self.blocks.get(key) is block:
+                del self.blocks[key]
+        bus.remap_page(page)
+
+    def invalidate_writable(self):
+        """
+        drop every block decoded from writable memory, for when it was overwritten behind the bus, e.g. a save state
+        """
+        bus = self.cpu.bus
+        for (owner, physical_page), blocks in self.page_blocks.items():
+            for block in blocks:
+                block.valid = False
+                self.blocks.pop((physical_page << 16) | block.start, None)
+            bus.cancel_watch(owner, physical_page, self.invalidate_page)
+        self.page_blocks = {}
+
+    def is_idle_loop(self, block: Block) -> bool:
+        """
+        whether the block loops back to its start without writing memory, and only reads memory that reads the
+        same every time until something outside the cpu changes it
+        run one iteration of such a loop that leaves the registers as they were, and every following iteration
+        does the same until the next event
+        """
+        opcode, data_bytes, next_pc_reg = block.instructions[-1]
+        instruction = opcode.instruction
+        if issubclass(instruction, (BranchSet, BranchClear)):
+            offset = data_bytes[0] - 0x100 if data_bytes[0] & 0x80 else data_bytes[0]
+            target = (next_pc_reg + offset) & 0xFFFF
+        elif issubclass(instruction, Jmp) and not issubclass(instruction, (Jsr, Rts, Rti)) and \
+                opcode.addressing is AbsoluteAddressing:
+            target = int.from_bytes(data_bytes, byteorder='little')
+        else:
+            return False
+        if target != block.start:
+            return False
+
+        bus = self.cpu.bus
+        for opcode, data_bytes, _ in block.instructions[:-1]:
+            if not issubclass(opcode.instruction, IDLE_INSTRUCTIONS):
+                return False
+            if opcode.addressing in ZERO_PAGE_ADDRESSING:
+                continue
+            if opcode.addressing is not AbsoluteAddressing:
+                return False
+            location = int.from_bytes(data_bytes, byteorder='little')
+            if bus.read_pages[location >> 8] is None and bus.owners[location >> 8].read_has_side_effects(location):
+                return False
+        return True
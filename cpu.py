@@ -1,12 +1,21 @@
+from enum import Enum, IntFlag
+from typing import Callable, Dict, List, NamedTuple, Optional, Type
+import copy
+
+from addressing import Addressing, ImpliedAddressing
 from apu import APU
-from instructions.generic_instruction import Instruction
+from block_cache import Block, BlockCache
+from instructions.generic_instruction import Instruction, UndefinedInstruction
+from jit import Recompiler
+from memory_bus import MemoryBus
 from memory_owner import MemoryOwnerMixin
 from ppu import PPU
 from ram import RAM
 from rom import ROM
+from scheduler import Scheduler
 from status import Status
+from tracing import TraceSink
 
-import numpy as np
 
 import instructions.instructions as i_file
 import instructions.jump_instructions as j_file
@@ -19,7 +28,64 @@ import instructions.arithmetic_instructions as a_file
 import instructions.combination_instructions as c_file
 
 
+class Opcode(NamedTuple):
+    """
+    a slot of the dispatch table, everything needed to run one opcode
+    """
+    instruction: Type[Instruction]
+    execute: Callable
+    data_length: int
+    cycles: int
+    addressing: Type[Addressing]
+    # the byte the slot is fetched for, undefined opcodes share an instruction but not this
+    identifier_byte: int
+
+    @classmethod
+    def from_instruction(cls, instruction: Type[Instruction], identifier_byte: int) -> 'Opcode':
+        # the most derived addressing mode the instruction was built with
+        addressing = next((c for c in instruction.__mro__
+                           if issubclass(c, Addressing) and not issubclass(c, Instruction) and c is not Addressing),
+                          ImpliedAddressing)
+        return cls(instruction, instruction.execute, instruction.data_length, instruction.cycles, addressing,
+                   identifier_byte)
+
+
+class StopReason(Enum):
+    cycles = 0
+    pc = 1
+    instructions = 2
+
+
+class IrqSource(IntFlag):
+    """
+    the devices sharing the irq line, it stays asserted while any of them holds it
+    the apu frame counter and dmc irqs are not modelled, the apu only keeps time
+    """
+    mapper = 4
+
+
+class RunResult(NamedTuple):
+    """
+    why CPU.run returned and how far it got
+    """
+    reason: StopReason
+    cycles: int
+    instructions: int
+    pc_reg: int
+
+
 class CPU:
+    # interrupts jump to the address stored at their vector, BRK shares the irq one
+    NMI_VECTOR = 0xFFFA
+    RESET_VECTOR = 0xFFFC
+    IRQ_VECTOR = 0xFFFE
+
+    # cycles taken to push the pc and status and fetch a vector
+    INTERRUPT_CYCLES = 7
+
+    # struct format of get_state, for save states
+    state_format = '4BHB?BQ'
+
     def __init__(self, ram: RAM, ppu: PPU, apu: APU):
         # status registers: store a single byte
         self.status_reg = None  # type: Status
@@ -36,29 +102,53 @@ class CPU:
         # program counter stores current execution point
         self.running = False
 
+        # cpu cycles run since start up
+        self.cycles = 0
+
+        # timed events of the other devices, run checks for them only when the next one is due
+        self.scheduler = Scheduler()
+
+        # the nmi is edge triggered and latched until serviced, the irq line is level triggered
+        self.nmi_pending = False
+        self.irq_sources = IrqSource(0)
+        self.interrupt_pending = False
+
         self.rom = None  # type: ROM
         self.ram = ram
         self.ppu = ppu
         self.apu = apu
 
-        self.memory_owners = [  # type: List[MemoryOwnerMixin]
-            self.ram,
-            self.ppu,
-            self.apu,
-        ]
+        # every memory access goes through the page table of the bus
+        self.bus = MemoryBus()
+        self.bus.map_owner(self.ram)
+        self.bus.map_owner(self.ppu)
+        self.bus.map_owner(self.apu)
 
         self.instruction = None
         self.data_bytes = None
 
-        # create the instructions that cpu can interpret
-        instructions_list = self._find_instructions(Instruction)
-        self.instructions = {}
-        for instruction in instructions_list:
-            if instruction in self.instructions:
-                raise Exception('Duplicate instruction identifier bytes')
-            self.instructions[instruction.identifier_byte] = instruction
+        # create the dispatch table of the instructions that cpu can interpret, indexed by opcode
+        # opcodes without an instruction get the undefined instruction trap
+        self.opcodes = [Opcode.from_instruction(UndefinedInstruction, identifier_byte)
+                        for identifier_byte in range(0x100)]  # type: List[Opcode]
+        for instruction in self._find_instructions(Instruction):
+            identifier_byte = instruction.identifier_byte[0]
+            self.opcodes[identifier_byte] = Opcode.from_instruction(instruction, identifier_byte)
+        # nothing identified yet, an undefined opcode stands in
+        self.opcode = self.opcodes[0x02]
+
+        # decoded straight line runs of instructions, replayed by execute_block
+        self.block_cache = BlockCache(self)
+
+        # hot blocks are recompiled into python functions, switch off to only use the interpreter
+        self.recompiler = Recompiler(self)
+        self.jit_enabled = True
+
+        # jump over the iterations of loops that only wait for something outside the cpu to happen
+        self.skip_idle_loops = True
 
-        self.stack =[]
+        # gets every instruction before it runs when set, see tracing
+        self.tracer = None  # type: Optional[TraceSink]
 
         # These instructions are implied mode, have a length of one byte and require machine cycles as indicated.
         # The "PuLl" operations are known as "POP" on most other microprocessors. With the 6502, the stack is always
@@ -66,6 +156,37 @@ class CPU:
         # http://www.6502.org/tutorials/6502opcodes.html
         self.stack_offset = 0x100
 
+    def get_state(self) -> tuple:
+        return (self.a_reg, self.x_reg, self.y_reg, self.sp_reg, self.pc_reg, self.status_reg.to_int(),
+                self.nmi_pending, self.irq_sources, self.cycles)
+
+    def set_state(self, state: tuple):
+        self.a_reg, self.x_reg, self.y_reg, self.sp_reg, self.pc_reg, status, self.nmi_pending, irq_sources, \
+            self.cycles = state
+        # the status is changed in place, run holds on to it
+        self.status_reg.from_int(status, [])
+        self.irq_sources = IrqSource(irq_sources)
+        self.interrupt_pending = self.nmi_pending or bool(self.irq_sources)
+
+    def fork(self, owners: Dict[MemoryOwnerMixin, MemoryOwnerMixin]) -> 'CPU':
+        """
+        a copy of the cpu and its registers driving the copies of its memory owners in owners,
+        the dispatch table is shared, the events are left to be scheduled again and blocks are decoded again
+        """
+        cpu = copy.copy(self)
+        cpu.ram, cpu.ppu, cpu.apu, cpu.rom = (owners.get(owner, owner)
+                                              for owner in (self.ram, self.ppu, self.apu, self.rom))
+        cpu.status_reg = copy.copy(self.status_reg)
+        cpu.scheduler = Scheduler()
+        cpu.bus = self.bus.fork(owners)
+        cpu.block_cache = BlockCache(cpu)
+        cpu.recompiler = Recompiler(cpu)
+        cpu.tracer = None
+        if cpu.rom is not None:
+            cpu.rom.mapper.remap_page = cpu.block_cache.remap_page
+            cpu.rom.mapper.irq = cpu.set_mapper_irq
+        return cpu
+
     def start_up(self):
         """
         set the initial values of cpu registers
@@ -76,51 +197,67 @@ class CPU:
         $4017: 0 (sound chanel disabled)
         $4015: 0 (frame IRQ disabled)
         $4000-$400F: 0 (sound registers) """
-        self.pc_reg = np.uint16(0)  # 2 bytes
+        self.pc_reg = 0  # 2 bytes
         self.status_reg = Status()
-        self.sp_reg = np.uint8(0xFD)
+        self.sp_reg = 0xFD
+        self.cycles = 0
+        self.scheduler.clear()
+        self.nmi_pending = False
+        self.irq_sources = IrqSource(0)
+        self.interrupt_pending = False
 
-        self.x_reg = np.uint8(0)
-        self.y_reg = np.uint8(0)
-        self.a_reg = np.uint8(0)
+        self.x_reg = 0
+        self.y_reg = 0
+        self.a_reg = 0
 
         # TODO memory sets
 
     def stack_push(self, data_to_push: int, num_bytes: int = 1):
-        self.set_memory(self.stack_offset + self.sp_reg, data_to_push, num_bytes)
-        self.increase_stack_size(num_bytes)
-        self.stack.append(hex(data_to_push))
-        print('stack push: ', self.stack)
+        """
+        push a byte, or a short high byte first, the stack pointer wraps around page one
+        """
+        if num_bytes == 2:
+            self.set_memory(self.stack_offset + self.sp_reg, data_to_push >> 8)
+            self.increase_stack_size(1)
+        self.set_memory(self.stack_offset + self.sp_reg, data_to_push & 0xFF)
+        self.increase_stack_size(1)
 
     def stack_pop(self, num_bytes: int = 1):
-        self.decrease_stack_size(num_bytes)
-        if self.stack.__len__() > 0:
-            print('stack pop: ', self.stack.pop(), self.stack)
-        return self.get_memory(self.stack_offset + self.sp_reg, num_bytes)
-
-    def get_memory(self, location: int, num_bytes: int = 1) -> int:
         """
-        return a byte from a given memory location
+        pop a byte, or a short low byte first
         """
-        memory_owner = self._get_memory_owner(location)
-        return memory_owner.get(location, num_bytes)
+        self.decrease_stack_size(1)
+        value = self.get_memory(self.stack_offset + self.sp_reg)
+        if num_bytes == 2:
+            self.decrease_stack_size(1)
+            value |= self.get_memory(self.stack_offset + self.sp_reg) << 8
+        return value
 
-    def _get_memory_owner(self, location: int) -> MemoryOwnerMixin:
+    def get_memory(self, location: int, num_bytes: int = 1) -> int:
         """
-        return the owner of a memory location
+        return a byte, or a little endian short, from a given memory location
         """
-        for memory_owner in self.memory_owners:
-            if memory_owner.memory_start_location <= location <= memory_owner.memory_end_location:
-                return memory_owner
-
-        raise Exception('Cannot find memory owner')
+        page = self.bus.read_pages[location >> 8]
+        if page is not None:
+            value = page[location & 0xFF]
+        else:
+            value = self.bus.owners[location >> 8].get(location)
+        if num_bytes == 2:
+            value |= self.get_memory((location + 1) & 0xFFFF) << 8
+        return value
 
     def set_memory(self, location: int, value: int, num_bytes: int = 1):
         """
         sets the memory at a location to a value
         """
-        memory_owner = self._get_memory_owner(location)
-        memory_owner.set(location, value, num_bytes)
+        if num_bytes == 2:
+            self.set_memory((location + 1) & 0xFFFF, value >> 8)
+            value &= 0xFF
+        page = self.bus.write_pages[location >> 8]
+        if page is not None:
+            page[location & 0xFF] = value
+        else:
+            self.bus.write(location, value)
 
     def _find_instructions(self, cls):
         """
@@ -133,66 +270,225 @@ class CPU:
         """
         increase stack size by decreasing the stack pointer
         """
-        self.sp_reg -= np.uint8(size)
+        self.sp_reg = (self.sp_reg - size) & 0xFF
 
     def decrease_stack_size(self, size: int):
         """
         decrease stack size by decreasing the stack pointer
         """
-        self.sp_reg += np.uint8(size)
+        self.sp_reg = (self.sp_reg + size) & 0xFF
 
     def load_rom(self, rom: ROM, testing):
         # unload old rom
         if self.rom is not None:
-            self.memory_owners.remove(self.rom)
+            self.bus.unmap_owner(self.rom)
+            self.rom.mapper.remap_page = None
+            self.rom.mapper.irq = None
 
-        # load rom
+        # load the rom program instructions into memory, bank switches re-point the pages of the bus
         self.rom = rom
+        self.bus.map_owner(self.rom)
+        self.rom.mapper.remap_page = self.block_cache.remap_page
+        self.rom.mapper.irq = self.set_mapper_irq
+        self.block_cache.clear()
+
         if testing:
-            self.pc_reg = np.uint16(0xC000)
+            self.pc_reg = 0xC000
         else:
-            self.pc_reg = np.uint16(int.from_bytes(self.get_memory(0xFFFC, 2), byteorder='little'))
+            # start up leaves the registers as the power up reset sequence does, only the vector is left to fetch
+            self.pc_reg = self.get_memory(self.RESET_VECTOR, 2)
 
-        # load the rom program instructions into memory
-        self.memory_owners.append(self.rom)
+    def reset(self):
+        """
+        the reset sequence: three stack reads that move the stack pointer without writing,
+        the interrupt bit set and a jump through the reset vector
+        """
+        self.increase_stack_size(3)
+        self.status_reg.interrupt = True
+        self.pc_reg = self.get_memory(self.RESET_VECTOR, 2)
+        self.cycles += self.INTERRUPT_CYCLES
 
-    def identify(self):
-        identifier_byte = self._get_memory_owner(self.pc_reg).get(self.pc_reg)
+    def interrupt(self, vector: int, brk: bool = False):
+        """
+        push the pc reg and the status, with the break bit set only for BRK, set the interrupt bit and
+        jump to the address stored at vector
+        """
+        self.stack_push(self.pc_reg, 2)
+        status = self.status_reg.to_int() | 0b00100000
+        self.stack_push(status | 0b00010000 if brk else status & 0b11101111)
+        self.status_reg.interrupt = True
+        self.pc_reg = self.get_memory(vector, 2)
+
+    def trigger_nmi(self):
+        """
+        latch an nmi, it is serviced before the next instruction run
+        """
+        self.nmi_pending = True
+        self.interrupt_pending = True
+
+    def set_irq(self, source: IrqSource, asserted: bool = True):
+        """
+        assert or release the irq line for a source, it is serviced while asserted and the interrupt bit is clear
+        """
+        if asserted:
+            self.irq_sources |= source
+        else:
+            self.irq_sources &= ~source
+        self.interrupt_pending = self.nmi_pending or bool(self.irq_sources)
 
-        if isinstance(identifier_byte, np.uint8):
-            identifier_byte = bytes([identifier_byte])
+    def set_mapper_irq(self, asserted: bool):
+        self.set_irq(IrqSource.mapper, asserted)
 
-        self.instruction = self.instructions.get(identifier_byte, None)
+    def service_interrupts(self) -> bool:
+        """
+        take a pending nmi, or else an irq when it is not masked
+        returns whether one was taken
+        """
+        taken = False
+        if self.nmi_pending:
+            self.nmi_pending = False
+            self.interrupt(self.NMI_VECTOR)
+            taken = True
+        elif self.irq_sources and not self.status_reg.interrupt:
+            self.interrupt(self.IRQ_VECTOR)
+            taken = True
+        if taken:
+            self.cycles += self.INTERRUPT_CYCLES
+        self.interrupt_pending = self.nmi_pending or bool(self.irq_sources)
+        return taken
 
-        if self.instruction is None:
-            raise Exception("Instruction not found: {}".format(identifier_byte.hex()))
+    def identify(self):
+        identifier_byte = self.get_memory(self.pc_reg)
+        self.opcode = self.opcodes[identifier_byte]
+        self.instruction = self.opcode.instruction
 
         # get the data bytes
-        if self.instruction.data_length > 0:
-            next_to_pc_reg = self.pc_reg + np.uint16(1)
-            self.data_bytes = self._get_memory_owner(next_to_pc_reg).get(next_to_pc_reg, self.instruction.data_length)
-
-            # check type
-            if isinstance(self.data_bytes, np.uint8):
-                self.data_bytes = bytes([self.data_bytes])
+        data_length = self.opcode.data_length
+        if data_length == 1:
+            self.data_bytes = bytes([self.get_memory(self.pc_reg + 1)])
+        elif data_length == 2:
+            self.data_bytes = bytes([self.get_memory(self.pc_reg + 1), self.get_memory(self.pc_reg + 2)])
         else:
             self.data_bytes = bytes()
 
-        # print out diagnostic information
-        # example: C000  4C F5 C5  JMP $C5F5                A:00 X:00 Y:00 P:24 SP:FD CYC:0
-        print('{}, {}, {}, A:{}, X:{}, Y:{}, P:{}, SP:{}'.format(hex(self.pc_reg),
-                                                                 (identifier_byte + self.data_bytes).hex(),
-                                                                 self.instruction.__name__,
-                                                                 hex(self.a_reg),
-                                                                 hex(self.x_reg),
-                                                                 hex(self.y_reg),
-                                                                 hex(self.status_reg.to_int()),
-                                                                 hex(self.sp_reg)))
+        if self.tracer is not None:
+            self.tracer.trace(self, self.pc_reg, self.opcode, self.data_bytes)
 
     def execute(self):
-        self.pc_reg += np.uint16(self.instruction.get_instruction_length())
+        self.pc_reg = (self.pc_reg + self.opcode.data_length + 1) & 0xFFFF
+        self.cycles += self.opcode.cycles
 
-        value = self.instruction.execute(self, self.data_bytes)
+        value = self.opcode.execute(self, self.data_bytes)
 
         self.status_reg.update(self.instruction, value)
 
+    def execute_block(self) -> int:
+        """
+        run the block of instructions starting at the pc reg, decoding it only the first time
+        returns how many instructions were run
+        """
+        return self.run_block(self.block_cache.lookup(self.pc_reg))
+
+    def run_block(self, block: Block) -> int:
+        self.block_cache.running = block
+        if self.jit_enabled:
+            if block.compiled is not None:
+                return block.compiled(self)
+            block.executions += 1
+            if block.executions >= self.recompiler.threshold:
+                return self.recompiler.compile(block)(self)
+
+        status_reg = self.status_reg
+        count = 0
+        for opcode, data_bytes, next_pc_reg in block.instructions:
+            self.pc_reg = next_pc_reg
+            self.cycles += opcode.cycles
+            status_reg.update(opcode.instruction, opcode.execute(self, data_bytes))
+            count += 1
+
+            # the block wrote over its own page or a bank switch replaced it, the rest has to be decoded again
+            if not block.valid:
+                break
+            # an interrupt raised by a register access or unmasked is taken before the next instruction
+            if self.interrupt_pending and (self.nmi_pending or not status_reg.interrupt):
+                break
+        return count
+
+    def run(self, max_cycles: Optional[int] = None, until_pc: Optional[int] = None,
+            max_instructions: Optional[int] = None) -> RunResult:
+        """
+        run until max_cycles cycles have passed, the pc reg gets to until_pc or max_instructions have been run,
+        whichever comes first, runs forever without any of them
+        until_pc is checked before every instruction but the first, so a run can continue from a breakpoint
+        whole blocks are run while they fit inside the limits, single instructions once they don't
+        or while a tracer is attached
+        an idle loop is run once, then the cycles and instructions of the iterations that would still fit are added
+        scheduled events are due limits too, they are run and pending interrupts serviced between instructions
+        """
+        start_cycles = self.cycles
+        cycle_limit = float('inf') if max_cycles is None else start_cycles + max_cycles
+        instruction_limit = float('inf') if max_instructions is None else max_instructions
+        instructions = 0
+        lookup = self.block_cache.lookup
+        status_reg = self.status_reg
+        tracer = self.tracer
+        scheduler = self.scheduler
+
+        while True:
+            if self.cycles >= cycle_limit:
+                reason = StopReason.cycles
+                break
+            if instructions >= instruction_limit:
+                reason = StopReason.instructions
+                break
+            if self.pc_reg == until_pc and instructions:
+                reason = StopReason.pc
+                break
+
+            if self.cycles >= scheduler.deadline:
+                scheduler.run_due(self.cycles)
+            if self.interrupt_pending and self.service_interrupts():
+                continue
+            limit = scheduler.deadline if scheduler.deadline < cycle_limit else cycle_limit
+
+            block = lookup(self.pc_reg)
+            if tracer is None and self.cycles + block.max_cycles <= limit and \
+                    instructions + len(block.instructions) <= instruction_limit and \
+                    (until_pc is None or until_pc == block.start or until_pc not in block.addresses):
+                if not (block.idle and self.skip_idle_loops) or until_pc in block.addresses:
+                    instructions += self.run_block(block)
+                    continue
+
+                registers = (self.a_reg, self.x_reg, self.y_reg, self.sp_reg, status_reg.to_int())
+                cycles = self.cycles
+                count = self.run_block(block)
+                instructions += count
+                if self.pc_reg == block.start and \
+                        registers == (self.a_reg, self.x_reg, self.y_reg, self.sp_reg, status_reg.to_int()):
+                    # every further iteration would do exactly the same
+                    iterations = self.idle_iterations(block, self.cycles - cycles, count,
+                                                      limit - self.cycles, instruction_limit - instructions)
+                    self.cycles += iterations * (self.cycles - cycles)
+                    instructions += iterations * count
+            else:
+                opcode, data_bytes, next_pc_reg = block.instructions[0]
+                if tracer is not None:
+                    tracer.trace(self, self.pc_reg, opcode, data_bytes)
+                self.pc_reg = next_pc_reg
+                self.cycles += opcode.cycles
+                status_reg.update(opcode.instruction, opcode.execute(self, data_bytes))
+                instructions += 1
+
+        return RunResult(reason, self.cycles - start_cycles, instructions, self.pc_reg)
+
+    @staticmethod
+    def idle_iterations(block: Block, cycles: int, count: int, cycles_left: float, instructions_left: float) -> int:
+        """
+        how many more iterations of an idle loop taking cycles and count instructions run would run as a whole block
+        """
+        iterations = []
+        if cycles_left != float('inf'):
+            iterations.append(max(0, int(cycles_left - block.max_cycles) // cycles + 1))
+        if instructions_left != float('inf'):
+            iterations.append(int(instructions_left) // count)
+        return min(iterations) if iterations else 0
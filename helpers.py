@@ -7,7 +7,7 @@ from addressing import ImmediateReadAddressing, Addressing, ZeroPageAddressing,
     AbsoluteAddressing, AbsoluteAddressingXOffset, AbsoluteAddressingYOffset, IndirectAddressingWithX, \
     IndirectAddressingWithY, ZeroPageAddressingWithY, AccumulatorAdressing, ImpliedAddressing
 
-class_pattern = r'(\S*)\s*(\w*).{11}(\w*).*'
+class_pattern = r'(\S*)\s*(\w*).{11}(\w*)\s*(\d)\s*(\d)(\*?).*'
 compiled_class_pattern = re.compile(class_pattern)
 
 instruction_classes = []
@@ -85,4 +85,9 @@ def generate_classes_from_string(class_type, class_string: str):
         addressing = description_to_addressing(matches.group(1))
         class_name = matches.group(2) + matches.group(1)
         class_name = re.sub('[(),]', '', class_name)
-        yield type(class_name, (addressing, class_type,), {'identifier_byte': bytes([int(matches.group(3), 16)])})
\ No newline at end of file
+        yield type(class_name, (addressing, class_type,), {
+            'identifier_byte': bytes([int(matches.group(3), 16)]),
+            'cycles': int(matches.group(5)),
+            # marked with a * when crossing a page costs one more cycle
+            'page_cross_cycles': 1 if matches.group(6) else 0,
+        })
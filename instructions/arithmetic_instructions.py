@@ -186,7 +186,7 @@ for generated in generate_classes_from_string(Inc, inc_types):
 dec_types = '''
 zeropage      DEC oper      C6    2     5
 zeropage,X    DEC oper,X    D6    2     6
-absolute      DEC oper      CE    3     3
+absolute      DEC oper      CE    3     6
 absolute,X    DEC oper,X    DE    3     7
 '''
 
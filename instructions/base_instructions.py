@@ -1,7 +1,5 @@
 from typing import Optional
 
-import numpy as np
-
 from addressing import ImpliedAddressing, RelativeAddressing
 from instructions.generic_instruction import Instruction, WritesToMemory
 from status import Status
@@ -13,9 +11,11 @@ class Jmp(Instruction):
     N Z C I D V
     - - - - - -
     """
+    ends_block = True
+
     @classmethod
     def write(cls, cpu: 'cpu.CPU', memory_address, value):
-        cpu.pc_reg = np.uint16(memory_address)
+        cpu.pc_reg = memory_address & 0xFFFF
 
 
 class Jsr(Jmp):
@@ -26,7 +26,7 @@ class Jsr(Jmp):
     @classmethod
     def write(cls, cpu: 'cpu.CPU', memory_address, value):
         # store the pc reg on the stack
-        cpu.stack_push(cpu.pc_reg - np.uint16(1), 2)
+        cpu.stack_push((cpu.pc_reg - 1) & 0xFFFF, 2)
 
         super().write(cpu, memory_address, value)
 
@@ -39,7 +39,7 @@ class Rts(Jmp):
     @classmethod
     def write(cls, cpu: 'cpu.CPU', memory_address, value):
         # grab the pc reg on the stack
-        old_pc_reg = cpu.stack_pop(2) + np.uint16(1)
+        old_pc_reg = (cpu.stack_pop(2) + 1) & 0xFFFF
 
         # jump to the memory location
         super().write(cpu, old_pc_reg, value)
@@ -47,24 +47,19 @@ class Rts(Jmp):
 
 class Brk(Instruction):
     """
-    push PC+2, push SR
+    push PC+2, push SR with the break bit set, jump through the irq vector
     N Z C I D V
     - - - 1 - -
     """
+    ends_block = True
+
     @classmethod
     def write(cls, cpu, memory_address, value):
-        # increment pc reg
-        cpu.pc_reg += np.uint16(1)
-
-        # store the pc reg onto the stack
-        cpu.set_stack_value(cpu.pc_reg, Numbers.SHORT.value)
-
-        # store the status on the stack
-        status = cpu.status_reg.to_int()
-        cpu.set_stack_value(status)
+        # skip the padding byte after the opcode
+        cpu.pc_reg = (cpu.pc_reg + 1) & 0xFFFF
 
-        # set interrupt bit to be true
-        cpu.status_reg.bits[Status.StatusTypes.interrupt] = True
+        # push the pc reg and the status, then set the interrupt bit and fetch the vector
+        cpu.interrupt(cpu.IRQ_VECTOR, brk=True)
 
 
 class Rti(Jmp):
@@ -109,7 +104,7 @@ class Lda(Ld):
     """
     @classmethod
     def write(cls, cpu, memory_address, value):
-        cpu.a_reg = np.uint8(value)
+        cpu.a_reg = value & 0xFF
 
 class Lax(Ld):
     """
@@ -130,7 +125,7 @@ class Ldx(Ld):
     """
     @classmethod
     def write(cls, cpu, memory_address, value):
-        cpu.x_reg = np.uint8(value)
+        cpu.x_reg = value & 0xFF
 
 
 class Ldy(Ld):
@@ -140,7 +135,7 @@ class Ldy(Ld):
     """
     @classmethod
     def write(cls, cpu, memory_address, value):
-        cpu.y_reg = np.uint8(value)
+        cpu.y_reg = value & 0xFF
 
 
 class Sta(WritesToMemory, Instruction):
@@ -226,7 +221,7 @@ class And(Instruction):
 
     @classmethod
     def write(cls, cpu: 'cpu.CPU', memory_address, value):
-        cpu.a_reg &= np.uint8(value)
+        cpu.a_reg &= value
         return cpu.a_reg
 
 
@@ -241,7 +236,7 @@ class Ora(Instruction):
 
     @classmethod
     def write(cls, cpu, memory_address, value):
-        cpu.a_reg |= np.uint8(value)
+        cpu.a_reg = (cpu.a_reg | value) & 0xFF
         return cpu.a_reg
 
 
@@ -256,7 +251,7 @@ class Eor(Instruction):
 
     @classmethod
     def write(cls, cpu, memory_address, value):
-        cpu.a_reg ^= np.uint8(value)
+        cpu.a_reg = (cpu.a_reg ^ value) & 0xFF
         return cpu.a_reg
 
 
@@ -271,15 +266,15 @@ class Adc(Instruction):
 
     @classmethod
     def write(cls, cpu, memory_address, value):
-        result = cpu.a_reg + int(value) + int(cpu.status_reg.bits[Status.StatusTypes.carry])
+        result = cpu.a_reg + int(value) + int(cpu.status_reg.carry)
         # if value and a_reg have different signs than result, set overflow
-        overflow = bool((np.uint8(cpu.a_reg) ^ np.uint8(result)) & (np.uint8(value) ^ np.uint8(result)) & 0x80)
-        cpu.status_reg.bits[Status.StatusTypes.overflow] = overflow
+        overflow = bool((cpu.a_reg ^ result) & (value ^ result) & 0x80)
+        cpu.status_reg.overflow = overflow
 
         # if greater than 255, carry
-        cpu.status_reg.bits[Status.StatusTypes.carry] = bool(result & 256)
+        cpu.status_reg.carry = bool(result & 256)
 
-        cpu.a_reg = np.uint8(result)
+        cpu.a_reg = result & 0xFF
         return cpu.a_reg
 
 
@@ -330,9 +325,9 @@ class Lsr(Shift):
     @classmethod
     def write(cls, cpu, memory_address, value):
         # shift bits
-        updated_value = np.uint8(value >> 1)
+        updated_value = value >> 1
         # set the carry reg
-        cpu.status_reg.bits[Status.StatusTypes.carry] = bool(value & 0b1)
+        cpu.status_reg.carry = bool(value & 0b1)
 
         return super().write(cpu, memory_address, updated_value)
 
@@ -346,10 +341,10 @@ class Asl(Shift):
     def write(cls, cpu, memory_address, value):
         # shift bits
         value_without_7 = value & 0b01111111
-        updated_value = np.uint8(value_without_7 << 1)
+        updated_value = value_without_7 << 1
         # set the carry reg
         original_bit_7 = (value & 0b10000000) >> 7
-        cpu.status_reg.bits[Status.StatusTypes.carry] = bool(original_bit_7)
+        cpu.status_reg.carry = bool(original_bit_7)
         return super().write(cpu, memory_address, updated_value)
 
 
@@ -361,11 +356,11 @@ class Ror(Shift):
     @classmethod
     def write(cls, cpu, memory_address, value):
         # shift bits
-        shifted_bits_without_7 = np.uint8(value >> 1)
-        shifted_carry = int(cpu.status_reg.bits[Status.StatusTypes.carry]) << 7
-        updated_value = np.uint8(shifted_bits_without_7 | shifted_carry)
+        shifted_bits_without_7 = value >> 1
+        shifted_carry = int(cpu.status_reg.carry) << 7
+        updated_value = shifted_bits_without_7 | shifted_carry
         # set the carry reg
-        cpu.status_reg.bits[Status.StatusTypes.carry] = bool(value & 0b1)
+        cpu.status_reg.carry = bool(value & 0b1)
         return super().write(cpu, memory_address, updated_value)
 
 
@@ -384,11 +379,11 @@ class Rol(Shift):
         # shift bits
         value_reg_without_7 = value & 0b01111111
         shifted_bits_without_0 = value_reg_without_7 << 1
-        shifted_carry = int(cpu.status_reg.bits[Status.StatusTypes.carry])
-        updated_value = np.uint8(shifted_bits_without_0 | shifted_carry)
+        shifted_carry = int(cpu.status_reg.carry)
+        updated_value = shifted_bits_without_0 | shifted_carry
         # set the carry reg
         original_bit_7 = (value & 0b10000000) >> 7
-        cpu.status_reg.bits[Status.StatusTypes.carry] = bool(original_bit_7)
+        cpu.status_reg.carry = bool(original_bit_7)
         return super().write(cpu, memory_address, updated_value)
 
 
@@ -403,8 +398,8 @@ class Inc(Instruction):
 
     @classmethod
     def write(cls, cpu: 'cpu.CPU', memory_address, value):
-        original_value = np.uint8(cpu.get_memory(memory_address))
-        updated_value = original_value + np.uint8(1)
+        original_value = cpu.get_memory(memory_address)
+        updated_value = (original_value + 1) & 0xFF
         cpu.set_memory(memory_address, updated_value)
         return updated_value
 
@@ -420,8 +415,8 @@ class Dec(Instruction):
 
     @classmethod
     def write(cls, cpu: 'cpu.CPU', memory_address, value):
-        original_value = np.uint8(cpu.get_memory(memory_address))
-        updated_value = original_value - np.uint8(1)
+        original_value = cpu.get_memory(memory_address)
+        updated_value = (original_value - 1) & 0xFF
         cpu.set_memory(memory_address, updated_value)
         return updated_value
 
@@ -437,8 +432,8 @@ class Compare(Instruction):
 
     @classmethod
     def write(cls, cpu, memory_address, value):
-        # TODO: remove np.int()
-        cpu.status_reg.bits[Status.StatusTypes.carry] = not bool(np.int(value) & 256)
+        # a borrow leaves the difference negative, which shows up in bit 8
+        cpu.status_reg.carry = not value & 256
         return value
 
 
@@ -496,6 +491,8 @@ class BranchSet(RelativeAddressing, Jmp):
     @classmethod
     def write(cls, cpu: 'cpu.CPU', memory_address, value):
         if cpu.status_reg.status_of_flag(cls.bit):
+            # taking the branch costs a cycle, and another one if it lands in a different page
+            cpu.cycles += 2 if (cpu.pc_reg ^ memory_address) & 0xFF00 else 1
             super().write(cpu, memory_address, value)
 
 
@@ -503,6 +500,8 @@ class BranchClear(RelativeAddressing, Jmp):
     @classmethod
     def write(cls, cpu: 'cpu.CPU', memory_address, value):
         if not cpu.status_reg.status_of_flag(cls.bit):
+            # taking the branch costs a cycle, and another one if it lands in a different page
+            cpu.cycles += 2 if (cpu.pc_reg ^ memory_address) & 0xFF00 else 1
             super().write(cpu, memory_address, value)
 
 
@@ -627,6 +626,7 @@ class Rra(Instruction):
 
 class Tax(ImpliedAddressing, RegisterModifier):
     identifier_byte = bytes([0xAA])
+    cycles = 2
 
     @classmethod
     def write(cls, cpu, memory_address, value):
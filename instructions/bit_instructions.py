@@ -2,56 +2,62 @@ from addressing import ZeroPageAddressing, AbsoluteAddressing, ImmediateReadAddr
     AbsoluteAddressingXOffset, AbsoluteAddressingYOffset, IndirectAddressingWithX, IndirectAddressingWithY, \
     ImpliedAddressing
 from instructions.base_instructions import Bit, And, RegisterModifier
-import numpy as np
 
 
 class BitZeroPage(ZeroPageAddressing, Bit):
     identifier_byte = bytes([0x24])
+    cycles = 3
 
 
 class BitAbs(AbsoluteAddressing, Bit):
     identifier_byte = bytes([0x2C])
+    cycles = 4
 
 
 # register instructions
 class Iny(ImpliedAddressing, RegisterModifier):
     identifier_byte = bytes([0xC8])
+    cycles = 2
 
     @classmethod
     def write(cls, cpu, memory_address, value):
-        cpu.y_reg += np.uint8(1)
+        cpu.y_reg = (cpu.y_reg + 1) & 0xFF
         return cpu.y_reg
 
 
 class Dey(ImpliedAddressing, RegisterModifier):
     identifier_byte = bytes([0x88])
+    cycles = 2
 
     @classmethod
     def write(cls, cpu, memory_address, value):
-        cpu.y_reg -= np.uint8(1)
+        cpu.y_reg = (cpu.y_reg - 1) & 0xFF
         return cpu.y_reg
 
 
 class Inx(ImpliedAddressing, RegisterModifier):
     identifier_byte = bytes([0xE8])
+    cycles = 2
 
     @classmethod
     def write(cls, cpu, memory_address, value):
-        cpu.x_reg += np.uint8(1)
+        cpu.x_reg = (cpu.x_reg + 1) & 0xFF
         return cpu.x_reg
 
 
 class Dex(ImpliedAddressing, RegisterModifier):
     identifier_byte = bytes([0xCA])
+    cycles = 2
 
     @classmethod
     def write(cls, cpu, memory_address, value):
-        cpu.x_reg -= np.uint8(1)
+        cpu.x_reg = (cpu.x_reg - 1) & 0xFF
         return cpu.x_reg
 
 
 class Tax(ImpliedAddressing, RegisterModifier):
     identifier_byte = bytes([0xAA])
+    cycles = 2
 
     @classmethod
     def write(cls, cpu, memory_address, value):
@@ -61,6 +67,7 @@ class Tax(ImpliedAddressing, RegisterModifier):
 
 class Txa(ImpliedAddressing, RegisterModifier):
     identifier_byte = bytes([0x8A])
+    cycles = 2
 
     @classmethod
     def write(cls, cpu, memory_address, value):
@@ -70,6 +77,7 @@ class Txa(ImpliedAddressing, RegisterModifier):
 
 class Tay(ImpliedAddressing, RegisterModifier):
     identifier_byte = bytes([0xA8])
+    cycles = 2
 
     @classmethod
     def write(cls, cpu, memory_address, value):
@@ -79,6 +87,7 @@ class Tay(ImpliedAddressing, RegisterModifier):
 
 class Tya(ImpliedAddressing, RegisterModifier):
     identifier_byte = bytes([0x98])
+    cycles = 2
 
     @classmethod
     def write(cls, cpu, memory_address, value):
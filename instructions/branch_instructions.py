@@ -8,6 +8,7 @@ class Bcs(BranchSet):
     Branch on Carry Set
     """
     identifier_byte = bytes([0xB0])
+    cycles = 2
     bit = Status.StatusTypes.carry
 
 
@@ -16,6 +17,7 @@ class Beq(BranchSet):
     Branch on Result Zero
     """
     identifier_byte = bytes([0xF0])
+    cycles = 2
     bit = Status.StatusTypes.zero
 
 
@@ -25,6 +27,7 @@ class Bmi(BranchSet):
     branch on N = 1
     """
     identifier_byte = bytes([0x30])
+    cycles = 2
     bit = Status.StatusTypes.negative
 
 
@@ -34,6 +37,7 @@ class Bvs(BranchSet):
     branch on V = 1
     """
     identifier_byte = bytes([0x70])
+    cycles = 2
     bit = Status.StatusTypes.overflow
 
 
@@ -43,6 +47,7 @@ class Bvc(BranchClear):
     branch on V = 0
     """
     identifier_byte = bytes([0x50])
+    cycles = 2
     bit = Status.StatusTypes.overflow
 
 
@@ -51,6 +56,7 @@ class Bcc(BranchClear):
     Branch on Carry Clear
     """
     identifier_byte = bytes([0x90])
+    cycles = 2
     bit = Status.StatusTypes.carry
 
 
@@ -59,6 +65,7 @@ class Bne(BranchClear):
     Branch on Result not Zero
     """
     identifier_byte = bytes([0xD0])
+    cycles = 2
     bit = Status.StatusTypes.zero
 
 
@@ -68,4 +75,5 @@ class Bpl(BranchClear):
     branch on N = 0
     """
     identifier_byte = bytes([0x10])
+    cycles = 2
     bit = Status.StatusTypes.negative
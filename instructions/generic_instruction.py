@@ -1,8 +1,6 @@
 from typing import Optional
 import helpers
 
-import cpu
-
 
 class Instruction:
     identifier_byte = None
@@ -15,6 +13,13 @@ class Instruction:
     sets_carry_bit = False
 
     data_length = 0
+    cycles = 0
+
+    # extra cycles when indexing carries the address over into the next page
+    page_cross_cycles = 0
+
+    # changes the flow of the program, so a straight line run of instructions stops after it
+    ends_block = False
 
     @classmethod
     def apply_side_effects(cls, cpu: 'cpu.CPU'):
@@ -53,6 +58,19 @@ class Instruction:
 class WritesToMemory:
     @classmethod
     def write(cls, cpu: 'cpu.CPU', memory_address, value):
-        memory_owner = cpu._get_memory_owner(memory_address)
-        memory_owner.set(position=memory_address, value=value)
+        cpu.set_memory(memory_address, value)
+
 
+
+class UndefinedInstruction(Instruction):
+    """
+    shared trap for every opcode without an instruction,
+    fills the empty slots of the cpu dispatch table
+    """
+    ends_block = True
+
+    @classmethod
+    def execute(cls, cpu: 'cpu.CPU', data_bytes: bytes):
+        # the pc reg has already moved past the single opcode byte
+        identifier_byte = cpu.get_memory(cpu.pc_reg - 1)
+        raise Exception("Instruction not found: {:02x}".format(identifier_byte))
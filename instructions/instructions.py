@@ -8,43 +8,51 @@ from helpers import generate_classes_from_string, instruction_classes
 # set status instructions
 class Sec(SetBit):
     identifier_byte = bytes([0x38])
+    cycles = 2
     bit = Status.StatusTypes.carry
 
 
 class Sei(SetBit):
     identifier_byte = bytes([0x78])
+    cycles = 2
     bit = Status.StatusTypes.interrupt
 
 
 class Sed(SetBit):
     identifier_byte = bytes([0xF8])
+    cycles = 2
     bit = Status.StatusTypes.decimal
 
 
 # clear status instructions
 class Cld(ClearBit):
     identifier_byte = bytes([0xD8])
+    cycles = 2
     bit = Status.StatusTypes.decimal
 
 
 class Clv(ClearBit):
     identifier_byte = bytes([0xB8])
+    cycles = 2
     bit = Status.StatusTypes.overflow
 
 
 class Clc(ClearBit):
     identifier_byte = bytes([0x18])
+    cycles = 2
     bit = Status.StatusTypes.carry
 
 
 class Cli(ClearBit):
     identifier_byte = bytes([0x58])
+    cycles = 2
     bit = Status.StatusTypes.interrupt
 
 
 # Nop
 class NopImp(ImpliedAddressing, Nop):
     identifier_byte = bytes([0xEA])
+    cycles = 2
 
 
 nop_types = '''
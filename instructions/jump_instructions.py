@@ -1,26 +1,32 @@
 from addressing import AbsoluteAddressing, IndirectAddressing, ImpliedAddressing
-from instructions.base_instructions import Jmp, Jsr, Rts, Rti
+from instructions.base_instructions import Brk, Jmp, Jsr, Rts, Rti
 
 
 class JmpAbs(AbsoluteAddressing, Jmp):
     identifier_byte = bytes([0x4C])
+    cycles = 3
 
 
 class JmpInd(IndirectAddressing, Jmp):
     identifier_byte = bytes([0x6C])
+    cycles = 5
 
 
 class JsrAbs(AbsoluteAddressing, Jsr):
     identifier_byte = bytes([0x20])
+    cycles = 6
 
 
 class RtsImp(ImpliedAddressing, Rts):
     identifier_byte = bytes([0x60])
+    cycles = 6
 
 
 class RtiImp(ImpliedAddressing, Rti):
     identifier_byte = bytes([0x40])
+    cycles = 6
 
 
-class BrkImp(ImpliedAddressing, Jmp):
+class BrkImp(ImpliedAddressing, Brk):
     identifier_byte = bytes([0x00])
+    cycles = 7
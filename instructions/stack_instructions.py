@@ -1,5 +1,3 @@
-import numpy as np
-
 from addressing import ImpliedAddressing
 from instructions.generic_instruction import Instruction
 from instructions.base_instructions import StackPush, StackPull
@@ -8,6 +6,7 @@ from instructions.base_instructions import StackPush, StackPull
 # stack push instructions
 class Php(ImpliedAddressing, StackPush):
     identifier_byte = bytes([0x08])
+    cycles = 3
 
     @classmethod
     def data_to_push(cls, cpu):
@@ -20,6 +19,7 @@ class Pha(ImpliedAddressing, StackPush):
     - - - - - -
     """
     identifier_byte = bytes([0x48])
+    cycles = 3
 
     @classmethod
     def data_to_push(cls, cpu):
@@ -27,11 +27,12 @@ class Pha(ImpliedAddressing, StackPush):
 
 
 class Txs(ImpliedAddressing, Instruction):
-    # TODO:
-    # sets_negative_bit = True
-    sets_zero_bit = True
-
+    """
+    N Z C I D V
+    - - - - - -
+    """
     identifier_byte = bytes([0x9A])
+    cycles = 2
 
     @classmethod
     def write(cls, cpu: 'cpu.CPU', memory_address, value):
@@ -46,6 +47,7 @@ class Plp(ImpliedAddressing, StackPull):
     ignores bits 4 and 5
     """
     identifier_byte = bytes([0x28])
+    cycles = 4
 
     @classmethod
     def write_pulled_data(cls, cpu, pulled_data):
@@ -57,10 +59,11 @@ class Pla(ImpliedAddressing, StackPull):
     sets_zero_bit = True
 
     identifier_byte = bytes([0x68])
+    cycles = 4
 
     @classmethod
     def write_pulled_data(cls, cpu, pulled_data):
-        cpu.a_reg = np.uint8(pulled_data)
+        cpu.a_reg = pulled_data & 0xFF
         return cpu.a_reg
 
 
@@ -69,6 +72,7 @@ class Tsx(ImpliedAddressing, Instruction):
     sets_zero_bit = True
 
     identifier_byte = bytes([0xBA])
+    cycles = 2
 
     @classmethod
     def write(cls, cpu: 'cpu.CPU', memory_address, value):
@@ -0,0 +1,350 @@
+from typing import Callable, List, Optional
+
+from addressing import ImmediateReadAddressing, ZeroPageAddressing, ZeroPageAddressingWithX, \
+    ZeroPageAddressingWithY, AbsoluteAddressing, AbsoluteAddressingXOffset, AbsoluteAddressingYOffset, \
+    IndirectAddressing, IndirectAddressingWithX, IndirectAddressingWithY, AccumulatorAdressing
+from block_cache import Block
+from instructions.base_instructions import Jmp, Jsr, Rts, Rti, Lda, Ldx, Ldy, Lax, Sta, Stx, Sty, Sax, And, \
+    Ora, Eor, Adc, Sbc, Cmp, Cpx, Cpy, Bit, Inc, Dec, Lsr, Asl, Ror, Rol, Nop, SetBit, ClearBit, BranchSet, \
+    BranchClear
+from instructions.bit_instructions import Iny, Dey, Inx, Dex, Tax, Txa, Tay, Tya
+from instructions.stack_instructions import Txs, Tsx, Pha, Php, Pla, Plp
+from status import Status
+
+"""
+  the recompiler turns a hot block into a single python function
+
+  registers and the status live in locals for the whole block, addressing is worked out while
+  generating the source wherever the data bytes allow it, and memory is read and written straight
+  through the page table of the bus
+  instructions without a template here are run by the interpreter from inside the generated function
+"""
+
+REGISTERS = [
+    ('a', 'cpu.a_reg'),
+    ('x', 'cpu.x_reg'),
+    ('y', 'cpu.y_reg'),
+    ('sp', 'cpu.sp_reg'),
+    ('p', 'status.value'),
+    ('n', 'status.negative_value'),
+    ('z', 'status.zero_value'),
+    ('c', 'cpu.cycles'),
+]
+
+LOAD_REGISTERS = ['{} = {}'.format(local, attribute) for local, attribute in REGISTERS]
+STORE_REGISTERS = ['{} = {}'.format(attribute, local) for local, attribute in REGISTERS]
+
+# an interrupt that would be taken before the next instruction, pending is set by the slow memory paths
+INTERRUPT_TAKEN = 'cpu.interrupt_pending and (cpu.nmi_pending or not p & 0x04)'
+
+# how to read each flag from the locals
+FLAGS = {
+    Status.StatusTypes.carry: 'p & 0x01',
+    Status.StatusTypes.interrupt: 'p & 0x04',
+    Status.StatusTypes.decimal: 'p & 0x08',
+    Status.StatusTypes.overflow: 'p & 0x40',
+    Status.StatusTypes.zero: 'not z & 0xFF',
+    Status.StatusTypes.negative: 'n & 0x80',
+}
+
+# implied instructions that only move values between registers
+REGISTER_INSTRUCTIONS = {
+    Iny: ['y = (y + 1) & 0xFF', 'n = z = y'],
+    Dey: ['y = (y - 1) & 0xFF', 'n = z = y'],
+    Inx: ['x = (x + 1) & 0xFF', 'n = z = x'],
+    Dex: ['x = (x - 1) & 0xFF', 'n = z = x'],
+    Tax: ['x = a', 'n = z = x'],
+    Txa: ['a = x', 'n = z = a'],
+    Tay: ['y = a', 'n = z = y'],
+    Tya: ['a = y', 'n = z = a'],
+    Txs: ['sp = x'],
+    Tsx: ['x = sp', 'n = z = x'],
+}
+
+# memory read by an instruction, then combined with the registers
+READ_INSTRUCTIONS = [
+    (Lax, ['a = x = v', 'n = z = v']),
+    (Lda, ['a = v', 'n = z = v']),
+    (Ldx, ['x = v', 'n = z = v']),
+    (Ldy, ['y = v', 'n = z = v']),
+    (And, ['a &= v', 'n = z = a']),
+    (Ora, ['a |= v', 'n = z = a']),
+    (Eor, ['a ^= v', 'n = z = a']),
+    (Sbc, ['v ^= 0xFF',
+           'r = a + v + (p & 0x01)',
+           'p = (p & 0xBE) | (0x40 if (a ^ r) & (v ^ r) & 0x80 else 0) | (r >> 8)',
+           'a = r & 0xFF',
+           'n = z = a']),
+    (Adc, ['r = a + v + (p & 0x01)',
+           'p = (p & 0xBE) | (0x40 if (a ^ r) & (v ^ r) & 0x80 else 0) | (r >> 8)',
+           'a = r & 0xFF',
+           'n = z = a']),
+    (Cmp, ['r = a - v', 'p = (p & 0xFE) | (0 if r & 0x100 else 1)', 'n = z = r']),
+    (Cpx, ['r = x - v', 'p = (p & 0xFE) | (0 if r & 0x100 else 1)', 'n = z = r']),
+    (Cpy, ['r = y - v', 'p = (p & 0xFE) | (0 if r & 0x100 else 1)', 'n = z = r']),
+    (Bit, ['z = v & a', 'n = v', 'p = (p & 0xBF) | (v & 0x40)']),
+]
+
+# the value an instruction stores to memory
+STORE_INSTRUCTIONS = [
+    (Sta, 'a'),
+    (Stx, 'x'),
+    (Sty, 'y'),
+    (Sax, 'a & x'),
+]
+
+# read modify write instructions, taking v and leaving the result in r
+MODIFY_INSTRUCTIONS = [
+    (Lsr, ['r = v >> 1', 'p = (p & 0xFE) | (v & 0x01)']),
+    (Asl, ['r = (v << 1) & 0xFF', 'p = (p & 0xFE) | (v >> 7)']),
+    (Ror, ['r = (v >> 1) | ((p & 0x01) << 7)', 'p = (p & 0xFE) | (v & 0x01)']),
+    (Rol, ['r = ((v << 1) & 0xFF) | (p & 0x01)', 'p = (p & 0xFE) | (v >> 7)']),
+    (Inc, ['r = (v + 1) & 0xFF']),
+    (Dec, ['r = (v - 1) & 0xFF']),
+]
+
+ZERO_PAGE_ADDRESSING = (ZeroPageAddressing, ZeroPageAddressingWithX, ZeroPageAddressingWithY)
+
+
+def read_lines(target: str, location: Optional[int]) -> List[str]:
+    """
+    read a byte into target from a fixed location, or from the local address when location is None
+    the slow path hands the cycles over first, memory owners may depend on them, and notes whether the access
+    left an interrupt pending
+    """
+    if location is None:
+        return ['pg = read_pages[address >> 8]',
+                'if pg is not None:',
+                '    {} = pg[address & 0xFF]'.format(target),
+                'else:',
+                '    cpu.cycles = c',
+                '    {} = get_memory(address)'.format(target),
+                '    pending = cpu.interrupt_pending']
+    return ['pg = read_pages[{}]'.format(location >> 8),
+            'if pg is not None:',
+            '    {} = pg[{}]'.format(target, location & 0xFF),
+            'else:',
+            '    cpu.cycles = c',
+            '    {} = get_memory({})'.format(target, location),
+            '    pending = cpu.interrupt_pending']
+
+
+def write_lines(value: str, location: Optional[int]) -> List[str]:
+    """
+    write a byte to a fixed location, or to the local address when location is None
+    the slow path also notes whether the write took away the memory the block was decoded from, a write to its
+    own watched page or a bank switch
+    """
+    if location is None:
+        return ['pg = write_pages[address >> 8]',
+                'if pg is not None:',
+                '    pg[address & 0xFF] = {}'.format(value),
+                'else:',
+                '    cpu.cycles = c',
+                '    bus_write(address, {})'.format(value),
+                '    c = cpu.cycles',
+                '    pending = cpu.interrupt_pending or not block.valid']
+    return ['pg = write_pages[{}]'.format(location >> 8),
+            'if pg is not None:',
+            '    pg[{}] = {}'.format(location & 0xFF, value),
+            'else:',
+            '    cpu.cycles = c',
+            '    bus_write({}, {})'.format(location, value),
+            '    c = cpu.cycles',
+            '    pending = cpu.interrupt_pending or not block.valid']
+
+
+# pushes and pulls through page one, the status is put together from the locals like Status.to_int
+STACK_INSTRUCTIONS = {
+    Pha: ['address = 0x100 | sp'] + write_lines('a', None) + ['sp = (sp - 1) & 0xFF'],
+    Php: ['r = (p & 0x7D) | (n & 0x80) | (0 if z & 0xFF else 0x02) | 0x30', 'address = 0x100 | sp'] +
+         write_lines('r', None) + ['sp = (sp - 1) & 0xFF'],
+    Pla: ['sp = (sp + 1) & 0xFF', 'address = 0x100 | sp'] + read_lines('a', None) + ['n = z = a'],
+    Plp: ['sp = (sp + 1) & 0xFF', 'address = 0x100 | sp'] + read_lines('v', None) +
+         ['p = (p & 0x30) | (v & 0xCF)', 'n = v', 'z = 0 if v & 0x02 else 1'],
+}
+
+
+def address_lines(addressing, data_bytes: bytes, page_cross_cycles: int = 0) -> (List[str], Optional[int]):
+    """
+    the effective address of an addressing mode, either fixed or left in the local address
+    adds page_cross_cycles to the cycles when indexing crosses into the next page
+    """
+    if addressing is ZeroPageAddressing:
+        return [], data_bytes[0]
+    if addressing is ZeroPageAddressingWithX:
+        return ['address = ({} + x) & 0xFF'.format(data_bytes[0])], None
+    if addressing is ZeroPageAddressingWithY:
+        return ['address = ({} + y) & 0xFF'.format(data_bytes[0])], None
+
+    absolute = int.from_bytes(data_bytes, byteorder='little')
+    if addressing is AbsoluteAddressing:
+        return [], absolute
+    if addressing in (AbsoluteAddressingXOffset, AbsoluteAddressingYOffset):
+        offset = 'x' if addressing is AbsoluteAddressingXOffset else 'y'
+        lines = ['address = ({} + {}) & 0xFFFF'.format(absolute, offset)]
+        if page_cross_cycles:
+            lines += ['if {} > {}:'.format(offset, 0xFF - (absolute & 0xFF)),
+                      '    c += {}'.format(page_cross_cycles)]
+        return lines, None
+
+    if addressing is IndirectAddressingWithX:
+        return ['address = ({} + x) & 0xFF'.format(data_bytes[0])] + \
+               read_lines('lo', None) + \
+               ['address = (address + 1) & 0xFF'] + \
+               read_lines('hi', None) + \
+               ['address = (hi << 8) | lo'], None
+    if addressing is IndirectAddressingWithY:
+        lines = read_lines('lo', data_bytes[0]) + \
+                read_lines('hi', (data_bytes[0] + 1) & 0xFF) + \
+                ['address = (((hi << 8) | lo) + y) & 0xFFFF']
+        if page_cross_cycles:
+            lines += ['if lo + y > 0xFF:',
+                      '    c += {}'.format(page_cross_cycles)]
+        return lines, None
+    if addressing is IndirectAddressing:
+        # the msb wraps around inside the page
+        return read_lines('lo', absolute) + \
+               read_lines('hi', (absolute & 0xFF00) | ((absolute + 1) & 0xFF)) + \
+               ['address = (hi << 8) | lo'], None
+
+    raise Exception('Addressing has no fixed address: {}'.format(addressing.__name__))
+
+
+class Recompiler(object):
+    """
+    compiles blocks that have been run more than threshold times
+    a compiled block returns how many of its instructions it ran
+    """
+    threshold = 16
+
+    def __init__(self, cpu: 'cpu.CPU'):
+        self.cpu = cpu
+
+    def compile(self, block: Block) -> Callable[['cpu.CPU'], int]:
+        namespace = {
+            'block': block,
+            'read_pages': self.cpu.bus.read_pages,
+            'write_pages': self.cpu.bus.write_pages,
+            'get_memory': self.cpu.get_memory,
+            'bus_write': self.cpu.bus.write,
+        }
+
+        lines = ['status = cpu.status_reg', 'pending = False'] + LOAD_REGISTERS
+        for index, (opcode, data_bytes, next_pc_reg) in enumerate(block.instructions):
+            namespace['i{}'.format(index)] = opcode.instruction
+            namespace['d{}'.format(index)] = data_bytes
+            lines += self.instruction_lines(block, index, opcode, data_bytes, next_pc_reg)
+
+        if not block.instructions[-1][0].instruction.ends_block:
+            lines += STORE_REGISTERS + ['cpu.pc_reg = {}'.format(block.instructions[-1][2]),
+                                        'return {}'.format(len(block.instructions))]
+
+        name = 'block_{:04x}'.format(block.start)
+        source = 'def {}(cpu):\n{}\n'.format(name, '\n'.join('    ' + line for line in lines))
+        exec(compile(source, '<recompiled block ${:04X}>'.format(block.start), 'exec'), namespace)
+
+        block.compiled = namespace[name]
+        return block.compiled
+
+    def instruction_lines(self, block: Block, index: int, opcode: 'cpu.Opcode', data_bytes: bytes,
+                          next_pc_reg: int) -> List[str]:
+        instruction = opcode.instruction
+        addressing = opcode.addressing
+        lines = ['c += {}'.format(opcode.cycles)]
+
+        # instructions that end the block leave the pc reg behind them
+        if issubclass(instruction, (BranchSet, BranchClear)):
+            offset = data_bytes[0] - 0x100 if data_bytes[0] & 0x80 else data_bytes[0]
+            target = (next_pc_reg + offset) & 0xFFFF
+            flag = FLAGS[instruction.bit]
+            if issubclass(instruction, BranchClear):
+                flag = 'not ({})'.format(flag)
+            return lines + ['if {}:'.format(flag),
+                            '    c += {}'.format(2 if (target ^ next_pc_reg) & 0xFF00 else 1),
+                            '    cpu.pc_reg = {}'.format(target),
+                            'else:',
+                            '    cpu.pc_reg = {}'.format(next_pc_reg)] + \
+                STORE_REGISTERS + ['return {}'.format(index + 1)]
+        if issubclass(instruction, Jmp) and not issubclass(instruction, (Jsr, Rts, Rti)) and \
+                addressing in (AbsoluteAddressing, IndirectAddressing):
+            address, location = address_lines(addressing, data_bytes)
+            return lines + address + STORE_REGISTERS + \
+                ['cpu.pc_reg = {}'.format('address' if location is None else location),
+                 'return {}'.format(index + 1)]
+
+        inlined = self.inline_lines(instruction, addressing, data_bytes)
+        if inlined is None:
+            return lines + self.interpreted_lines(block, index, next_pc_reg)
+        lines += inlined
+
+        exit_lines = STORE_REGISTERS + ['cpu.pc_reg = {}'.format(next_pc_reg), 'return {}'.format(index + 1)]
+        # a write may have hit the page the block was decoded from or switched its bank,
+        # a register access may have raised an interrupt, or cli or plp unmasked one
+        # checked first, the stack read of plp notes pending too but only for what the read itself raised
+        if issubclass(instruction, ClearBit) and instruction.bit == Status.StatusTypes.interrupt or \
+                issubclass(instruction, Plp):
+            lines += ['if {}:'.format(INTERRUPT_TAKEN)] + ['    ' + line for line in exit_lines]
+        elif any('bus_write(' in line for line in inlined):
+            lines += ['if pending and (not block.valid or {}):'.format(INTERRUPT_TAKEN)] + \
+                ['    ' + line for line in exit_lines]
+        elif any('pending = ' in line for line in inlined):
+            lines += ['if pending and ({}):'.format(INTERRUPT_TAKEN)] + ['    ' + line for line in exit_lines]
+        return lines
+
+    def inline_lines(self, instruction, addressing, data_bytes: bytes) -> Optional[List[str]]:
+        """
+        the source of an instruction working on the locals, None when it has to be interpreted
+        """
+        if instruction in REGISTER_INSTRUCTIONS:
+            return list(REGISTER_INSTRUCTIONS[instruction])
+        if instruction in STACK_INSTRUCTIONS:
+            return list(STACK_INSTRUCTIONS[instruction])
+
+        if issubclass(instruction, SetBit):
+            return ['p |= {}'.format(1 << instruction.bit)]
+        if issubclass(instruction, ClearBit):
+            return ['p &= {}'.format(0xFF & ~(1 << instruction.bit))]
+
+        if issubclass(instruction, Nop):
+            # only a read from a register has side effects worth keeping
+            if addressing in (AbsoluteAddressing, AbsoluteAddressingXOffset):
+                lines, location = address_lines(addressing, data_bytes, instruction.page_cross_cycles)
+                return lines + read_lines('v', location)
+            return []
+
+        for instruction_class, operation in READ_INSTRUCTIONS:
+            if issubclass(instruction, instruction_class):
+                if addressing is ImmediateReadAddressing:
+                    return ['v = {}'.format(data_bytes[0])] + operation
+                lines, location = address_lines(addressing, data_bytes, instruction.page_cross_cycles)
+                return lines + read_lines('v', location) + operation
+
+        for instruction_class, value in STORE_INSTRUCTIONS:
+            if issubclass(instruction, instruction_class):
+                lines, location = address_lines(addressing, data_bytes, instruction.page_cross_cycles)
+                return lines + write_lines(value, location)
+
+        for instruction_class, operation in MODIFY_INSTRUCTIONS:
+            if issubclass(instruction, instruction_class):
+                if addressing is AccumulatorAdressing:
+                    return ['v = a'] + operation + ['a = r', 'n = z = r']
+                # inc and dec read their memory twice, only harmless outside the zero page
+                if issubclass(instruction, (Inc, Dec)) and addressing not in ZERO_PAGE_ADDRESSING:
+                    return None
+                lines, location = address_lines(addressing, data_bytes, instruction.page_cross_cycles)
+                return lines + read_lines('v', location) + operation + write_lines('r', location) + ['n = z = r']
+
+        return None
+
+    def interpreted_lines(self, block: Block, index: int, next_pc_reg: int) -> List[str]:
+        """
+        hand the registers back to the cpu and run the instruction through the interpreter
+        """
+        lines = STORE_REGISTERS + ['cpu.pc_reg = {}'.format(next_pc_reg),
+                                   'status.update(i{0}, i{0}.execute(cpu, d{0}))'.format(index)]
+        if block.instructions[index][0].instruction.ends_block:
+            return lines + ['return {}'.format(index + 1)]
+
+        lines += LOAD_REGISTERS
+        return lines + ['if not block.valid or {}:'.format(INTERRUPT_TAKEN), '    return {}'.format(index + 1)]
@@ -1,8 +1,10 @@
 import argparse
+import os
 
 from apu import APU
 from cpu import CPU
-from nes_test import NesTestLog
+from nes import NES
+from nes_test import run_log
 from ram import RAM
 from ppu import PPU
 from rom import ROM
@@ -22,41 +24,28 @@ def main():
     # TODO: validate rom path is correct
     print(args.rom_path)
 
-    # load rom
-    with open(args.rom_path, 'rb') as file:
-        rom_bytes = file.read()
-
-    # create ram
-    ram = RAM()
-
-    # create ppu
-    ppu = PPU()
-
-    # create apu
-    apu = APU()
-
-    rom = ROM(rom_bytes)
-
-    # create cpu
-    cpu: CPU = CPU(ram, ppu, apu)
-    cpu.start_up()
-    cpu.load_rom(rom, args.test)
+    # map the rom file rather than reading it all in
+    rom = ROM.from_file(args.rom_path)
 
     # check if running test rom
     if args.test:
-        # load in the test log
-        with open('test_log.log', 'r') as nes_test_file:
-            nes_test_log = NesTestLog(nes_test_file.readlines())
-        while True:
-            cpu.identify()
-            nes_test_log.compare(cpu)
-            cpu.execute()
+        # the test rom runs from $C000 on a bare cpu
+        cpu: CPU = CPU(RAM(), PPU(), APU())
+        cpu.start_up()
+        cpu.load_rom(rom, args.test)
+
+        # run against the test log, reporting the first line that differs
+        divergence = run_log(cpu, 'test_log.log', 'test_log.trace.npy')
+        print(divergence if divergence is not None else 'test log matched')
     else:
-        while True:
-            cpu.identify()
-            cpu.execute()
+        # battery backed ram is kept next to the rom
+        nes = NES(rom, os.path.splitext(args.rom_path)[0] + '.sav')
+        try:
+            while True:
+                nes.run_frame()
+        finally:
+            nes.close()
 
 
 if __name__ == '__main__':
     main()
-
@@ -0,0 +1,394 @@
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Type
+import copy
+
+PAGE_SIZE = 0x100
+
+# pages of the cpu bus from $8000 and of the ppu pattern tables from $0000
+PRG_PAGES = 0x80
+CHR_PAGES = 0x20
+
+
+class Mirroring(Enum):
+    """
+    how the two physical nametables show up in the four of the ppu address space
+    """
+    horizontal = 0
+    vertical = 1
+    single_lower = 2
+    single_upper = 3
+    four_screen = 4
+
+
+class Mapper(object):
+    """
+    the board logic of a cartridge, switching banks of the prg and chr data in and out
+
+    banks are mapped by pointing the entries of page tables at 256 byte views of the rom, a bank switch
+    changes which views are pointed at and never copies any data
+    the cpu bus gets told about each prg page that changed through remap_page
+    """
+    number = None  # type: int
+
+    # clocked once a scanline while rendering, see clock_scanline
+    counts_scanlines = False
+
+    def __init__(self, rom: 'rom.ROM'):
+        self.rom = rom
+        self.mirroring = rom.header.mirroring
+        if not len(rom.prg_bytes):
+            raise Exception('Rom has no prg data')
+
+        # every page of the data is sliced once, mapping a bank is then just picking slices
+        self.prg_views = [rom.prg_bytes[start:start + PAGE_SIZE]
+                          for start in range(0, len(rom.prg_bytes), PAGE_SIZE)]  # type: List[memoryview]
+        self.chr_views = [rom.chr_bytes[start:start + PAGE_SIZE]
+                          for start in range(0, len(rom.chr_bytes), PAGE_SIZE)]  # type: List[memoryview]
+
+        # the page tables, physical pages are the index of the page in the prg data
+        self.prg_pages = [self.prg_views[0]] * PRG_PAGES  # type: List[memoryview]
+        self.prg_physical_pages = [-1] * PRG_PAGES  # type: List[int]
+        self.chr_pages = [self.chr_views[0]] * CHR_PAGES  # type: List[memoryview]
+        self.chr_physical_pages = [-1] * CHR_PAGES  # type: List[int]
+
+        # set by the cpu the rom is loaded into
+        self.remap_page = None  # type: Optional[Callable[[int], None]]
+        self.irq = None  # type: Optional[Callable[[bool], None]]
+
+        # set by the ppu, told about each page of the pattern tables that changed, and called before the pattern
+        # tables or the mirroring change so the scanlines already passed are drawn the way they were
+        self.remap_chr_page = None  # type: Optional[Callable[[int], None]]
+        self.picture_changing = None  # type: Optional[Callable[[], None]]
+
+        self.reset()
+
+    # struct format of the registers get_state returns, for save states
+    state_format = ''
+
+    def reset(self):
+        self.update_banks()
+
+    def update_banks(self):
+        """
+        map the banks the registers select, the first 32KB of prg and 8KB of chr without any
+        """
+        self.map_prg(0x8000, 0, 0x4000)
+        self.map_prg(0xC000, 1, 0x4000)
+        self.map_chr(0x0000, 0, 0x2000)
+
+    def get_state(self) -> tuple:
+        return ()
+
+    def set_state(self, state: tuple):
+        self.update_banks()
+
+    def fork(self, rom: 'rom.ROM') -> 'Mapper':
+        """
+        a copy of the mapper in the same banks for a copy of its rom, the prg views are shared
+        """
+        mapper = copy.copy(self)
+        mapper.rom = rom
+        if rom.chr_bytes is not self.rom.chr_bytes:
+            mapper.chr_views = [rom.chr_bytes[start:start + PAGE_SIZE]
+                                for start in range(0, len(rom.chr_bytes), PAGE_SIZE)]
+        mapper.prg_pages = list(self.prg_pages)
+        mapper.prg_physical_pages = list(self.prg_physical_pages)
+        mapper.chr_physical_pages = list(self.chr_physical_pages)
+        mapper.chr_pages = [mapper.chr_views[page] for page in self.chr_physical_pages]
+        mapper.remap_page = None
+        mapper.irq = None
+        mapper.remap_chr_page = None
+        mapper.picture_changing = None
+
+        # the registers go through the state so none of them are shared
+        mapper.set_state(self.get_state())
+        return mapper
+
+    def write(self, position: int, value: int):
+        """
+        a cpu write to $8000-$FFFF
+        """
+        raise Exception('Trying to write to Read only Memory')
+
+    def clock_scanline(self):
+        pass
+
+    def map_prg(self, address: int, bank: int, size: int):
+        """
+        show bank number bank, counting size bytes a bank, at address
+        banks wrap around the size of the prg data, negative banks count from the end
+        """
+        start = (address >> 8) - 0x80
+        physical_pages = self.bank_pages(bank, size, len(self.prg_views))
+        if self.prg_physical_pages[start:start + len(physical_pages)] == physical_pages:
+            return
+        for offset, physical_page in enumerate(physical_pages):
+            page = start + offset
+            if self.prg_physical_pages[page] != physical_page:
+                self.prg_pages[page] = self.prg_views[physical_page]
+                self.prg_physical_pages[page] = physical_page
+                if self.remap_page is not None:
+                    self.remap_page(page + 0x80)
+
+    def map_chr(self, address: int, bank: int, size: int):
+        """
+        show bank number bank, counting size bytes a bank, at address of the pattern tables
+        """
+        start = address >> 8
+        physical_pages = self.bank_pages(bank, size, len(self.chr_views))
+        if self.chr_physical_pages[start:start + len(physical_pages)] == physical_pages:
+            return
+        if self.picture_changing is not None:
+            self.picture_changing()
+        for offset, physical_page in enumerate(physical_pages):
+            page = start + offset
+            if self.chr_physical_pages[page] != physical_page:
+                self.chr_pages[page] = self.chr_views[physical_page]
+                self.chr_physical_pages[page] = physical_page
+                if self.remap_chr_page is not None:
+                    self.remap_chr_page(page)
+
+    def set_mirroring(self, mirroring: Mirroring):
+        if mirroring != self.mirroring:
+            if self.picture_changing is not None:
+                self.picture_changing()
+            self.mirroring = mirroring
+
+    @staticmethod
+    def bank_pages(bank: int, size: int, count: int) -> List[int]:
+        """
+        the pages of the data making up a bank, when there are count pages in all
+        """
+        first = (bank % max(1, count * PAGE_SIZE // size)) * size // PAGE_SIZE
+        pages = size // PAGE_SIZE
+        if first + pages <= count:
+            return list(range(first, first + pages))
+        return [(first + offset) % count for offset in range(pages)]
+
+    def set_irq(self, asserted: bool):
+        if self.irq is not None:
+            self.irq(asserted)
+
+
+class NROM(Mapper):
+    """
+    no bank switching, 16KB of prg is mirrored at $C000
+    """
+    number = 0
+
+
+class MMC1(Mapper):
+    """
+    registers are written a bit at a time through a shift register, the fifth write picks the register
+    by its address: control, chr bank 0, chr bank 1, prg bank
+    """
+    number = 1
+    state_format = '5B'
+
+    def reset(self):
+        self.shift = 0x10
+        self.control = 0x0C
+        self.chr_bank0 = 0
+        self.chr_bank1 = 0
+        self.prg_bank = 0
+        self.update_banks()
+
+    def write(self, position: int, value: int):
+        if value & 0x80:
+            # a set bit 7 resets the shift register and fixes the last prg bank at $C000
+            self.shift = 0x10
+            self.control |= 0x0C
+            self.update_banks()
+            return
+
+        # the marker bit starting at bit 4 gets to bit 0 with the fifth write
+        complete = self.shift & 1
+        self.shift = (self.shift >> 1) | ((value & 1) << 4)
+        if complete:
+            register = (position >> 13) & 0x3
+            if register == 0:
+                self.control = self.shift
+            elif register == 1:
+                self.chr_bank0 = self.shift
+            elif register == 2:
+                self.chr_bank1 = self.shift
+            else:
+                self.prg_bank = self.shift
+            self.shift = 0x10
+            self.update_banks()
+
+    def get_state(self) -> tuple:
+        return self.shift, self.control, self.chr_bank0, self.chr_bank1, self.prg_bank
+
+    def set_state(self, state: tuple):
+        self.shift, self.control, self.chr_bank0, self.chr_bank1, self.prg_bank = state
+        self.update_banks()
+
+    def update_banks(self):
+        self.set_mirroring([Mirroring.single_lower, Mirroring.single_upper,
+                            Mirroring.vertical, Mirroring.horizontal][self.control & 0x3])
+
+        # 512KB boards take the upper 256KB half from the chr bank 0 register
+        outer = self.chr_bank0 & 0x10 if len(self.prg_views) * PAGE_SIZE > 0x40000 else 0
+        bank = (self.prg_bank & 0x0F) | outer
+        prg_mode = (self.control >> 2) & 0x3
+        if prg_mode < 2:
+            self.map_prg(0x8000, bank >> 1, 0x8000)
+        elif prg_mode == 2:
+            self.map_prg(0x8000, outer, 0x4000)
+            self.map_prg(0xC000, bank, 0x4000)
+        else:
+            self.map_prg(0x8000, bank, 0x4000)
+            self.map_prg(0xC000, outer | 0x0F, 0x4000)
+
+        if self.control & 0x10:
+            self.map_chr(0x0000, self.chr_bank0, 0x1000)
+            self.map_chr(0x1000, self.chr_bank1, 0x1000)
+        else:
+            self.map_chr(0x0000, self.chr_bank0 >> 1, 0x2000)
+
+
+class UxROM(Mapper):
+    """
+    a 16KB prg bank switched at $8000, the last one fixed at $C000
+    """
+    number = 2
+    state_format = 'B'
+
+    def reset(self):
+        self.prg_bank = 0
+        self.update_banks()
+
+    def write(self, position: int, value: int):
+        self.prg_bank = value
+        self.map_prg(0x8000, value, 0x4000)
+
+    def update_banks(self):
+        self.map_prg(0x8000, self.prg_bank, 0x4000)
+        self.map_prg(0xC000, -1, 0x4000)
+        self.map_chr(0x0000, 0, 0x2000)
+
+    def get_state(self) -> tuple:
+        return self.prg_bank,
+
+    def set_state(self, state: tuple):
+        self.prg_bank, = state
+        self.update_banks()
+
+
+class CNROM(Mapper):
+    """
+    fixed prg, an 8KB chr bank switched by any write
+    """
+    number = 3
+    state_format = 'B'
+
+    def reset(self):
+        self.chr_bank = 0
+        self.update_banks()
+
+    def write(self, position: int, value: int):
+        self.chr_bank = value
+        self.map_chr(0x0000, value, 0x2000)
+
+    def update_banks(self):
+        super().update_banks()
+        self.map_chr(0x0000, self.chr_bank, 0x2000)
+
+    def get_state(self) -> tuple:
+        return self.chr_bank,
+
+    def set_state(self, state: tuple):
+        self.chr_bank, = state
+        self.update_banks()
+
+
+class MMC3(Mapper):
+    """
+    eight bank registers picked through $8000 and written through $8001, two switchable 8KB prg banks,
+    chr in 2KB and 1KB banks, and an irq counting down scanlines
+    """
+    number = 4
+    counts_scanlines = True
+    state_format = '8B3B??'
+
+    def reset(self):
+        self.registers = [0, 2, 4, 5, 6, 7, 0, 1]
+        self.bank_select = 0
+        self.irq_latch = 0
+        self.irq_counter = 0
+        self.irq_reload = False
+        self.irq_enabled = False
+        self.update_banks()
+
+    def write(self, position: int, value: int):
+        even = not position & 1
+        region = position & 0xE000
+        if region == 0x8000:
+            if even:
+                self.bank_select = value
+            else:
+                self.registers[self.bank_select & 0x7] = value
+            self.update_banks()
+        elif region == 0xA000:
+            # odd addresses protect the prg ram
+            if even and self.mirroring != Mirroring.four_screen:
+                self.set_mirroring(Mirroring.horizontal if value & 1 else Mirroring.vertical)
+        elif region == 0xC000:
+            if even:
+                self.irq_latch = value
+            else:
+                self.irq_counter = 0
+                self.irq_reload = True
+        else:
+            self.irq_enabled = not even
+            if even:
+                self.set_irq(False)
+
+    def get_state(self) -> tuple:
+        return tuple(self.registers) + (self.bank_select, self.irq_latch, self.irq_counter, self.irq_enabled,
+                                        self.irq_reload)
+
+    def set_state(self, state: tuple):
+        self.registers = list(state[:8])
+        self.bank_select, self.irq_latch, self.irq_counter, self.irq_enabled, self.irq_reload = state[8:]
+        self.update_banks()
+
+    def update_banks(self):
+        registers = self.registers
+        if self.bank_select & 0x40:
+            self.map_prg(0x8000, -2, 0x2000)
+            self.map_prg(0xC000, registers[6], 0x2000)
+        else:
+            self.map_prg(0x8000, registers[6], 0x2000)
+            self.map_prg(0xC000, -2, 0x2000)
+        self.map_prg(0xA000, registers[7], 0x2000)
+        self.map_prg(0xE000, -1, 0x2000)
+
+        # the inversion bit swaps the 2KB and 1KB halves of the pattern tables
+        inversion = (self.bank_select & 0x80) << 5
+        self.map_chr(0x0000 ^ inversion, registers[0] & 0xFE, 0x0400)
+        self.map_chr(0x0400 ^ inversion, registers[0] | 0x01, 0x0400)
+        self.map_chr(0x0800 ^ inversion, registers[1] & 0xFE, 0x0400)
+        self.map_chr(0x0C00 ^ inversion, registers[1] | 0x01, 0x0400)
+        for i in range(4):
+            self.map_chr((0x1000 + i * 0x0400) ^ inversion, registers[2 + i], 0x0400)
+
+    def clock_scanline(self):
+        if self.irq_counter == 0 or self.irq_reload:
+            self.irq_counter = self.irq_latch
+            self.irq_reload = False
+        else:
+            self.irq_counter -= 1
+        if self.irq_counter == 0 and self.irq_enabled:
+            self.set_irq(True)
+
+
+MAPPERS = {mapper.number: mapper for mapper in (NROM, MMC1, UxROM, CNROM, MMC3)}  # type: Dict[int, Type[Mapper]]
+
+
+def create_mapper(rom: 'rom.ROM') -> Mapper:
+    mapper = MAPPERS.get(rom.header.mapper)
+    if mapper is None:
+        raise Exception('Mapper {} is not supported'.format(rom.header.mapper))
+    return mapper(rom)
@@ -0,0 +1,169 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+from memory_owner import MemoryOwnerMixin
+
+PAGE_SIZE = 0x100
+NUM_PAGES = 0x100
+
+
+class UnmappedMemory(object):
+    """
+    stands in for the owner of pages nothing is mapped to
+    """
+    def get(self, position: int, size: int=1):
+        raise Exception('Cannot find memory owner')
+
+    def set(self, position: int, value: int, size: int=1):
+        raise Exception('Cannot find memory owner')
+
+    def read_has_side_effects(self, position: int) -> bool:
+        return True
+
+
+class MemoryBus(object):
+    """
+    the cpu address space as a table of 256 pages of 256 bytes
+
+    a page backed by a buffer (ram, rom) is read and written by indexing that buffer directly,
+    any other page (ppu, apu registers) dispatches to its memory owner
+    mirrors are just several pages pointing at the same buffer or owner
+    """
+    def __init__(self):
+        self.unmapped = UnmappedMemory()
+        self.owners = [self.unmapped] * NUM_PAGES  # type: List[MemoryOwnerMixin]
+        self.read_pages = [None] * NUM_PAGES  # type: List[Optional[memoryview]]
+        self.write_pages = [None] * NUM_PAGES  # type: List[Optional[memoryview]]
+
+        # which of its owners pages each page shows, mirrors of the same memory share one
+        self.physical_pages = list(range(NUM_PAGES))  # type: List[int]
+
+        # callbacks waiting for the next write to a (owner, physical page)
+        self.watchers = {}  # type: Dict[Tuple[object, int], List[Callable[[int], None]]]
+        self.watched = [False] * NUM_PAGES  # type: List[bool]
+
+        # every page showing each (owner, physical page), worked out again after a page changes what it shows
+        self.mirrors = None  # type: Optional[Dict[Tuple[object, int], List[int]]]
+
+    def map_owner(self, owner: MemoryOwnerMixin):
+        """
+        hand every page in the owners range over to it
+        """
+        for page in range(owner.memory_start_location >> 8, (owner.memory_end_location >> 8) + 1):
+            self.owners[page] = owner
+            self.remap_page(page)
+
+    def unmap_owner(self, owner: MemoryOwnerMixin):
+        for page in range(NUM_PAGES):
+            if self.owners[page] is owner:
+                self.owners[page] = self.unmapped
+                self.remap_page(page)
+
+    def remap_page(self, page: int):
+        """
+        refresh the buffers of a page from its owner, e.g. after a bank switch
+        """
+        owner = self.owners[page]
+        physical_page = self.physical_pages[page]
+        if owner is self.unmapped:
+            self.read_pages[page] = None
+            self.write_pages[page] = None
+            self.physical_pages[page] = page
+        else:
+            self.read_pages[page] = owner.read_page(page)
+            self.write_pages[page] = owner.write_page(page)
+            self.physical_pages[page] = owner.physical_page(page)
+        if self.physical_pages[page] != physical_page or self.mirrors is not None and \
+                page not in self.mirrors.get((owner, physical_page), ()):
+            self.mirrors = None
+
+        # a watch stays with the memory it was set on
+        self.watched[page] = (owner, self.physical_pages[page]) in self.watchers
+        if self.watched[page]:
+            self.write_pages[page] = None
+
+    def remap_physical_page(self, owner: MemoryOwnerMixin, physical_page: int):
+        """
+        refresh every page showing a physical page of owner, after the owner moved it to another buffer
+        """
+        for page in self._mirrors((owner, physical_page)):
+            self.remap_page(page)
+
+    def fork(self, owners: Dict[MemoryOwnerMixin, MemoryOwnerMixin]) -> 'MemoryBus':
+        """
+        a copy of the page table with the owners swapped for their copies in owners,
+        which have to show the same buffers as the ones they replace, see SharedPagesMixin.share
+        the watches stay with this bus
+        """
+        bus = MemoryBus()
+        owners = dict(owners)
+        owners[self.unmapped] = bus.unmapped
+        bus.owners = list(map(owners.get, self.owners, self.owners))
+        bus.physical_pages = list(self.physical_pages)
+        bus.read_pages = list(self.read_pages)
+        bus.write_pages = list(self.write_pages)
+        if any(self.watched):
+            for page, watched in enumerate(self.watched):
+                if watched:
+                    bus.write_pages[page] = self.owners[page].write_page(page)
+        if self.mirrors is not None:
+            bus.mirrors = {(owners.get(owner, owner), physical_page): pages
+                           for (owner, physical_page), pages in self.mirrors.items()}
+        return bus
+
+    def watch_writes(self, page: int, callback: Callable[[int], None]):
+        """
+        call back once, just before the memory shown at a page is next written through any of its mirrors
+        until then writes to it take the slow path through the bus
+        """
+        key = (self.owners[page], self.physical_pages[page])
+        self.watchers.setdefault(key, []).append(callback)
+        for mirror in self._mirrors(key):
+            self.watched[mirror] = True
+            self.write_pages[mirror] = None
+
+    def cancel_watch(self, owner: MemoryOwnerMixin, physical_page: int, callback: Callable[[int], None]):
+        """
+        take back a watch_writes callback, the pages go back to fast writes once nothing watches them
+        """
+        key = (owner, physical_page)
+        callbacks = self.watchers.get(key)
+        if callbacks is None:
+            return
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if not callbacks:
+            del self.watchers[key]
+            for mirror in self._mirrors(key):
+                self.remap_page(mirror)
+
+    def _mirrors(self, key: Tuple[object, int]) -> List[int]:
+        if self.mirrors is None:
+            self.mirrors = {}
+            for page in range(NUM_PAGES):
+                self.mirrors.setdefault((self.owners[page], self.physical_pages[page]), []).append(page)
+        return self.mirrors.get(key, [])
+
+    def _fire_watchers(self, page: int):
+        key = (self.owners[page], self.physical_pages[page])
+        callbacks = self.watchers.pop(key, [])
+        for mirror in self._mirrors(key):
+            self.remap_page(mirror)
+        for callback in callbacks:
+            callback(page)
+
+    def read(self, location: int) -> int:
+        page = self.read_pages[location >> 8]
+        if page is not None:
+            return page[location & 0xFF]
+        return self.owners[location >> 8].get(location)
+
+    def write(self, location: int, value: int):
+        page_number = location >> 8
+        page = self.write_pages[page_number]
+        if page is None and self.watched[page_number]:
+            self._fire_watchers(page_number)
+            page = self.write_pages[page_number]
+        if page is not None:
+            page[location & 0xFF] = value
+        else:
+            self.owners[page_number].set(location, value)
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from abc import abstractmethod, ABC, abstractproperty
 
 from helpers import short_to_bytes, bytes_to_short
@@ -25,6 +25,34 @@ class MemoryOwnerMixin(ABC):
     def get_memory(self) -> List[int]:
         pass
 
+    def read_page(self, page: int) -> Optional[memoryview]:
+        """
+        buffer the memory bus reads a 256 byte page from directly,
+        None routes reads of the page through get
+        """
+        return None
+
+    def write_page(self, page: int) -> Optional[memoryview]:
+        """
+        buffer the memory bus writes a 256 byte page to directly,
+        None routes writes to the page through set
+        """
+        return None
+
+    def read_has_side_effects(self, position: int) -> bool:
+        """
+        whether reading a location changes more than a repeated read of it could see,
+        like the shift register of a controller
+        """
+        return False
+
+    def physical_page(self, page: int) -> int:
+        """
+        which of the owners own pages is visible at a bus page,
+        mirrors of the same memory return the same number
+        """
+        return page
+
     def get(self, position: int, size: int=1):
         """
         get bytes at given position and size, could be multiple bytes
@@ -0,0 +1,209 @@
+from typing import Optional
+
+from apu import APU
+from cpu import CPU
+from ppu import DOTS_PER_FRAME, DOTS_PER_SCANLINE, PPU, SCANLINES_PER_FRAME
+from prg_ram import PRGRAM
+from ram import RAM
+from rom import ROM
+from savestate import SaveState
+
+# the master clock runs at 21.477272 MHz on ntsc, the cpu takes 12 of its ticks a cycle and the ppu 4 a dot
+MASTER_TICKS_PER_CYCLE = 12
+MASTER_TICKS_PER_DOT = 4
+DOTS_PER_CYCLE = MASTER_TICKS_PER_CYCLE // MASTER_TICKS_PER_DOT
+
+# the dot of each scanline that mappers counting scanlines see the ppu address line rise at
+SCANLINE_COUNTER_DOT = 260
+
+
+class NES:
+    """
+    the whole console, the cpu runs ahead and the ppu and apu only catch up with it when something could see
+    the difference: an access to their registers, a scheduled event like the vblank, or the end of a run
+    """
+    def __init__(self, rom: ROM, save_path: Optional[str] = None):
+        self.ram = RAM()
+        self.ppu = PPU()
+        self.apu = APU()
+        self.rom = rom
+
+        # only a battery keeps the cartridge ram in a save file
+        self.prg_ram = PRGRAM(save_path if rom.header.battery else None)
+
+        self.cpu = CPU(self.ram, self.ppu, self.apu)
+        self.cpu.bus.map_owner(self.prg_ram)
+        self.apu.oam_dma = self.oam_dma
+        self.cpu.start_up()
+        self.cpu.load_rom(rom, False)
+
+        self.ppu.nmi = self.cpu.trigger_nmi
+        self.ppu.load_mapper(rom.mapper)
+        self.ppu.clock = self.current_dot
+        self.ppu.prediction_changed = self.predict_sprite_flags
+        self.reschedule()
+
+        # the layout of save states, made on the first one
+        self.save_states = None  # type: Optional[SaveState]
+
+    def fork(self) -> 'NES':
+        """
+        a copy of the machine that runs on separately from here, cheap enough to branch off every state of a search
+        the ram and prg ram pages are shared with this one until either side writes them, the rom data for good,
+        the ppu memories and chr ram are copied, see PPU.fork
+        a fork has no save file
+        """
+        nes = NES.__new__(NES)
+        nes.ram = RAM()
+        nes.ppu = self.ppu.fork()
+        nes.apu = APU()
+        nes.apu.set_state(self.apu.get_state())
+        nes.rom = self.rom.fork()
+        nes.prg_ram = PRGRAM()
+
+        nes.cpu = self.cpu.fork({self.ram: nes.ram, self.ppu: nes.ppu, self.apu: nes.apu, self.rom: nes.rom,
+                                 self.prg_ram: nes.prg_ram})
+        nes.ram.share(self.ram, nes.cpu.bus, self.cpu.bus)
+        nes.prg_ram.share(self.prg_ram, nes.cpu.bus, self.cpu.bus)
+
+        nes.ppu.nmi = nes.cpu.trigger_nmi
+        nes.ppu.load_mapper(nes.rom.mapper)
+        nes.ppu.clock = nes.current_dot
+        nes.ppu.prediction_changed = nes.predict_sprite_flags
+        nes.apu.oam_dma = nes.oam_dma
+        nes.reschedule()
+        nes.save_states = None
+        return nes
+
+    def save_state_layout(self) -> SaveState:
+        if self.save_states is None:
+            self.save_states = SaveState(self)
+        return self.save_states
+
+    def save_state(self, buffer: Optional[bytearray] = None) -> bytearray:
+        """
+        snapshot the whole machine into buffer, or a new one, see SaveState
+        """
+        return self.save_state_layout().save(buffer)
+
+    def load_state(self, buffer: bytearray):
+        self.save_state_layout().load(buffer)
+
+    def flush(self):
+        """
+        write the battery backed ram back to the save file
+        """
+        self.prg_ram.flush()
+
+    def close(self):
+        self.cpu.bus.unmap_owner(self.prg_ram)
+        self.prg_ram.close()
+
+    @property
+    def master_clock(self) -> int:
+        """
+        master clock ticks since power up, as far as the cpu has run
+        """
+        return self.cpu.cycles * MASTER_TICKS_PER_CYCLE
+
+    def current_dot(self) -> int:
+        """
+        the ppu dot the cpu has got to
+        """
+        return self.master_clock // MASTER_TICKS_PER_DOT
+
+    def sync(self):
+        """
+        catch the ppu and apu up with the cpu
+        """
+        self.ppu.run(self.current_dot() - self.ppu.dots)
+        self.apu.run(self.cpu.cycles - self.apu.cycles)
+
+    def reschedule(self):
+        """
+        schedule the events of the devices from where their clocks are now
+        """
+        self.cpu.scheduler.clear()
+        self.schedule_ppu()
+        self.predict_sprite_flags()
+        if self.rom.mapper.counts_scanlines:
+            self.schedule_scanline()
+
+    def schedule_ppu(self):
+        """
+        schedule the next change of the vblank flag or frame, rounded up to a whole cpu cycle
+        """
+        cycle = -(-self.ppu.next_event_dot() // DOTS_PER_CYCLE)
+        self.cpu.scheduler.schedule('ppu', cycle, self.ppu_event)
+
+    def ppu_event(self, cycle: int):
+        self.sync()
+        self.schedule_ppu()
+
+    def predict_sprite_flags(self):
+        """
+        work out when the sprite 0 hit and overflow flags get set as soon as the cpu gets to the scheduler,
+        after the write that changed them has gone through
+        """
+        self.cpu.scheduler.schedule('sprite', self.cpu.cycles, self.sprite_flags_event)
+
+    def sprite_flags_event(self, cycle: int):
+        """
+        set the sprite flags due and schedule the next one, so an idle loop polling for it isn't run past it
+        """
+        self.sync()
+        self.ppu.update_sprite_flags()
+        dot = self.ppu.next_sprite_flag_dot()
+        if dot is not None:
+            self.cpu.scheduler.schedule('sprite', -(-dot // DOTS_PER_CYCLE), self.sprite_flags_event)
+
+    def schedule_scanline(self):
+        """
+        schedule the next dot 260, where the ppu fetches sprite patterns and scanline counters get clocked
+        """
+        ppu = self.ppu
+        scanline = (self.master_clock // MASTER_TICKS_PER_DOT - ppu.frame_start) // DOTS_PER_SCANLINE
+        dot = ppu.frame_start + scanline * DOTS_PER_SCANLINE + SCANLINE_COUNTER_DOT
+        if dot <= self.master_clock // MASTER_TICKS_PER_DOT:
+            dot += DOTS_PER_SCANLINE
+            if scanline == SCANLINES_PER_FRAME - 1:
+                dot += ppu.frame_length() - DOTS_PER_FRAME
+        self.cpu.scheduler.schedule('scanline', -(-dot // DOTS_PER_CYCLE), self.scanline_event)
+
+    def scanline_event(self, cycle: int):
+        self.sync()
+        if self.ppu.rendering_enabled() and (self.ppu.scanline < 240 or self.ppu.scanline == 261):
+            self.rom.mapper.clock_scanline()
+        self.schedule_scanline()
+
+    def oam_dma(self, page: int):
+        """
+        a write to $4014 copies a page of cpu memory into oam, stalling the cpu for 513 cycles,
+        or 514 starting on an odd one
+        """
+        stall = 513 + (self.cpu.cycles & 1)
+        view = self.cpu.bus.read_pages[page]
+        if view is not None:
+            data = bytes(view)
+        else:
+            data = bytes(self.cpu.get_memory((page << 8) | offset) for offset in range(0x100))
+        self.ppu.write_oam(data)
+        self.cpu.cycles += stall
+
+    def run_cycles(self, cycles: int):
+        """
+        run the cpu for at least cycles, stopping at the first instruction boundary past them
+        """
+        self.cpu.run(max_cycles=cycles)
+        self.sync()
+
+    def run_frame(self) -> int:
+        """
+        run until the ppu starts the next frame, returns its number
+        """
+        frame = self.ppu.frame
+        while self.ppu.frame == frame:
+            frame_end = self.ppu.frame_start + self.ppu.frame_length()
+            dots = frame_end - self.master_clock // MASTER_TICKS_PER_DOT
+            self.run_cycles(max(1, -(-dots // DOTS_PER_CYCLE)))
+        return self.ppu.frame
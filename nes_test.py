@@ -1,19 +1,41 @@
-from typing import List
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+import os
 import re
+
+import numpy as np
+
 from cpu import CPU
+from tracing import BinaryTrace, format_line, ppu_dot
+
+pattern = r'(.{4})\s*(.{9}).(.{4})(.{28})A:(.{2})\sX:(.{2})\sY:(.{2})\sP:(.{2})\sSP:(.{2})\sCYC:\s*(\d+).*'
+compiled_pattern = re.compile(pattern)
+
+# a parsed log line, the data bytes are zero padded like in a binary trace
+LOG_DTYPE = np.dtype([
+    ('pc', '<u2'),
+    ('opcode', 'u1'),
+    ('data', 'u1', (2,)),
+    ('a', 'u1'),
+    ('x', 'u1'),
+    ('y', 'u1'),
+    ('p', 'u1'),
+    ('sp', 'u1'),
+    ('cyc', '<u2'),
+])
+
+LOG_FIELDS = ['pc', 'opcode', 'data', 'a', 'x', 'y', 'p', 'sp', 'cyc']
 
 
 class NesTestLog:
-    def __init__(self, lines: List[str]):
-        self.lines = []  # type: List[NesTestLine]
+    """
+    checks a cpu against the log one instruction at a time, lines are only parsed when they are reached
+    """
+    def __init__(self, lines: Iterable[str]):
+        self.lines = iter(lines)
         self.index = 0
-        pattern = r'(.{4})\s*(.{9}).(.{4})(.{28})A:(.{2})\sX:(.{2})\sY:(.{2})\sP:(.{2})\sSP:(.{2})\sCYC:(.*)'
-        compiled = re.compile(pattern)
-        for line in lines:
-            self.lines.append(NesTestLine(line, compiled))
 
     def compare(self, cpu: CPU):
-        self.lines[self.index].compare(cpu)
+        NesTestLine(next(self.lines), compiled_pattern).compare(cpu)
 
         self.index += 1
 
@@ -49,15 +71,155 @@ class NesTestLine:
         """
         checks a cpu against a log line
         """
-        pc_match = self.expected_pc_reg == cpu.pc_reg
-        instruction_match = self.expected_instruction in cpu.instruction.__name__.upper()
-        data_bytes_match = self.expected_bytes == cpu.data_bytes
-        a_match = self.expected_a == cpu.a_reg
-        x_match = self.expected_x == cpu.x_reg
-        y_match = self.expected_y == cpu.y_reg
-        p_match = self.expected_p == cpu.status_reg.to_int()
-        sp_match = self.expected_sp == cpu.sp_reg
-        valid = pc_match and instruction_match and a_match and x_match and y_match and p_match and sp_match and data_bytes_match
-        if not valid:
-            raise Exception('Instruction results not expected\n{}'.format(cpu.instruction))
+        differences = [(name, expected, actual) for name, expected, actual in [
+            ('pc', self.expected_pc_reg, cpu.pc_reg),
+            ('instruction', self.expected_instruction, cpu.instruction.__name__.upper()[:3]),
+            ('data', self.expected_bytes.hex(), cpu.data_bytes.hex()),
+            ('a', self.expected_a, cpu.a_reg),
+            ('x', self.expected_x, cpu.x_reg),
+            ('y', self.expected_y, cpu.y_reg),
+            ('p', self.expected_p, cpu.status_reg.to_int()),
+            ('sp', self.expected_sp, cpu.sp_reg),
+            ('cyc', self.expected_cyc, ppu_dot(cpu.cycles)),
+        ] if expected != actual]
+        if differences:
+            raise Exception('Instruction results not expected\n{}\n{}'.format(
+                self.line.rstrip(), '\n'.join('  {}: expected {} got {}'.format(*d) for d in differences)))
+        return True
+
+
+def parse_lines(lines: List[str]) -> np.ndarray:
+    """
+    parse log lines into LOG_DTYPE records
+    """
+    records = np.zeros(len(lines), LOG_DTYPE)
+    for record, line in zip(records, lines):
+        matches = compiled_pattern.match(line)
+        instruction_bytes = bytes.fromhex(matches.group(2))
+        record['pc'] = int(matches.group(1), 16)
+        record['opcode'] = instruction_bytes[0]
+        record['data'][:len(instruction_bytes) - 1] = list(instruction_bytes[1:])
+        record['a'] = int(matches.group(5), 16)
+        record['x'] = int(matches.group(6), 16)
+        record['y'] = int(matches.group(7), 16)
+        record['p'] = int(matches.group(8), 16)
+        record['sp'] = int(matches.group(9), 16)
+        record['cyc'] = int(matches.group(10))
+    return records
+
+
+def read_log(path: str, chunk_lines: int = 0x1000, cache: bool = True) -> Iterator[np.ndarray]:
+    """
+    the records of a log in chunks, parsed only as far as they are read
+    a fully parsed log is cached as <path>.npy and loaded from there while it is newer than the log
+    """
+    cache_path = path + '.npy'
+    if cache and os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+        records = np.load(cache_path, mmap_mode='r')
+        for start in range(0, len(records), chunk_lines):
+            yield records[start:start + chunk_lines]
+        return
+
+    chunks = []
+    with open(path, 'r') as log_file:
+        lines = []
+        for line in log_file:
+            if line.strip():
+                lines.append(line)
+            if len(lines) == chunk_lines:
+                chunks.append(parse_lines(lines))
+                yield chunks[-1]
+                lines = []
+        if lines:
+            chunks.append(parse_lines(lines))
+            yield chunks[-1]
+
+    if cache:
+        np.save(cache_path, np.concatenate(chunks) if chunks else np.zeros(0, LOG_DTYPE))
+
+
+def trace_to_log(records: np.ndarray) -> np.ndarray:
+    """
+    binary trace records as log records
+    """
+    log_records = np.zeros(len(records), LOG_DTYPE)
+    for name in LOG_FIELDS[:-1]:
+        log_records[name] = records[name]
+    log_records['cyc'] = ppu_dot(records['cycles'])
+    return log_records
+
+
+def first_divergence(expected: np.ndarray, actual: np.ndarray) -> Optional[int]:
+    """
+    index of the first record that differs in any field, compared across the whole chunk at once
+    """
+    count = min(len(expected), len(actual))
+    expected = expected[:count]
+    actual = actual[:count]
+    mismatch = np.zeros(count, bool)
+    for name in LOG_FIELDS:
+        differs = expected[name] != actual[name]
+        mismatch |= differs.any(axis=1) if differs.ndim > 1 else differs
+    indices = np.flatnonzero(mismatch)
+    return int(indices[0]) if len(indices) else None
+
+
+class Divergence(NamedTuple):
+    """
+    the first log line the cpu did not match
+    """
+    line: int
+    expected: str
+    actual: str
+    fields: List[Tuple[str, int, int]]
+
+    def __str__(self):
+        return 'line {}\nexpected {}\nactual   {}\n{}'.format(
+            self.line, self.expected, self.actual,
+            '\n'.join('  {}: expected {} got {}'.format(*field) for field in self.fields))
+
+
+def divergence(line: int, expected: np.void, actual: np.void, opcodes: List['cpu.Opcode']) -> Divergence:
+    """
+    diff two log records field by field, line counts from 0
+    """
+    def text(record):
+        opcode = opcodes[int(record['opcode'])]
+        return format_line(int(record['pc']), opcode, bytes(record['data'][:opcode.data_length]),
+                           int(record['a']), int(record['x']), int(record['y']), int(record['p']), int(record['sp']),
+                           int(record['cyc']))
+
+    fields = [(name, expected[name].tolist(), actual[name].tolist()) for name in LOG_FIELDS
+              if np.any(expected[name] != actual[name])]
+    return Divergence(line, text(expected), text(actual), fields)
+
+
+def run_log(cpu: CPU, log_path: str, trace_path: str, chunk_lines: int = 0x1000) -> Optional[Divergence]:
+    """
+    run the cpu against a whole log, recording a binary trace and comparing it chunk by chunk
+    returns the first divergence, None when every line of the log matched
+    """
+    tracer = BinaryTrace(trace_path, chunk_lines)
+    cpu.tracer = tracer
+    checked = 0
+    try:
+        for expected in read_log(log_path, chunk_lines):
+            error = None
+            try:
+                cpu.run(max_instructions=len(expected))
+            except Exception as e:
+                error = e
+            tracer.flush()
 
+            # an instruction that raised is still in the trace, it only counts as the divergence if it differs
+            actual = trace_to_log(tracer.records[checked:tracer.count])
+            index = first_divergence(expected, actual)
+            if index is not None:
+                return divergence(checked + index, expected[index], actual[index], cpu.opcodes)
+            if error is not None:
+                raise error
+            checked += len(expected)
+    finally:
+        cpu.tracer = None
+        tracer.close()
+    return None
@@ -1,15 +1,706 @@
-from typing import List
+from typing import Callable, List, Optional, Tuple
 
+import numpy as np
+
+from mapper import Mirroring
 from memory_owner import MemoryOwnerMixin
 
+# a frame is 262 scanlines of 341 dots, the pre-render scanline is the last one
+DOTS_PER_SCANLINE = 341
+SCANLINES_PER_FRAME = 262
+DOTS_PER_FRAME = DOTS_PER_SCANLINE * SCANLINES_PER_FRAME
+
+# the vblank flag is set at dot 1 of scanline 241 and cleared at dot 1 of the pre-render scanline
+VBLANK_START_DOT = 241 * DOTS_PER_SCANLINE + 1
+VBLANK_END_DOT = 261 * DOTS_PER_SCANLINE + 1
+
+VISIBLE_SCANLINES = 240
+SCREEN_WIDTH = 256
+
+# the sprite 0 hit or overflow dot of a frame without one, past the end of any frame
+NO_HIT = DOTS_PER_FRAME
+
+# sprites shown on a scanline, the ones after them in oam only set the overflow flag
+SPRITES_PER_LINE = 8
+
+PPUCTRL = 0
+PPUMASK = 1
+PPUSTATUS = 2
+OAMADDR = 3
+OAMDATA = 4
+PPUSCROLL = 5
+PPUADDR = 6
+PPUDATA = 7
+
+# which of the physical nametables each of the four in the address space shows
+NAMETABLE_MIRRORS = {
+    Mirroring.horizontal: [0, 0, 1, 1],
+    Mirroring.vertical: [0, 1, 0, 1],
+    Mirroring.single_lower: [0, 0, 0, 0],
+    Mirroring.single_upper: [1, 1, 1, 1],
+    Mirroring.four_screen: [0, 1, 2, 3],
+}
+
+# the parts of the vram address: fine y, nametable select, coarse y and coarse x
+FINE_Y = 0x7000
+NAMETABLE_X = 0x0400
+NAMETABLE_Y = 0x0800
+COARSE_Y = 0x03E0
+COARSE_X = 0x001F
+
+# the vram address bits copied from t at the end of each scanline
+HORIZONTAL_BITS = NAMETABLE_X | COARSE_X
+
 
 class PPU(MemoryOwnerMixin, object):
+    """
+    the picture processing unit, its registers sit at $2000-$2007 and draw a frame of palette indices
+
+    the ppu lags behind the cpu and only catches up to it when its registers are accessed or an event is due,
+    the dots of the sprite 0 hit and overflow are worked out ahead from the registers as they are, so polling
+    the status doesn't draw anything, until a write that changes the picture makes it work it out again
+    the picture is drawn a run of scanlines at a time as whole numpy operations, the scanlines started so far
+    are only drawn once a register write is about to change how the next ones look, or when the frame ends
+    sprites are picked for each scanline of a run at once, as masks over the 64 of them in oam
+    scrolling follows the vram address v and its latch t the way the hardware moves them between scanlines
+    """
     memory_start_location = 0x2000
-    memory_end_location = 0x2007
+    memory_end_location = 0x3FFF
+
+    # struct format of get_state, for save states
+    state_format = '3Q8B2HB?3B2I'
 
     def __init__(self):
+        # the last value written to each register, the status holds the flags
         self.memory = [0] * 8  # type: List[int]
 
+        # the vram address, its latch, the fine x scroll and which write of a pair is next
+        self.v = 0
+        self.t = 0
+        self.x = 0
+        self.w = False
+
+        # $2007 reads come out of a buffer a read behind, except for the palette
+        self.read_buffer = 0
+        # the value last put on the data bus, reads of the write only registers see it
+        self.latch = 0
+
+        # the nametables, the 2KB in the console and another 2KB a four screen board adds
+        self.vram = bytearray(0x1000)
+        self.oam = bytearray(0x100)
+        # y, tile, attributes and x of each sprite
+        self.oam_array = np.frombuffer(self.oam, dtype=np.uint8).reshape(64, 4)
+        self.palette = bytearray(0x20)
+        self.vram_array = np.frombuffer(self.vram, dtype=np.uint8)
+
+        # the 256 byte pages of vram, oam and the palette written since whoever reads these cleared them, see Rewind
+        self.vram_written = bytearray(len(self.vram) // 0x100)
+        self.oam_written = bytearray(1)
+        self.palette_written = bytearray(1)
+        self.palette_array = np.frombuffer(self.palette, dtype=np.uint8)
+
+        # both pattern tables decoded into pixel values 0-3, a tile is decoded again once its 16 bytes change
+        self.tiles = np.zeros((512, 8, 8), dtype=np.uint8)
+        self.dirty_tiles = np.ones(512, dtype=bool)
+
+        # palette indices of the picture and how many of its scanlines are drawn
+        self.framebuffer = np.zeros((VISIBLE_SCANLINES, SCREEN_WIDTH), dtype=np.uint8)
+        self.lines_drawn = 0
+
+        # the frame dots of the sprite 0 hit and overflow on the scanlines drawn so far,
+        # and of the first ones including the scanlines still to draw, None until they are worked out
+        self.drawn_hit = NO_HIT
+        self.drawn_overflow = NO_HIT
+        self.predicted = None  # type: Optional[Tuple[int, int]]
+
+        # dots run since power up and the dot the current frame started at
+        self.dots = 0
+        self.frame_start = 0
+        self.frame = 0
+
+        # called when the vblank nmi fires
+        self.nmi = None  # type: Optional[Callable[[], None]]
+        # called when the sprite 0 hit and overflow dots have to be worked out again, so they can be scheduled
+        self.prediction_changed = None  # type: Optional[Callable[[], None]]
+        # the dot the cpu has got to, see NES.current_dot
+        self.clock = None  # type: Optional[Callable[[], int]]
+
+        # the mapper of the cartridge, for the pattern tables and the nametable mirroring
+        self.mapper = None  # type: Optional['mapper.Mapper']
+
+    def load_mapper(self, mapper: 'mapper.Mapper'):
+        """
+        draw the pattern tables and nametable mirroring of a mapper, its chr bank switches reach the tile cache
+        """
+        self.mapper = mapper
+        mapper.remap_chr_page = self.chr_page_changed
+        mapper.picture_changing = self.mapper_changing
+        self.dirty_tiles[:] = True
+        self.forget_prediction()
+
+    def get_state(self) -> tuple:
+        return (self.dots, self.frame_start, self.frame) + tuple(self.memory) + \
+            (self.v, self.t, self.x, self.w, self.read_buffer, self.latch, self.lines_drawn, self.drawn_hit,
+             self.drawn_overflow)
+
+    def set_state(self, state: tuple):
+        self.dots, self.frame_start, self.frame = state[:3]
+        self.memory[:] = state[3:11]
+        self.v, self.t, self.x, self.w, self.read_buffer, self.latch, self.lines_drawn, self.drawn_hit, \
+            self.drawn_overflow = state[11:]
+        self.forget_prediction()
+
+    def fork(self) -> 'PPU':
+        """
+        a copy with its own memories, the callbacks, clock and mapper are left to be connected
+        vram, oam and the palette are copied rather than shared like the cpu ram, the ppu writes them itself and not
+        through a bus a write watch could be put on, and the 2KB of vram is a single copy
+        """
+        ppu = PPU()
+        ppu.set_state(self.get_state())
+        ppu.vram[:] = self.vram
+        ppu.oam[:] = self.oam
+        ppu.palette[:] = self.palette
+        ppu.framebuffer[:] = self.framebuffer
+        return ppu
+
     def get_memory(self) -> List[int]:
         return self.memory
 
+    def get(self, position: int, size: int=1):
+        """
+        the 8 registers are mirrored every 8 bytes up to $3FFF, reading the write only ones sees the data bus
+        """
+        self.catch_up()
+        register = position & 0x7
+        if register == PPUSTATUS:
+            self.update_sprite_flags()
+            # reading the status clears the vblank flag and the write pair
+            value = (self.memory[PPUSTATUS] & 0xE0) | (self.latch & 0x1F)
+            self.memory[PPUSTATUS] &= 0x7F
+            self.w = False
+        elif register == OAMDATA:
+            value = self.oam[self.memory[OAMADDR]]
+        elif register == PPUDATA:
+            if self.rendering_enabled():
+                # the address moves on
+                self.render_to(self.dots)
+                self.forget_prediction()
+            address = self.v & 0x3FFF
+            if address >= 0x3F00:
+                # the palette is read straight away, the buffer gets the nametable underneath it
+                value = (self.palette[self.palette_index(address)] & 0x3F) | (self.latch & 0xC0)
+                self.read_buffer = self.read_vram(address - 0x1000)
+            else:
+                value = self.read_buffer
+                self.read_buffer = self.read_vram(address)
+            self.increment_address()
+        else:
+            value = self.latch
+        self.latch = value
+        return value
+
+    def set(self, position: int, value: int, size: int=1):
+        self.catch_up()
+        register = position & 0x7
+        self.latch = value
+        if self.lines_drawn < VISIBLE_SCANLINES and self.changes_picture(register):
+            # the scanlines so far are drawn before they can look any different
+            self.render_to(self.dots)
+            self.forget_prediction()
+        if register == PPUCTRL:
+            if value & 0x80 and not self.memory[PPUCTRL] & 0x80 and self.memory[PPUSTATUS] & 0x80:
+                # turning the nmi on during vblank fires it straight away
+                self.fire_nmi()
+            self.t = (self.t & ~(NAMETABLE_X | NAMETABLE_Y)) | ((value & 0x3) << 10)
+        elif register == PPUSTATUS:
+            # read only
+            return
+        elif register == OAMDATA:
+            self.oam[self.memory[OAMADDR]] = value
+            self.oam_written[0] = 1
+            self.memory[OAMADDR] = (self.memory[OAMADDR] + 1) & 0xFF
+            self.forget_prediction()
+            return
+        elif register == PPUSCROLL:
+            if not self.w:
+                self.t = (self.t & ~COARSE_X) | (value >> 3)
+                self.x = value & 0x7
+            else:
+                self.t = (self.t & ~(FINE_Y | COARSE_Y)) | ((value & 0x7) << 12) | ((value & 0xF8) << 2)
+            self.w = not self.w
+        elif register == PPUADDR:
+            if not self.w:
+                self.t = (self.t & 0x00FF) | ((value & 0x3F) << 8)
+            else:
+                self.t = (self.t & 0xFF00) | value
+                self.v = self.t
+            self.w = not self.w
+        elif register == PPUDATA:
+            self.write_vram(self.v & 0x3FFF, value)
+            self.increment_address()
+        self.memory[register] = value
+
+    def changes_picture(self, register: int) -> bool:
+        """
+        whether a write to a register can change how the scanlines after it look
+        with rendering off they only show the backdrop colour, so only the mask and palette matter
+        """
+        if register == PPUMASK:
+            return True
+        if register == PPUDATA and self.v & 0x3F00 == 0x3F00:
+            return True
+        return register in (PPUCTRL, OAMDATA, PPUSCROLL, PPUADDR, PPUDATA) and self.rendering_enabled()
+
+    def write_oam(self, data: bytes):
+        """
+        copy a page into oam starting at OAMADDR, like OAM DMA does
+        """
+        self.catch_up()
+        if self.rendering_enabled():
+            self.render_to(self.dots)
+        address = self.memory[OAMADDR]
+        self.oam[address:] = data[:0x100 - address]
+        self.oam[:address] = data[0x100 - address:]
+        self.oam_written[0] = 1
+        self.forget_prediction()
+
+    def read_has_side_effects(self, position: int) -> bool:
+        # reading PPUDATA moves the vram address on, reading the status again only sees the cleared flag
+        return position & 0x7 == 0x7
+
+    def increment_address(self):
+        """
+        $2007 accesses move the vram address on by 1, or by 32 (a row of tiles) with bit 2 of PPUCTRL set
+        """
+        self.v = (self.v + (32 if self.memory[PPUCTRL] & 0x04 else 1)) & 0x7FFF
+
+    def nametable_index(self, address: int) -> int:
+        """
+        where a nametable address is in vram, after mirroring
+        """
+        mirroring = self.mapper.mirroring if self.mapper is not None else Mirroring.horizontal
+        return (NAMETABLE_MIRRORS[mirroring][(address >> 10) & 0x3] << 10) | (address & 0x3FF)
+
+    @staticmethod
+    def palette_index(address: int) -> int:
+        """
+        the backdrop entries of the sprite palettes are mirrors of the ones of the background palettes
+        """
+        index = address & 0x1F
+        return index & 0x0F if index & 0x13 == 0x10 else index
+
+    def read_vram(self, address: int) -> int:
+        """
+        a byte of the ppu address space: pattern tables, nametables, then the palette
+        """
+        address &= 0x3FFF
+        if address < 0x2000:
+            if self.mapper is None:
+                return 0
+            return self.mapper.chr_pages[address >> 8][address & 0xFF]
+        if address < 0x3F00:
+            return self.vram[self.nametable_index(address)]
+        return self.palette[self.palette_index(address)]
+
+    def write_vram(self, address: int, value: int):
+        address &= 0x3FFF
+        if address < 0x2000:
+            # chr rom ignores writes
+            if self.mapper is not None and not self.mapper.chr_pages[address >> 8].readonly:
+                self.mapper.chr_pages[address >> 8][address & 0xFF] = value
+                self.dirty_tiles[address >> 4] = True
+        elif address < 0x3F00:
+            index = self.nametable_index(address)
+            self.vram[index] = value
+            self.vram_written[index >> 8] = 1
+        else:
+            self.palette[self.palette_index(address)] = value
+            self.palette_written[0] = 1
+
+    @property
+    def scanline(self) -> int:
+        return (self.dots - self.frame_start) // DOTS_PER_SCANLINE
+
+    @property
+    def dot(self) -> int:
+        return (self.dots - self.frame_start) % DOTS_PER_SCANLINE
+
+    def rendering_enabled(self) -> bool:
+        return bool(self.memory[PPUMASK] & 0x18)
+
+    def frame_length(self) -> int:
+        """
+        odd frames skip the last dot of the pre-render scanline while rendering
+        """
+        return DOTS_PER_FRAME - (self.frame & 1 and self.rendering_enabled())
+
+    def next_event_dot(self) -> int:
+        """
+        the dot the vblank flag or the frame next changes at
+        """
+        frame_dot = self.dots - self.frame_start
+        if frame_dot < VBLANK_START_DOT:
+            return self.frame_start + VBLANK_START_DOT
+        if frame_dot < VBLANK_END_DOT:
+            return self.frame_start + VBLANK_END_DOT
+        return self.frame_start + self.frame_length()
+
+    def catch_up(self):
+        """
+        run up to the dot the cpu has got to
+        """
+        if self.clock is not None:
+            dots = self.clock() - self.dots
+            if dots > 0:
+                self.run(dots)
+
+    def run(self, dots: int):
+        """
+        advance by dots, drawing the scanlines started on the way and setting and clearing the vblank flag
+        """
+        target = self.dots + dots
+        while True:
+            event_dot = self.next_event_dot()
+            if event_dot > target:
+                break
+            frame_dot = event_dot - self.frame_start
+            self.dots = event_dot
+            if frame_dot == VBLANK_START_DOT:
+                # the picture is finished
+                self.render_to(event_dot)
+                self.memory[PPUSTATUS] |= 0x80
+                if self.memory[PPUCTRL] & 0x80:
+                    self.fire_nmi()
+            elif frame_dot == VBLANK_END_DOT:
+                # the sprite flags go with the vblank flag
+                self.memory[PPUSTATUS] &= 0x1F
+            else:
+                self.frame_start = event_dot
+                self.frame += 1
+                self.lines_drawn = 0
+                self.drawn_hit = NO_HIT
+                self.drawn_overflow = NO_HIT
+                self.forget_prediction()
+                # the pre-render scanline copies the whole latch into the vram address
+                if self.rendering_enabled():
+                    self.v = self.t
+        self.dots = target
+
+    @staticmethod
+    def lines_started(frame_dot: int) -> int:
+        """
+        how many of the visible scanlines have started by a dot of the frame
+        """
+        return min(VISIBLE_SCANLINES, (frame_dot + DOTS_PER_SCANLINE - 1) // DOTS_PER_SCANLINE)
+
+    def render_to(self, dot: int):
+        """
+        draw the scanlines not drawn yet that start before dot
+        """
+        last = self.lines_started(dot - self.frame_start)
+        if last > self.lines_drawn:
+            self.render_lines(self.lines_drawn, last)
+            self.lines_drawn = last
+
+    def render_lines(self, first: int, last: int):
+        """
+        draw scanlines first up to last with the registers as they are now
+        """
+        mask = self.memory[PPUMASK]
+        lines = self.framebuffer[first:last]
+        if not mask & 0x18:
+            lines[:] = self.palette[0]
+        else:
+            # the vram address each scanline starts with
+            addresses = []
+            v = self.v
+            for _ in range(first, last):
+                addresses.append(v)
+                v = self.next_line(v)
+            self.v = v
+
+            if mask & 0x08:
+                colours = self.background(np.array(addresses))
+                hit_lines = self.sprite_zero_lines(first, last)
+                if mask & 0x10 and self.drawn_hit == NO_HIT and hit_lines:
+                    self.drawn_hit = self.find_sprite_zero_hit(
+                        hit_lines, colours[hit_lines.start - first:hit_lines.stop - first])
+            else:
+                colours = np.zeros((last - first, SCREEN_WIDTH), dtype=np.uint8)
+            if mask & 0x10:
+                colours = self.draw_sprites(first, last, colours)
+            if self.drawn_overflow == NO_HIT:
+                self.drawn_overflow = self.find_sprite_overflow(first, last)
+            lines[:] = self.palette_array[colours]
+        if mask & 0x01:
+            # greyscale
+            lines &= 0x30
+
+    def background(self, addresses: np.ndarray) -> np.ndarray:
+        """
+        the background of a scanline for each vram address, as indices into the palette ram, 0 where transparent
+        """
+        # the 33 tiles each scanline touches, fine x scrolls up to 7 pixels into the last
+        columns = (((addresses & COARSE_X) | ((addresses & NAMETABLE_X) >> 5))[:, None] + np.arange(33)) & 0x3F
+        coarse_y = ((addresses & COARSE_Y) >> 5)[:, None]
+        fine_y = (addresses >> 12)[:, None]
+        tables = np.array(NAMETABLE_MIRRORS[self.mapper.mirroring])[((addresses & NAMETABLE_Y) >> 10)[:, None] |
+                                                                     (columns >> 5)]
+        coarse_x = columns & 0x1F
+
+        vram = self.vram_array
+        tiles = vram[(tables << 10) | (coarse_y << 5) | coarse_x]
+        attributes = vram[(tables << 10) | 0x3C0 | ((coarse_y >> 2) << 3) | (coarse_x >> 2)]
+        palettes = (attributes >> (((coarse_y & 0x2) << 1) | (coarse_x & 0x2))) & 0x3
+
+        # the row of pattern pixels of every tile, the background uses one of the two tables
+        table = (self.memory[PPUCTRL] & 0x10) << 4
+        pixels = self.pattern_tiles()[table + tiles, fine_y]
+        colours = np.where(pixels, (palettes << 2)[:, :, None] | pixels, 0)
+        colours = colours.reshape(len(addresses), -1)[:, self.x:self.x + SCREEN_WIDTH]
+        if not self.memory[PPUMASK] & 0x02:
+            # the left 8 pixels are hidden
+            colours[:, :8] = 0
+        return colours
+
+    def sprite_height(self) -> int:
+        return 16 if self.memory[PPUCTRL] & 0x20 else 8
+
+    def sprite_zero_lines(self, first: int, last: int) -> range:
+        """
+        the scanlines from first up to last sprite 0 is on, it shows from the scanline after its y
+        """
+        top = self.oam[0] + 1
+        return range(max(first, top), min(last, top + self.sprite_height()))
+
+    def sprite_zero_pixels(self, lines: range) -> np.ndarray:
+        """
+        where sprite 0 is opaque across each of lines, leaving out the pixels it can't hit the background at
+        """
+        y, tile, attributes, x = self.oam[0:4]
+        rows = np.arange(lines.start, lines.stop) - (y + 1)
+        height = self.sprite_height()
+        if attributes & 0x80:
+            rows = height - 1 - rows
+        if height == 16:
+            # 8x16 sprites take the table from bit 0 of the tile and the tile below for their bottom half
+            tiles = ((tile & 0x01) << 8) + (tile & 0xFE) + (rows >> 3)
+        else:
+            tiles = ((self.memory[PPUCTRL] & 0x08) << 5) | tile
+        pixels = self.pattern_tiles()[tiles, rows & 0x7] != 0
+        if attributes & 0x40:
+            pixels = pixels[:, ::-1]
+
+        opaque = np.zeros((len(lines), SCREEN_WIDTH + 8), dtype=bool)
+        opaque[:, x:x + 8] = pixels
+        opaque = opaque[:, :SCREEN_WIDTH]
+        # never at the last pixel, nor in the left 8 while either half of the picture hides them
+        opaque[:, SCREEN_WIDTH - 1] = False
+        if self.memory[PPUMASK] & 0x06 != 0x06:
+            opaque[:, :8] = False
+        return opaque
+
+    def find_sprite_zero_hit(self, lines: range, background: np.ndarray) -> int:
+        """
+        the frame dot of the first pixel of lines where sprite 0 is over opaque background, or NO_HIT
+        """
+        hits = self.sprite_zero_pixels(lines) & (background != 0)
+        if not hits.any():
+            return NO_HIT
+        line, column = divmod(int(hits.argmax()), SCREEN_WIDTH)
+        return (lines.start + line) * DOTS_PER_SCANLINE + column + 1
+
+    def sprites_on_lines(self, first: int, last: int) -> np.ndarray:
+        """
+        which of the 64 sprites are on each of the scanlines from first up to last
+        """
+        rows = np.arange(first, last)[:, None] - (self.oam_array[:, 0].astype(int) + 1)
+        return (rows >= 0) & (rows < self.sprite_height())
+
+    def find_sprite_overflow(self, first: int, last: int) -> int:
+        """
+        the frame dot of the first of the scanlines from first up to last with more sprites on it than can show,
+        or NO_HIT
+        """
+        if last <= first:
+            return NO_HIT
+        crowded = self.sprites_on_lines(first, last).sum(axis=1) > SPRITES_PER_LINE
+        if not crowded.any():
+            return NO_HIT
+        return (first + int(crowded.argmax())) * DOTS_PER_SCANLINE
+
+    def draw_sprites(self, first: int, last: int, background: np.ndarray) -> np.ndarray:
+        """
+        the sprites of the scanlines from first up to last over their background, both as palette ram indices
+        the first 8 sprites in oam on a scanline show, the lowest one opaque at a pixel decides whether it is
+        in front of the background or behind it even when another sprite would be in front
+        """
+        count = last - first
+        on_line = self.sprites_on_lines(first, last)
+        shown = on_line & (np.cumsum(on_line, axis=1) <= SPRITES_PER_LINE)
+        # the sprites shown on each scanline in oam order, padded with ones that aren't
+        slots = np.argsort(~shown, axis=1, kind='stable')[:, :SPRITES_PER_LINE]
+        valid = np.take_along_axis(shown, slots, axis=1)
+
+        oam = self.oam_array[slots].astype(int)
+        y, tile, attributes, x = oam[..., 0], oam[..., 1], oam[..., 2], oam[..., 3]
+        height = self.sprite_height()
+        rows = np.arange(first, last)[:, None] - (y + 1)
+        rows = np.where(attributes & 0x80, height - 1 - rows, rows) & (height - 1)
+        if height == 16:
+            tiles = ((tile & 0x01) << 8) + (tile & 0xFE) + (rows >> 3)
+        else:
+            tiles = ((self.memory[PPUCTRL] & 0x08) << 5) | tile
+        pixels = self.pattern_tiles()[tiles, rows & 0x7]
+        pixels = np.where((attributes & 0x40)[..., None] != 0, pixels[..., ::-1], pixels)
+        # the sprite palettes are the second half of the palette ram
+        colours = np.where(valid[..., None] & (pixels != 0), 0x10 | ((attributes & 0x3) << 2)[..., None] | pixels, 0)
+        behind = np.broadcast_to((attributes & 0x20 != 0)[..., None], colours.shape)
+
+        # painted from the last slot, a pixel at x up to 255 + 7 lands in the margin past the screen
+        layer = np.zeros((count, SCREEN_WIDTH + 8), dtype=np.uint8)
+        layer_behind = np.zeros((count, SCREEN_WIDTH + 8), dtype=bool)
+        line_indexes = np.arange(count)[:, None]
+        for slot in reversed(range(SPRITES_PER_LINE)):
+            columns = x[:, slot, None] + np.arange(8)
+            opaque = colours[:, slot] != 0
+            layer[line_indexes, columns] = np.where(opaque, colours[:, slot], layer[line_indexes, columns])
+            layer_behind[line_indexes, columns] = np.where(opaque, behind[:, slot],
+                                                           layer_behind[line_indexes, columns])
+        layer = layer[:, :SCREEN_WIDTH]
+        layer_behind = layer_behind[:, :SCREEN_WIDTH]
+        if not self.memory[PPUMASK] & 0x04:
+            # the left 8 pixels are hidden
+            layer[:, :8] = 0
+        return np.where((layer != 0) & ~(layer_behind & (background != 0)), layer, background)
+
+    def predict_sprite_zero_hit(self) -> int:
+        """
+        the frame dot sprite 0 would hit the background at on the scanlines still to draw,
+        if nothing is written before then
+        """
+        lines = self.sprite_zero_lines(self.lines_drawn, VISIBLE_SCANLINES)
+        if self.memory[PPUMASK] & 0x18 != 0x18 or not lines:
+            return NO_HIT
+        v = self.v
+        for _ in range(self.lines_drawn, lines.start):
+            v = self.next_line(v)
+        addresses = []
+        for _ in lines:
+            addresses.append(v)
+            v = self.next_line(v)
+        return self.find_sprite_zero_hit(lines, self.background(np.array(addresses)))
+
+    def predicted_dots(self) -> Tuple[int, int]:
+        """
+        the frame dots of the sprite 0 hit and the sprite overflow this frame, NO_HIT for ones that don't happen
+        """
+        if self.predicted is None:
+            overflow = NO_HIT
+            if self.rendering_enabled():
+                overflow = self.find_sprite_overflow(self.lines_drawn, VISIBLE_SCANLINES)
+            self.predicted = (min(self.drawn_hit, self.predict_sprite_zero_hit()),
+                              min(self.drawn_overflow, overflow))
+        return self.predicted
+
+    def update_sprite_flags(self):
+        """
+        set the sprite 0 hit and overflow flags once their dots have passed
+        """
+        frame_dot = self.dots - self.frame_start
+        if self.memory[PPUSTATUS] & 0x60 != 0x60 and frame_dot < VBLANK_END_DOT:
+            hit, overflow = self.predicted_dots()
+            if hit <= frame_dot:
+                self.memory[PPUSTATUS] |= 0x40
+            if overflow <= frame_dot:
+                self.memory[PPUSTATUS] |= 0x20
+
+    def next_sprite_flag_dot(self) -> Optional[int]:
+        """
+        the dot the sprite 0 hit or overflow flag is set at next, None when neither is still to come this frame
+        """
+        if self.dots - self.frame_start >= VBLANK_END_DOT:
+            return None
+        hit, overflow = self.predicted_dots()
+        dots = [dot for dot, flag in ((hit, 0x40), (overflow, 0x20))
+                if dot != NO_HIT and not self.memory[PPUSTATUS] & flag]
+        return self.frame_start + min(dots) if dots else None
+
+    def forget_prediction(self):
+        self.predicted = None
+        if self.prediction_changed is not None:
+            self.prediction_changed()
+
+    def sprite_zero_hit(self) -> int:
+        """
+        the frame dot of the sprite 0 hit this frame, or NO_HIT
+        """
+        return self.predicted_dots()[0]
+
+    def pattern_tiles(self) -> np.ndarray:
+        """
+        the 512 tiles of both pattern tables as 8x8 pixel values 0-3, from the two bit planes of 8 bytes each
+        only the tiles changed since the last call are decoded
+        """
+        dirty = np.flatnonzero(self.dirty_tiles)
+        if len(dirty):
+            data = np.frombuffer(b''.join(self.mapper.chr_pages), dtype=np.uint8).reshape(512, 2, 8)[dirty]
+            planes = np.unpackbits(data, axis=2).reshape(-1, 2, 8, 8)
+            self.tiles[dirty] = planes[:, 0] | (planes[:, 1] << 1)
+            self.dirty_tiles[:] = False
+        return self.tiles
+
+    def mapper_changing(self):
+        """
+        the mapper is about to switch chr banks or the mirroring, the scanlines so far are drawn with the old ones
+        """
+        self.catch_up()
+        if self.lines_drawn < VISIBLE_SCANLINES and self.rendering_enabled():
+            self.render_to(self.dots)
+        self.forget_prediction()
+
+    def chr_page_changed(self, page: int):
+        """
+        a bank switch put other data in a page of the pattern tables
+        """
+        self.dirty_tiles[page << 4:(page + 1) << 4] = True
+        self.forget_prediction()
+
+    def invalidate_tiles(self):
+        """
+        decode every tile again, for when chr ram was written behind the ppu, e.g. a save state
+        """
+        self.dirty_tiles[:] = True
+        self.forget_prediction()
+
+    def next_line(self, v: int) -> int:
+        """
+        the vram address the scanline after one starting at v starts at, the coarse y moves down a tile every
+        8 lines and the horizontal bits come back from the latch at the end of each
+        """
+        return (self.increment_y(v) & ~HORIZONTAL_BITS) | (self.t & HORIZONTAL_BITS)
+
+    @staticmethod
+    def increment_y(v: int) -> int:
+        """
+        move the vram address down a line, into the next row of tiles and from the bottom of the nametable
+        to the top of the one below it
+        """
+        if v & FINE_Y != FINE_Y:
+            return v + 0x1000
+        v &= ~FINE_Y
+        coarse_y = (v & COARSE_Y) >> 5
+        if coarse_y == 29:
+            coarse_y = 0
+            v ^= NAMETABLE_Y
+        elif coarse_y == 31:
+            # rows 30 and 31 are the attributes, scrolled into they wrap without changing nametable
+            coarse_y = 0
+        else:
+            coarse_y += 1
+        return (v & ~COARSE_Y) | (coarse_y << 5)
+
+    def fire_nmi(self):
+        if self.nmi is not None:
+            self.nmi()
@@ -0,0 +1,61 @@
+from typing import Optional, Union
+import mmap
+import os
+
+from memory_owner import MemoryOwnerMixin
+from shared_pages import SharedPagesMixin
+
+KB = 1024
+
+
+class PRGRAM(SharedPagesMixin, MemoryOwnerMixin, object):
+    """
+    the 8KB of ram on the cartridge at $6000-$7FFF
+
+    with a save path the ram is a shared memory map of the .sav file, so writes cost the same as any other
+    ram write and the os writes the dirty pages back, flush forces that at a frame or exit
+    """
+    memory_start_location = 0x6000
+    memory_end_location = 0x7FFF
+
+    def __init__(self, save_path: Optional[str] = None):
+        self.save_path = save_path
+        self.file = None
+        if save_path is None:
+            self.memory = bytearray(KB * 8)  # type: Union[bytearray, mmap.mmap]
+        else:
+            # a new or short save file is padded out with zeros
+            self.file = open(save_path, 'a+b')
+            if os.fstat(self.file.fileno()).st_size < KB * 8:
+                self.file.truncate(KB * 8)
+            self.memory = mmap.mmap(self.file.fileno(), KB * 8, access=mmap.ACCESS_WRITE)
+        self.init_pages()
+
+    def get_memory(self) -> Union[bytearray, mmap.mmap]:
+        return self.memory
+
+    def read_page(self, page: int) -> Optional[memoryview]:
+        return self.pages[page - 0x60]
+
+    def write_page(self, page: int) -> Optional[memoryview]:
+        return self.pages[page - 0x60]
+
+    def flush(self):
+        """
+        write the ram back to the save file now
+        """
+        if self.file is not None:
+            self.memory.flush()
+
+    def close(self):
+        """
+        flush and unmap the save file, the ram has to be unmapped from the bus first
+        """
+        if self.file is not None:
+            self.flush()
+            # forks showing pages of the map get copies, and no view of it can be left to close it
+            self.detach()
+            self.pages = []
+            self.memory.close()
+            self.file.close()
+            self.file = None
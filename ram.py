@@ -1,17 +1,36 @@
-from typing import List
+from typing import Optional
 
 from memory_owner import MemoryOwnerMixin
+from shared_pages import SharedPagesMixin
 
 KB = 1024
 
 
-class RAM(MemoryOwnerMixin, object):
+class RAM(SharedPagesMixin, MemoryOwnerMixin, object):
     memory_start_location = 0x0
     memory_end_location = 0x1FFF
 
     def __init__(self):
-        # TODO byte vs int?
-        self.memory = [0] * KB * 2  # type: List[int]
+        self.memory = bytearray(KB * 2)
+        self.init_pages()
 
-    def get_memory(self) -> List[int]:
+    def get_memory(self) -> bytearray:
         return self.memory
+
+    def get(self, position: int, size: int=1):
+        return super().get(position & 0x7FF, size)
+
+    def set(self, position: int, value: int, size: int=1):
+        super().set(position & 0x7FF, value, size)
+
+    def read_page(self, page: int) -> Optional[memoryview]:
+        """
+        the 2KB are mirrored four times up to $1FFF
+        """
+        return self.pages[page & 0x7]
+
+    def write_page(self, page: int) -> Optional[memoryview]:
+        return self.pages[page & 0x7]
+
+    def physical_page(self, page: int) -> int:
+        return page & 0x7
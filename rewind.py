@@ -0,0 +1,243 @@
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Tuple
+import struct
+
+PAGE_SIZE = 0x100
+MB = 1024 * 1024
+
+# page count, then the index of each page
+COUNT_FORMAT = struct.Struct('<H')
+
+
+class Capture(NamedTuple):
+    """
+    where a captured state is in the ring
+    """
+    offset: int
+    size: int
+    keyframe: bool
+    frame: int
+
+
+class Rewind(object):
+    """
+    machine states captured every interval frames into a fixed size ring, the oldest dropped first
+
+    every keyframe_interval-th capture is a whole save state, the ones between only hold the registers and
+    the 256 byte pages of ram written since the capture before them
+    written pages of ram are found with one shot write watches on the bus, so a page takes the slow write path
+    once between captures and every write after that is as fast as ever, the ppu marks the pages of its memories
+    it writes itself
+    chr ram, written through mapper pages nothing can hook, is compared page by page with a copy from the capture
+    before
+    """
+    def __init__(self, nes: 'nes.NES', interval: int = 1, keyframe_interval: int = 60, capacity: int = 32 * MB):
+        self.nes = nes
+        self.states = nes.save_state_layout()
+        self.interval = interval
+        self.keyframe_interval = keyframe_interval
+
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.captures = deque()  # type: Deque[Capture]
+        self.head = 0
+        self.frames = 0
+        self.since_keyframe = 0
+
+        # every page of the memories in a save state as (memory, offset in the memory)
+        bus = nes.cpu.bus
+        self.pages = []  # type: List[Tuple[int, int]]
+        self.page_indexes = {}  # type: Dict[Tuple[object, int], int]
+        self.watched_pages = []  # type: List[Tuple[int, int]]
+        self.compared = []  # type: List[Tuple[int, int, bytearray]]
+        self.flagged = []  # type: List[Tuple[int, bytearray]]
+        owners = {id(owner.memory): owner for owner in (nes.ram, nes.prg_ram)}
+        ppu = nes.ppu
+        written = {id(ppu.vram): ppu.vram_written, id(ppu.oam): ppu.oam_written,
+                   id(ppu.palette): ppu.palette_written}
+        for memory_index, memory in enumerate(self.states.memories):
+            first = len(self.pages)
+            self.pages.extend((memory_index, start) for start in range(0, len(memory), PAGE_SIZE))
+            if id(memory) in written:
+                self.flagged.append((first, written[id(memory)]))
+                continue
+            owner = owners.get(id(memory))
+            if owner is None:
+                # compared against a copy from the capture before
+                self.compared.append((memory_index, first, bytearray(memory)))
+                continue
+            for page in range(0x100):
+                key = (bus.owners[page], bus.physical_pages[page])
+                if key[0] is owner and key not in self.page_indexes:
+                    # the lowest page showing a physical page is where it sits in the memory
+                    index = first + (((page << 8) - owner.memory_start_location) >> 8)
+                    self.page_indexes[key] = index
+                    self.watched_pages.append((index, page))
+        self.dirty = bytearray(len(self.pages))
+        self.armed = bytearray(len(self.pages))
+
+        # a state loaded behind our back makes the next capture a keyframe
+        self.loads = -1
+
+    def run_frame(self) -> int:
+        """
+        run a frame, capturing the state after it every interval frames
+        """
+        frame = self.nes.run_frame()
+        self.frames += 1
+        if self.frames % self.interval == 0:
+            self.capture()
+        return frame
+
+    def capture(self):
+        states = self.states
+        keyframe = not self.captures or self.loads != states.loads or \
+            self.since_keyframe >= self.keyframe_interval - 1
+        if not keyframe:
+            self.compare_pages()
+            dirty = [index for index, dirty in enumerate(self.dirty) if dirty]
+            size = states.struct.size + COUNT_FORMAT.size + (2 + PAGE_SIZE) * len(dirty)
+            offset = self.allocate(size)
+            if not self.captures:
+                # making room dropped the keyframe the delta was against, and the deltas after it
+                self.head = offset
+                keyframe = True
+        if keyframe:
+            offset = self.allocate(states.size)
+            states.save(self.view[offset:offset + states.size])
+            self.captures.append(Capture(offset, states.size, True, self.nes.ppu.frame))
+            self.since_keyframe = 0
+        else:
+            view = self.view
+            states.pack_registers(view, offset)
+            position = offset + states.struct.size
+            COUNT_FORMAT.pack_into(view, position, len(dirty))
+            position += COUNT_FORMAT.size
+            struct.pack_into('<{}H'.format(len(dirty)), view, position, *dirty)
+            position += 2 * len(dirty)
+            memories = states.memories
+            for index in dirty:
+                memory, start = self.pages[index]
+                # the last page of a memory can be short, like the palette, it still takes a whole one
+                page = memories[memory][start:start + PAGE_SIZE]
+                view[position:position + len(page)] = page
+                position += PAGE_SIZE
+            self.captures.append(Capture(offset, size, False, self.nes.ppu.frame))
+            self.since_keyframe += 1
+
+        self.loads = states.loads
+        self.watch_pages()
+
+    def rewind(self, count: int = 1) -> int:
+        """
+        go back to the state count captures before the latest one, or the oldest there is,
+        the captures after it are dropped
+        returns the frame it was captured at
+        """
+        if not self.captures:
+            raise Exception('Nothing captured to rewind to')
+        index = max(0, len(self.captures) - 1 - count)
+        while len(self.captures) > index + 1:
+            self.captures.pop()
+        self.restore(index)
+        return self.captures[index].frame
+
+    def restore(self, index: int):
+        states = self.states
+        view = self.view
+        keyframe = index
+        while not self.captures[keyframe].keyframe:
+            keyframe -= 1
+        capture = self.captures[keyframe]
+        states.load(view[capture.offset:capture.offset + capture.size])
+
+        # the pages of the captures after the keyframe in order, the registers of the last one
+        memories = states.memories
+        for delta in range(keyframe + 1, index + 1):
+            capture = self.captures[delta]
+            position = capture.offset + states.struct.size
+            count, = COUNT_FORMAT.unpack_from(view, position)
+            position += COUNT_FORMAT.size
+            pages = struct.unpack_from('<{}H'.format(count), view, position)
+            position += 2 * count
+            for page in pages:
+                memory, start = self.pages[page]
+                size = min(PAGE_SIZE, len(memories[memory]) - start)
+                memories[memory][start:start + size] = view[position:position + size]
+                position += PAGE_SIZE
+        if index > keyframe:
+            states.unpack_registers(view, self.captures[index].offset)
+            states.loaded()
+
+        # carry on capturing after the restored one, as if nothing had been written since
+        capture = self.captures[index]
+        self.head = capture.offset + capture.size
+        self.since_keyframe = index - keyframe
+        self.loads = states.loads
+        self.watch_pages()
+
+    def allocate(self, size: int) -> int:
+        """
+        room for size bytes after the latest capture, dropping the oldest captures in the way
+        """
+        if size > len(self.buffer):
+            raise Exception('Rewind buffer is smaller than a single state')
+        start = self.head
+        if start + size > len(self.buffer):
+            # wrapping around leaves the end of the ring unused, anything still there is older than the start
+            start = 0
+            while self.captures and self.captures[0].offset >= self.head:
+                self.drop_oldest()
+        end = start + size
+        while self.captures and self.overlaps(self.captures[0], start, end):
+            self.drop_oldest()
+        self.head = end
+        return start
+
+    def drop_oldest(self):
+        self.captures.popleft()
+        # captures after a dropped keyframe can't be restored any more
+        while self.captures and not self.captures[0].keyframe:
+            self.captures.popleft()
+
+    @staticmethod
+    def overlaps(capture: Capture, start: int, end: int) -> bool:
+        return capture.offset < end and start < capture.offset + capture.size
+
+    def compare_pages(self):
+        """
+        mark the pages of the memories without write watches that the ppu marked as written,
+        or that changed since their copies were made
+        """
+        for first, written in self.flagged:
+            for offset, flag in enumerate(written):
+                if flag:
+                    self.dirty[first + offset] = 1
+        memories = self.states.memories
+        for memory_index, first, copy in self.compared:
+            memory = memories[memory_index]
+            for offset, start in enumerate(range(0, len(memory), PAGE_SIZE)):
+                if memory[start:start + PAGE_SIZE] != copy[start:start + PAGE_SIZE]:
+                    self.dirty[first + offset] = 1
+
+    def watch_pages(self):
+        """
+        start again with every page clean, watching for the first write to each
+        """
+        bus = self.nes.cpu.bus
+        self.dirty[:] = bytes(len(self.dirty))
+        for index, page in self.watched_pages:
+            if not self.armed[index]:
+                self.armed[index] = 1
+                bus.watch_writes(page, self.page_written)
+        for _, written in self.flagged:
+            written[:] = bytes(len(written))
+        memories = self.states.memories
+        for memory_index, _, copy in self.compared:
+            copy[:] = memories[memory_index]
+
+    def page_written(self, page: int):
+        bus = self.nes.cpu.bus
+        index = self.page_indexes[(bus.owners[page], bus.physical_pages[page])]
+        self.dirty[index] = 1
+        self.armed[index] = 0
@@ -1,40 +1,168 @@
-from typing import List
+from typing import Dict, NamedTuple, Optional, Tuple
+import copy
+import mmap
+import os
+
 from memory_owner import MemoryOwnerMixin
+from mapper import Mapper, create_mapper, Mirroring
 
 KB_SIZE = 1024
 
+HEADER_SIZE = 16
+TRAINER_SIZE = 512
+PRG_BANK_SIZE = 16 * KB_SIZE
+CHR_BANK_SIZE = 8 * KB_SIZE
+
+
+# rom images mapped by this process, keyed by file and version, every ROM made from one shares its pages
+mapped_images = {}  # type: Dict[Tuple[str, int, int], mmap.mmap]
+
+
+def map_image(path: str) -> mmap.mmap:
+    """
+    a read only memory map of a rom file, the os reads pages in as they are touched and
+    shares them between every process mapping the same file
+    """
+    stat = os.stat(path)
+    key = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+    image = mapped_images.get(key)
+    if image is None:
+        with open(path, 'rb') as file:
+            image = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        mapped_images[key] = image
+    return image
+
+
+class Header(NamedTuple):
+    """
+    the 16 byte iNES header, NES 2.0 headers fill in the sizes and mapper number the original format can't hold
+    sizes are in bytes
+    """
+    prg_rom_size: int
+    chr_rom_size: int
+    mapper: int
+    submapper: int
+    mirroring: Mirroring
+    battery: bool
+    trainer: bool
+    nes2: bool
+    prg_ram_size: int
+    prg_nvram_size: int
+    chr_ram_size: int
+    chr_nvram_size: int
+
+    @classmethod
+    def parse(cls, data: bytes) -> 'Header':
+        if len(data) < HEADER_SIZE or bytes(data[:4]) != b'NES\x1a':
+            raise Exception('Not an iNES rom')
+
+        flags6, flags7 = data[6], data[7]
+        if flags6 & 0x08:
+            mirroring = Mirroring.four_screen
+        elif flags6 & 0x01:
+            mirroring = Mirroring.vertical
+        else:
+            mirroring = Mirroring.horizontal
+        battery = bool(flags6 & 0x02)
+        trainer = bool(flags6 & 0x04)
+
+        if flags7 & 0x0C == 0x08:
+            # NES 2.0: upper nibbles of the sizes in byte 9, ram sizes as shift counts
+            prg_rom_size = cls.nes2_rom_size(data[4], data[9] & 0x0F, PRG_BANK_SIZE)
+            chr_rom_size = cls.nes2_rom_size(data[5], data[9] >> 4, CHR_BANK_SIZE)
+            return cls(prg_rom_size, chr_rom_size,
+                       (flags6 >> 4) | (flags7 & 0xF0) | ((data[8] & 0x0F) << 8), data[8] >> 4,
+                       mirroring, battery, trainer, True,
+                       cls.nes2_ram_size(data[10] & 0x0F), cls.nes2_ram_size(data[10] >> 4),
+                       cls.nes2_ram_size(data[11] & 0x0F), cls.nes2_ram_size(data[11] >> 4))
+
+        # old dumping tools left their name in bytes 7-15, the upper mapper nibble is garbage then
+        mapper = flags6 >> 4
+        if flags7 & 0x0C == 0 and not any(data[12:16]):
+            mapper |= flags7 & 0xF0
+
+        # a ram size of 0 means 8KB for compatibility, the battery decides if it is kept
+        prg_ram_size = (data[8] or 1) * 8 * KB_SIZE
+        chr_rom_size = data[5] * CHR_BANK_SIZE
+        return cls(data[4] * PRG_BANK_SIZE, chr_rom_size, mapper, 0, mirroring, battery, trainer, False,
+                   0 if battery else prg_ram_size, prg_ram_size if battery else 0,
+                   0 if chr_rom_size else CHR_BANK_SIZE, 0)
+
+    @staticmethod
+    def nes2_rom_size(lsb: int, msb: int, unit: int) -> int:
+        if msb == 0x0F:
+            # exponent-multiplier notation
+            return (1 << (lsb >> 2)) * ((lsb & 0x03) * 2 + 1)
+        return ((msb << 8) | lsb) * unit
+
+    @staticmethod
+    def nes2_ram_size(shift: int) -> int:
+        return 64 << shift if shift else 0
+
 
 class ROM(MemoryOwnerMixin, object):
+    """
+    a cartridge, the mapper decides which banks of it show up at $8000-$FFFF and in the ppu pattern tables
+    """
     memory_start_location = 0x8000
     memory_end_location = 0xFFFF
 
     def __init__(self, rom_bytes: bytes):
-        self.header_size = 16
+        self.header = Header.parse(rom_bytes)
 
-        # TODO unhardcode
-        self.num_prg_blocks = 2
-
-        # program data starts after header
-        # and lasts for a set number of 16KB blocks
+        # the prg and chr data are views of the rom, nothing is copied
         self.rom_bytes = rom_bytes
-        self.prg_bytes = rom_bytes[self.header_size:
-                                   self.header_size + 16 * KB_SIZE * self.num_prg_blocks]
+        start = HEADER_SIZE + (TRAINER_SIZE if self.header.trainer else 0)
+        data = memoryview(rom_bytes)
+        self.prg_bytes = data[start:start + self.header.prg_rom_size]
+        start += self.header.prg_rom_size
+        if self.header.chr_rom_size:
+            self.chr_bytes = data[start:start + self.header.chr_rom_size]
+        else:
+            # boards without chr rom have writable chr ram instead
+            self.chr_bytes = memoryview(bytearray(self.header.chr_ram_size or CHR_BANK_SIZE))
+        if len(self.prg_bytes) != self.header.prg_rom_size or len(self.chr_bytes) < self.header.chr_rom_size:
+            raise Exception('Rom is shorter than its header says')
+
+        self.mapper = create_mapper(self)  # type: Mapper
+
+    @classmethod
+    def from_file(cls, path: str) -> 'ROM':
+        """
+        a rom backed by a shared memory map of its file rather than a copy of it
+        """
+        return cls(map_image(path))
+
+    def fork(self) -> 'ROM':
+        """
+        a copy for a forked machine, sharing the rom data and with its own chr ram and mapper
+        """
+        rom = copy.copy(self)
+        if not self.header.chr_rom_size:
+            rom.chr_bytes = memoryview(bytearray(self.chr_bytes))
+        rom.mapper = self.mapper.fork(rom)
+        return rom
 
-    def get_memory(self) -> List[bytes]:
+    def get_memory(self) -> memoryview:
         return self.prg_bytes
 
-    def get(self, position: int, size: int=1) -> bytes:
+    def get(self, position: int, size: int=1):
         """
-        gets bytes at given position, could be multiple bytes
-        memory is duplicated around 0xC000
+        gets the byte at a position, or a little endian short for a size of 2
         """
-        if position >= 0xC000:
-            position -= 0x4000
-        return self.get_memory()[position-self.memory_start_location:position-self.memory_start_location+size]
+        value = self.mapper.prg_pages[(position >> 8) - 0x80][position & 0xFF]
+        if size == 2:
+            value |= self.get((position + 1) & 0xFFFF) << 8
+        return value
 
-    def set(self, position: int, value: bytes):
+    def set(self, position: int, value: int, size: int=1):
         """
-        read only memory
+        read only memory, writes go to the registers of the mapper
         """
-        raise Exception('Trying to write to Read only Memory')
+        self.mapper.write(position, value)
+
+    def read_page(self, page: int) -> Optional[memoryview]:
+        return self.mapper.prg_pages[page - 0x80]
 
+    def physical_page(self, page: int) -> int:
+        return self.mapper.prg_physical_pages[page - 0x80]
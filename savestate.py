@@ -0,0 +1,103 @@
+from typing import List, Optional
+import struct
+
+from mapper import Mirroring
+
+
+class SaveState(object):
+    """
+    copies a whole machine into one preallocated buffer and back
+
+    the layout is worked out once per machine: the registers of every device packed by a single struct,
+    then each memory copied in bulk, so saving and loading are a pack and a few slice copies
+    """
+    def __init__(self, nes: 'nes.NES'):
+        self.nes = nes
+        self.devices = [nes.cpu, nes.ppu, nes.apu, nes.rom.mapper]
+        self.struct = struct.Struct('<' + ''.join(device.state_format for device in self.devices) + 'B')
+
+        # where each devices values start in the unpacked tuple
+        self.slices = []
+        start = 0
+        for device in self.devices:
+            device_struct = struct.Struct('<' + device.state_format)
+            count = len(device_struct.unpack(bytes(device_struct.size)))
+            self.slices.append(slice(start, start + count))
+            start += count
+
+        # memory the program can write, chr ram only on boards without chr rom
+        self.memories = [nes.ram.memory, nes.prg_ram.memory, nes.ppu.vram, nes.ppu.oam, nes.ppu.palette]  # type: List
+        self.shared = [nes.ram, nes.prg_ram]
+        if not nes.rom.header.chr_rom_size:
+            self.memories.append(nes.rom.chr_bytes)
+
+        self.size = self.struct.size + sum(len(memory) for memory in self.memories)
+
+        # how many times a state was loaded, anything keeping track of memory changes has to start again after one
+        self.loads = 0
+
+    def new_buffer(self) -> bytearray:
+        return bytearray(self.size)
+
+    def save(self, buffer: Optional[bytearray] = None) -> bytearray:
+        """
+        write the machine into buffer, a new one when not given
+        """
+        if buffer is None:
+            buffer = self.new_buffer()
+        self.pack_registers(buffer)
+        self.detach()
+
+        view = memoryview(buffer)
+        offset = self.struct.size
+        for memory in self.memories:
+            view[offset:offset + len(memory)] = memory
+            offset += len(memory)
+        return buffer
+
+    def load(self, buffer: bytearray):
+        """
+        put the machine back to the state saved in buffer
+        """
+        self.unpack_registers(buffer)
+        self.detach()
+
+        view = memoryview(buffer)
+        offset = self.struct.size
+        for memory in self.memories:
+            memory[:] = view[offset:offset + len(memory)]
+            offset += len(memory)
+        self.loaded()
+
+    def detach(self):
+        """
+        the memories only hold every page once they stop sharing pages with forks, see SharedPagesMixin
+        """
+        for owner in self.shared:
+            owner.detach()
+
+    def pack_registers(self, buffer: bytearray, offset: int = 0):
+        """
+        the registers of every device, the first struct.size bytes of a save state
+        """
+        values = ()
+        for device in self.devices:
+            values += device.get_state()
+        self.struct.pack_into(buffer, offset, *values, self.nes.rom.mapper.mirroring.value)
+
+    def unpack_registers(self, buffer: bytearray, offset: int = 0):
+        values = self.struct.unpack_from(buffer, offset)
+        for device, values_slice in zip(self.devices, self.slices):
+            device.set_state(values[values_slice])
+        self.nes.rom.mapper.mirroring = Mirroring(values[-1])
+
+    def loaded(self):
+        """
+        catch up with memory changed behind the bus
+        """
+        self.loads += 1
+
+        # code decoded from ram and tiles from chr ram may have been overwritten, the events follow the restored clocks
+        self.nes.cpu.block_cache.invalidate_writable()
+        self.nes.ppu.invalidate_tiles()
+        self.nes.reschedule()
@@ -0,0 +1,67 @@
+from typing import Callable, Dict, List
+import heapq
+
+
+class Scheduler:
+    """
+    events at cpu cycle timestamps, such as the vblank nmi, the apu frame irq, mapper irqs and dma
+    events are named, scheduling a name again moves the event, the cpu runs straight to the earliest deadline
+    """
+    def __init__(self):
+        # heap of [cycle, order, name, callback], cancelled entries have their callback set to None
+        self.events = []  # type: List[list]
+        self.pending = {}  # type: Dict[str, list]
+        self.order = 0
+
+        # cycle of the earliest event, inf while there is none
+        self.deadline = float('inf')
+
+    def schedule(self, name: str, cycle: int, callback: Callable[[int], None]):
+        """
+        run callback with the cycle it was due at once the cpu gets to cycle
+        events due at the same cycle run in the order they were scheduled
+        """
+        self.cancel(name)
+        entry = [cycle, self.order, name, callback]
+        self.order += 1
+        self.pending[name] = entry
+        heapq.heappush(self.events, entry)
+        if cycle < self.deadline:
+            self.deadline = cycle
+
+    def cancel(self, name: str):
+        entry = self.pending.pop(name, None)
+        if entry is not None:
+            entry[3] = None
+            self._update_deadline()
+
+    def is_scheduled(self, name: str) -> bool:
+        return name in self.pending
+
+    def run_due(self, cycles: int) -> int:
+        """
+        run every event due by cycles, including those the callbacks schedule for no later than cycles
+        returns how many were run
+        """
+        count = 0
+        events = self.events
+        while events and events[0][0] <= cycles:
+            cycle, _, name, callback = heapq.heappop(events)
+            if callback is None:
+                continue
+            del self.pending[name]
+            callback(cycle)
+            count += 1
+        self._update_deadline()
+        return count
+
+    def clear(self):
+        self.events = []
+        self.pending = {}
+        self.deadline = float('inf')
+
+    def _update_deadline(self):
+        events = self.events
+        while events and events[0][3] is None:
+            heapq.heappop(events)
+        self.deadline = events[0][0] if events else float('inf')
@@ -0,0 +1,107 @@
+from typing import List, Optional
+import weakref
+
+PAGE_SIZE = 0x100
+
+
+class SharedPagesMixin(object):
+    """
+    a buffered memory owner whose pages can be shared copy on write with its copy in a forked machine
+
+    the bus reads and writes each page through pages, views of the memory until the page is shared,
+    then both copies show the one buffer behind a write watch and the first write on either side
+    gives the other copies their own copy of the page before it goes through
+    the memory only holds the pages that aren't shown from another copy, detach before using it directly
+    """
+    def init_pages(self):
+        count = len(self.memory) // PAGE_SIZE
+        view = memoryview(self.memory)
+        self.pages = [view[start:start + PAGE_SIZE]
+                      for start in range(0, count * PAGE_SIZE, PAGE_SIZE)]  # type: List[memoryview]
+
+        # the copy whose memory holds each page, and the copies that may be showing our pages
+        self.sources = [self] * count  # type: List[SharedPagesMixin]
+        self.sharers = weakref.WeakSet()  # type: weakref.WeakSet
+
+        # pages with a write watch on the bus this is mapped on
+        self.armed = [False] * count  # type: List[bool]
+        self.bus = None  # type: Optional['memory_bus.MemoryBus']
+        self.sharing = False
+
+    def page_index(self, page: int) -> int:
+        """
+        the page of the memory a bus page shows
+        """
+        return self.physical_page(page) - self.physical_page(self.memory_start_location >> 8)
+
+    def bus_page(self, index: int) -> int:
+        """
+        the lowest bus page showing a page of the memory
+        """
+        return (self.memory_start_location >> 8) + index
+
+    def share(self, source: 'SharedPagesMixin', bus: 'memory_bus.MemoryBus', source_bus: 'memory_bus.MemoryBus'):
+        """
+        show the pages of source, the same memory of the machine this one was forked from, until either side
+        writes to them
+        bus is the one this is mapped on and has to show the buffers of source already, see MemoryBus.fork
+        """
+        self.bus = bus
+        source.bus = source_bus
+        self.pages[:] = source.pages
+        # pages source shows from another copy are shared with that one
+        self.sources[:] = source.sources
+        for origin in set(self.sources):
+            origin.sharers.add(self)
+            origin.sharing = True
+        for index, origin in enumerate(self.sources):
+            origin.watch_page(index)
+            self.watch_page(index)
+        self.sharing = True
+
+    def detach(self):
+        """
+        stop sharing pages with other copies, before the memory is read or written behind the bus
+        """
+        if self.sharing:
+            for index in range(len(self.pages)):
+                self.unwatch_page(index)
+                self.unshare(index)
+            self.sharing = False
+
+    def watch_page(self, index: int):
+        if not self.armed[index]:
+            self.armed[index] = True
+            self.bus.watch_writes(self.bus_page(index), self.page_written)
+
+    def unwatch_page(self, index: int):
+        if self.armed[index]:
+            self.armed[index] = False
+            self.bus.cancel_watch(self, self.physical_page(self.bus_page(index)), self.page_written)
+
+    def page_written(self, page: int):
+        index = self.page_index(page)
+        self.armed[index] = False
+        self.unshare(index)
+
+    def unshare(self, index: int):
+        """
+        give the page its own storage on every side, the copies showing ours get theirs first
+        """
+        for sharer in list(self.sharers):
+            if sharer.sources[index] is self:
+                sharer.copy_page(index)
+        if self.sources[index] is not self:
+            self.copy_page(index)
+
+    def copy_page(self, index: int):
+        """
+        copy a page shown from another copy into the memory and show it from there
+        """
+        start = index * PAGE_SIZE
+        self.memory[start:start + PAGE_SIZE] = self.pages[index]
+        self.sources[index] = self
+        self.pages[index] = memoryview(self.memory)[start:start + PAGE_SIZE]
+
+        self.unwatch_page(index)
+        self.bus.remap_physical_page(self, self.physical_page(self.bus_page(index)))
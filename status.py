@@ -1,10 +1,7 @@
-import math
-from collections import OrderedDict
 from enum import IntEnum
 from typing import List
 
 from instructions.generic_instruction import Instruction
-import numpy as np
 
 
 class Status:
@@ -37,39 +34,100 @@ class Status:
         negative = 7
 
     def __init__(self):
-        self.bits = OrderedDict([
-            (Status.StatusTypes.carry, False),
-            (Status.StatusTypes.zero, False),
-            (Status.StatusTypes.interrupt, True),
-            (Status.StatusTypes.decimal, False),
-            (Status.StatusTypes.unused1, False),
-            (Status.StatusTypes.unused2, True),
-            (Status.StatusTypes.overflow, False),
-            (Status.StatusTypes.negative, False),
-        ])
+        # every flag except N and Z, packed the same way as the P register
+        self.value = 0b00100100
+
+        # N and Z are only worked out from the last results when something reads them
+        self.negative_value = 0
+        self.zero_value = 1
 
     def update(self, instruction: Instruction, value: int):
         if instruction.sets_zero_bit:
-            self.bits[Status.StatusTypes.zero] = not bool(np.uint8(value))
+            self.zero_value = value
         if instruction.sets_negative_bit:
-            self.bits[Status.StatusTypes.negative] = bool(np.uint8(value) & 0b10000000)
+            self.negative_value = value
         if instruction.sets_overflow_bit_from_value:
-            self.bits[Status.StatusTypes.overflow] = bool(np.uint8(value) & 0b01000000)
+            self.value = (self.value & 0b10111111) | (value & 0b01000000)
 
-    def to_int(self):
-        value = 0
-        for i, bit in enumerate(self.bits.values()):
-            value += int(bit) * math.pow(2, i)
-        return int(value)
+    def to_int(self) -> int:
+        value = self.value & 0b01111101
+        if self.negative_value & 0b10000000:
+            value |= 0b10000000
+        if not self.zero_value & 0xFF:
+            value |= 0b00000010
+        return value
 
     def from_int(self, value: int, bits_to_ignore: List[int] = []):
-        for i, key in enumerate(self.bits.keys()):
-            if i in bits_to_ignore:
-                continue
-            self.bits[key] = bool(np.uint8(value) & (1 << i))
+        mask = 0xFF
+        for bit in bits_to_ignore:
+            mask &= ~(1 << bit)
+        value = (self.to_int() & ~mask) | (value & mask)
+
+        self.value = value
+        self.negative_value = value
+        self.zero_value = 0 if value & 0b00000010 else 1
 
     def status_of_flag(self, flag: StatusTypes) -> bool:
-        return self.bits[flag]
+        if flag == Status.StatusTypes.negative:
+            return bool(self.negative_value & 0b10000000)
+        if flag == Status.StatusTypes.zero:
+            return not self.zero_value & 0xFF
+        return bool(self.value & (1 << flag))
 
     def set_status_of_flag(self, flag: StatusTypes, value: bool):
-        self.bits[flag] = value
+        if flag == Status.StatusTypes.negative:
+            self.negative_value = 0b10000000 if value else 0
+        elif flag == Status.StatusTypes.zero:
+            self.zero_value = 0 if value else 1
+        elif value:
+            self.value |= 1 << flag
+        else:
+            self.value &= ~(1 << flag)
+
+    @property
+    def carry(self) -> bool:
+        return bool(self.value & 0b00000001)
+
+    @carry.setter
+    def carry(self, value: bool):
+        self.value = (self.value & 0b11111110) | bool(value)
+
+    @property
+    def zero(self) -> bool:
+        return not self.zero_value & 0xFF
+
+    @zero.setter
+    def zero(self, value: bool):
+        self.zero_value = 0 if value else 1
+
+    @property
+    def interrupt(self) -> bool:
+        return bool(self.value & 0b00000100)
+
+    @interrupt.setter
+    def interrupt(self, value: bool):
+        self.set_status_of_flag(Status.StatusTypes.interrupt, value)
+
+    @property
+    def decimal(self) -> bool:
+        return bool(self.value & 0b00001000)
+
+    @decimal.setter
+    def decimal(self, value: bool):
+        self.set_status_of_flag(Status.StatusTypes.decimal, value)
+
+    @property
+    def overflow(self) -> bool:
+        return bool(self.value & 0b01000000)
+
+    @overflow.setter
+    def overflow(self, value: bool):
+        self.set_status_of_flag(Status.StatusTypes.overflow, value)
+
+    @property
+    def negative(self) -> bool:
+        return bool(self.negative_value & 0b10000000)
+
+    @negative.setter
+    def negative(self, value: bool):
+        self.negative_value = 0b10000000 if value else 0
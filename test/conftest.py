@@ -0,0 +1,58 @@
+from typing import Dict, Sequence
+
+from apu import APU
+from cpu import CPU
+from nes import NES
+from ppu import PPU
+from ram import RAM
+from rom import ROM
+import pytest
+
+
+def make_cpu():
+    c: CPU = CPU(RAM(), PPU(), APU())
+    c.start_up()
+    return c
+
+
+@pytest.fixture()
+def cpu():
+    return make_cpu()
+
+
+def load_program(cpu, location, program):
+    for i, value in enumerate(program):
+        cpu.set_memory(location + i, value)
+    cpu.pc_reg = location
+
+
+def registers(cpu):
+    return cpu.pc_reg, cpu.a_reg, cpu.x_reg, cpu.y_reg, cpu.sp_reg, cpu.status_reg.to_int(), cpu.cycles
+
+
+def ines_header(prg_banks, chr_banks, mapper=0, flags6=0, nes2=False):
+    """
+    16KB prg banks and 8KB chr banks, no chr banks gives 8KB of chr ram
+    """
+    return b'NES\x1a' + bytes([prg_banks, chr_banks, flags6 | (mapper & 0x0F) << 4,
+                               (mapper & 0xF0) | (0x08 if nes2 else 0)]) + bytes(8)
+
+
+def make_prg(code: Dict[int, Sequence[int]], size=0x4000, reset=0x8000, nmi=0x8000, irq=0x8000):
+    """
+    prg rom with code at offsets into it and the vectors in its last bytes
+    """
+    prg = bytearray(size)
+    for offset, data in code.items():
+        prg[offset:offset + len(data)] = bytes(data)
+    prg[size - 6:] = bytes([nmi & 0xFF, nmi >> 8, reset & 0xFF, reset >> 8, irq & 0xFF, irq >> 8])
+    return prg
+
+
+def make_rom(prg, chr_data=b'', mapper=0, flags6=0):
+    return ROM(ines_header(len(prg) // 0x4000, len(chr_data) // 0x2000, mapper, flags6) + bytes(prg) +
+               bytes(chr_data))
+
+
+def make_nes(prg, chr_data=b'', mapper=0, flags6=0):
+    return NES(make_rom(prg, chr_data, mapper, flags6))
@@ -0,0 +1,55 @@
+from test.conftest import load_program, make_nes, make_prg
+import pytest
+
+
+def test_block_ends_at_jump(cpu):
+    # LDX #$03, INX, JMP $0300, NOP
+    load_program(cpu, 0x0300, [0xA2, 0x03, 0xE8, 0x4C, 0x00, 0x03, 0xEA])
+    block = cpu.block_cache.lookup(0x0300)
+    assert [opcode.instruction.__name__ for opcode, _, _ in block.instructions] == ['LDXimmidiate', 'Inx', 'JmpAbs']
+    assert cpu.block_cache.lookup(0x0300) is block
+
+    cpu.execute_block()
+    assert cpu.x_reg == 4
+    assert cpu.pc_reg == 0x0300
+
+
+def test_block_stops_before_next_page(cpu):
+    load_program(cpu, 0x02FE, [0xEA, 0xA9, 0x01])
+    block = cpu.block_cache.lookup(0x02FE)
+    assert len(block.instructions) == 1
+
+
+@pytest.mark.parametrize('operand_location', [0x0301, 0x0B01])
+def test_self_modifying_code(cpu, operand_location):
+    # LDA #$07, INC operand of the LDA (directly or through a mirror), JMP $0300
+    load_program(cpu, 0x0300, [0xA9, 0x07, 0xEE, operand_location & 0xFF, operand_location >> 8, 0x4C, 0x00, 0x03])
+
+    cpu.execute_block()
+    assert cpu.a_reg == 0x07
+    assert cpu.pc_reg == 0x0305
+
+    cpu.execute_block()
+    assert cpu.pc_reg == 0x0300
+
+    cpu.execute_block()
+    assert cpu.a_reg == 0x08
+
+
+@pytest.mark.parametrize('mode', ['stepped', 'interpreted', 'recompiled'])
+def test_bank_switch_under_the_running_block(mode):
+    # uxrom bank 0: LDA #$01, STA $8000 switching bank 1 in under the block, LDX #$AA, JMP $8007
+    # bank 1 has LDX #$BB where the LDX is
+    prg = make_prg({0x0000: [0xA9, 0x01, 0x8D, 0x00, 0x80, 0xA2, 0xAA, 0x4C, 0x07, 0x80],
+                    0x4005: [0xA2, 0xBB, 0x4C, 0x07, 0x80]}, size=0x8000)
+    cpu = make_nes(prg, mapper=2).cpu
+    cpu.jit_enabled = mode == 'recompiled'
+    cpu.recompiler.threshold = 1
+
+    if mode == 'stepped':
+        for _ in range(4):
+            cpu.run(max_instructions=1)
+    else:
+        cpu.run(max_instructions=4)
+    assert cpu.x_reg == 0xBB
+    assert cpu.pc_reg == 0x8007
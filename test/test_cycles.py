@@ -0,0 +1,43 @@
+from test.conftest import load_program
+import pytest
+
+
+def test_opcode_cycles_from_tables(cpu):
+    # LDA abs,X is marked 4* and STA abs,X a flat 5
+    assert (cpu.opcodes[0xBD].cycles, cpu.opcodes[0xBD].instruction.page_cross_cycles) == (4, 1)
+    assert (cpu.opcodes[0x9D].cycles, cpu.opcodes[0x9D].instruction.page_cross_cycles) == (5, 0)
+    assert (cpu.opcodes[0xDB].cycles, cpu.opcodes[0xDB].instruction.page_cross_cycles) == (7, 0)
+
+
+# each block ends in a JMP $0300 taking three cycles
+@pytest.mark.parametrize('program, x_reg, status, expected_cycles', [
+    # LDA $0210,X without and with crossing into the next page
+    ([0xBD, 0x10, 0x02, 0x4C, 0x00, 0x03], 0x01, 0x24, 4 + 3),
+    ([0xBD, 0xFF, 0x02, 0x4C, 0x00, 0x03], 0x01, 0x24, 5 + 3),
+    # STA $01FF,X always takes its five cycles
+    ([0x9D, 0xFF, 0x01, 0x4C, 0x00, 0x03], 0x01, 0x24, 5 + 3),
+    # LDA ($00),Y with $00 pointing at $02FF
+    ([0xB1, 0x00, 0x4C, 0x00, 0x03], 0x00, 0x24, 6 + 3),
+    # BNE not taken, taken, and taken into the previous page
+    ([0xD0, 0x10], 0x00, 0x26, 2),
+    ([0xD0, 0x10], 0x00, 0x24, 3),
+    ([0xD0, 0x80], 0x00, 0x24, 4),
+])
+@pytest.mark.parametrize('mode', ['step', 'block', 'jit'])
+def test_instruction_cycles(cpu, mode, program, x_reg, status, expected_cycles):
+    load_program(cpu, 0x0300, program)
+    cpu.set_memory(0x00, 0xFF)
+    cpu.set_memory(0x01, 0x02)
+    cpu.x_reg = x_reg
+    cpu.y_reg = 0x01
+    cpu.status_reg.from_int(status, [])
+
+    if mode == 'step':
+        for _ in cpu.block_cache.lookup(0x0300).instructions:
+            cpu.identify()
+            cpu.execute()
+    else:
+        cpu.jit_enabled = mode == 'jit'
+        cpu.recompiler.threshold = 1
+        cpu.execute_block()
+    assert cpu.cycles == expected_cycles
@@ -0,0 +1,89 @@
+from test.conftest import make_nes, make_prg
+
+
+def mmc1_nes():
+    """
+    MMC1 with chr ram, the program counts in ram and prg ram and switches prg banks
+    """
+    # loop: INC $10, LDA $10, STA $0400, STA $6000, STA $E000 five times, JMP loop
+    program = [0xE6, 0x10, 0xA5, 0x10, 0x8D, 0x00, 0x04, 0x8D, 0x00, 0x60] + [0x8D, 0x00, 0xE0] * 5 + \
+              [0x4C, 0x00, 0xC0]
+    return make_nes(make_prg({0x4000: program}, size=0x8000, reset=0xC000), mapper=1)
+
+
+def machine(nes):
+    return (nes.cpu.get_state(), nes.ppu.get_state(), nes.rom.mapper.get_state(),
+            bytes(nes.cpu.get_memory(location) for location in range(0x800)),
+            bytes(nes.cpu.get_memory(location) for location in range(0x6000, 0x8000)))
+
+
+def test_fork_runs_the_same():
+    nes = mmc1_nes()
+    nes.run_frame()
+    fork = nes.fork()
+    assert machine(fork) == machine(nes)
+
+    nes.run_frame()
+    fork.run_frame()
+    assert machine(fork) == machine(nes)
+    assert fork.cpu.bus.physical_pages[0x80] == nes.cpu.bus.physical_pages[0x80]
+
+
+def test_pages_are_shared_until_written():
+    nes = mmc1_nes()
+    nes.cpu.set_memory(0x0123, 0x11)
+    fork = nes.fork()
+    assert fork.cpu.bus.read_pages[0x01].obj is nes.ram.memory
+    assert fork.cpu.bus.read_pages[0x80] is nes.cpu.bus.read_pages[0x80]
+
+    # the first write on either side copies the page, through any mirror
+    nes.cpu.set_memory(0x0923, 0x22)
+    assert (nes.cpu.get_memory(0x0123), fork.cpu.get_memory(0x0123)) == (0x22, 0x11)
+    fork.cpu.set_memory(0x0124, 0x33)
+    assert (nes.cpu.get_memory(0x0124), fork.cpu.get_memory(0x1924)) == (0x00, 0x33)
+    assert fork.cpu.bus.read_pages[0x01].obj is fork.ram.memory
+
+    # pages nobody wrote are still shared
+    assert fork.cpu.bus.read_pages[0x02].obj is nes.ram.memory
+    assert fork.cpu.bus.read_pages[0x60].obj is nes.prg_ram.memory
+
+
+def test_fork_of_a_fork():
+    nes = mmc1_nes()
+    nes.cpu.set_memory(0x6010, 0x11)
+    fork = nes.fork()
+    second = fork.fork()
+    assert second.cpu.bus.read_pages[0x60].obj is nes.prg_ram.memory
+
+    nes.cpu.set_memory(0x6010, 0x22)
+    fork.cpu.set_memory(0x6010, 0x33)
+    assert [machine.cpu.get_memory(0x6010) for machine in (nes, fork, second)] == [0x22, 0x33, 0x11]
+
+
+def test_banks_and_chr_ram_are_separate():
+    nes = mmc1_nes()
+    nes.rom.chr_bytes[0x10] = 0x11
+    fork = nes.fork()
+    fork.rom.chr_bytes[0x10] = 0x22
+    assert nes.rom.chr_bytes[0x10] == 0x11
+
+    # switch the fork to the other 16KB bank at $8000
+    for bit in (1, 0, 0, 0, 0):
+        fork.cpu.set_memory(0xE000, bit)
+    assert (nes.cpu.bus.physical_pages[0x80], fork.cpu.bus.physical_pages[0x80]) == (0x00, 0x40)
+    assert nes.rom.mapper.prg_physical_pages[0] == 0
+
+
+def test_save_state_of_a_fork():
+    nes = mmc1_nes()
+    nes.run_cycles(5000)
+    fork = nes.fork()
+    state = fork.save_state()
+    assert state[fork.save_states.struct.size + 0x10] == nes.ram.memory[0x10]
+
+    # loading into the parent leaves the fork as it was
+    before = machine(fork)
+    nes.run_frame()
+    nes.load_state(nes.fork().save_state())
+    nes.cpu.set_memory(0x0010, 0xFF)
+    assert machine(fork) == before
@@ -1,7 +1,9 @@
+from apu import APU
 from cpu import CPU
 from ppu import PPU
 from ram import RAM
-from instructions.instructions import LDAImmInstruction, STAAbsInstruction, SEIInstruction, CLDInstruction
+from instructions.generic_instruction import UndefinedInstruction
+from instructions.instructions import Sei, Cld
 from mock import MagicMock
 import pytest
 
@@ -20,7 +22,8 @@ import pytest
 def cpu():
     ram = RAM()
     ppu = PPU()
-    c: CPU = CPU(ram, ppu)
+    apu = APU()
+    c: CPU = CPU(ram, ppu, apu)
     c.rom = MagicMock()
     c.rom.memory_start_location = 0
     c.rom.memory_end_location = 0x1FFF
@@ -36,10 +39,14 @@ def get_data_bytes(instruction_bytes):
     return instruction_bytes[1:]
 
 
+def find_instruction(cpu, instruction_bytes):
+    return cpu.opcodes[instruction_bytes[0]].instruction
+
+
 def test_lda_imm(cpu):
     instruction_bytes = bytes([0xA9, 0x10])
 
-    lda_imm = LDAImmInstruction()
+    lda_imm = find_instruction(cpu, instruction_bytes)
     check_instruction_bytes(lda_imm, instruction_bytes)
     # check that value has been loaded into a register
     assert cpu.a_reg == 0
@@ -50,7 +57,7 @@ def test_lda_imm(cpu):
 def test_sta_abs(cpu):
     instruction_bytes = bytes([0x8D, 0x00, 0x20])
 
-    instruction = STAAbsInstruction()
+    instruction = find_instruction(cpu, instruction_bytes)
     check_instruction_bytes(instruction, instruction_bytes)
     # check that value has been loaded into a register
     value_to_store = 8
@@ -58,15 +65,14 @@ def test_sta_abs(cpu):
     instruction.execute(cpu, get_data_bytes(instruction_bytes))
     # 0x00 0x20 -> $2000 -> 8192
     memory_location = 8192
-    owner = cpu._get_memory_owner(memory_location)
-    value_at_memory_location = owner.get(memory_location)
+    value_at_memory_location = cpu.get_memory(memory_location)
     assert value_at_memory_location == value_to_store
 
 
 def test_sei(cpu):
     instruction_bytes = bytes([0x78])
 
-    instruction = SEIInstruction()
+    instruction = Sei()
     check_instruction_bytes(instruction, instruction_bytes)
     cpu.status_reg.interrupt = False
     instruction.execute(cpu, get_data_bytes(instruction_bytes))
@@ -76,8 +82,18 @@ def test_sei(cpu):
 def test_cld(cpu):
     instruction_bytes = bytes([0xD8])
 
-    instruction = CLDInstruction()
+    instruction = Cld()
     check_instruction_bytes(instruction, instruction_bytes)
     cpu.status_reg.decimal = True
     instruction.execute(cpu, get_data_bytes(instruction_bytes))
     assert cpu.status_reg.decimal is False
+
+
+def test_undefined_opcode_traps(cpu):
+    # 0x02 is a jam opcode with no instruction behind it
+    cpu.pc_reg = 0x10
+    cpu.set_memory(0x10, 0x02)
+    cpu.identify()
+    assert cpu.opcode.instruction is UndefinedInstruction
+    with pytest.raises(Exception, match='Instruction not found: 02'):
+        cpu.execute()
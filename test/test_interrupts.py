@@ -0,0 +1,117 @@
+from cpu import IrqSource
+from test.conftest import load_program, make_prg, make_rom
+import pytest
+
+
+@pytest.fixture()
+def cpu(cpu):
+    # nmi handler at $0400, reset at $8000 and irq/brk handler at $0500
+    cpu.load_rom(make_rom(make_prg({}, nmi=0x0400, irq=0x0500)), False)
+    return cpu
+
+
+def test_load_rom_fetches_reset_vector(cpu):
+    assert cpu.pc_reg == 0x8000
+    assert cpu.sp_reg == 0xFD
+
+
+def test_reset(cpu):
+    cpu.pc_reg = 0x0300
+    cpu.status_reg.interrupt = False
+    cpu.reset()
+    assert (cpu.pc_reg, cpu.sp_reg, cpu.cycles) == (0x8000, 0xFA, 7)
+    assert cpu.status_reg.interrupt
+
+
+def test_brk_and_rti(cpu):
+    # BRK, padding byte, LDA #$01 and an RTI handler
+    load_program(cpu, 0x0300, [0x00, 0xFF, 0xA9, 0x01])
+    cpu.set_memory(0x0500, 0x40)
+    cpu.status_reg.from_int(0x20, [])
+
+    cpu.identify()
+    cpu.execute()
+    assert (cpu.pc_reg, cpu.sp_reg, cpu.cycles) == (0x0500, 0xFA, 7)
+    assert cpu.status_reg.interrupt
+    # pc+2 high byte first, then the status with the break bit set
+    assert [cpu.get_memory(0x01FB + i) for i in range(3)] == [0x30, 0x02, 0x03]
+
+    cpu.identify()
+    cpu.execute()
+    assert (cpu.pc_reg, cpu.sp_reg) == (0x0302, 0xFD)
+    assert not cpu.status_reg.interrupt
+
+
+@pytest.mark.parametrize('jit_enabled', [True, False])
+def test_scheduled_nmi(cpu, jit_enabled):
+    cpu.jit_enabled = jit_enabled
+    # JMP $0300 forever, the nmi handler does INX, RTI
+    load_program(cpu, 0x0300, [0x4C, 0x00, 0x03])
+    load_program(cpu, 0x0400, [0xE8, 0x40])
+    cpu.pc_reg = 0x0300
+
+    fired = []
+
+    def vblank(cycle):
+        fired.append(cpu.cycles)
+        cpu.trigger_nmi()
+        cpu.scheduler.schedule('nmi', cycle + 1000, vblank)
+
+    cpu.scheduler.schedule('nmi', 1000, vblank)
+    cpu.run(max_cycles=3500)
+
+    # the idle loop is skipped up to each deadline, then the nmi is taken at the next instruction boundary
+    assert len(fired) == 3
+    assert all(1000 * (i + 1) <= cycle < 1000 * (i + 1) + 3 for i, cycle in enumerate(fired))
+    assert cpu.x_reg == 3
+    assert cpu.sp_reg == 0xFD
+    assert cpu.pc_reg == 0x0300
+
+
+def test_irq_waits_for_interrupt_bit(cpu):
+    # NOP, NOP, CLI, then JMP to itself, the irq handler INY then loops in place with interrupts masked
+    load_program(cpu, 0x0500, [0xC8, 0x4C, 0x01, 0x05])
+    load_program(cpu, 0x0300, [0xEA, 0xEA, 0x58, 0x4C, 0x03, 0x03])
+    cpu.set_irq(IrqSource.mapper)
+
+    cpu.run(max_instructions=2)
+    assert cpu.pc_reg == 0x0302
+
+    cpu.run(max_cycles=100)
+    assert cpu.y_reg == 1
+    assert cpu.status_reg.interrupt
+    # the irq pushes the status with the break bit clear
+    assert cpu.get_memory(0x01FB) == 0x20
+    assert (cpu.get_memory(0x01FC), cpu.get_memory(0x01FD)) == (0x03, 0x03)
+
+    cpu.set_irq(IrqSource.mapper, False)
+    assert not cpu.interrupt_pending
+
+
+@pytest.mark.parametrize('jit_enabled', [True, False])
+def test_irq_unmasked_inside_a_block(cpu, jit_enabled):
+    cpu.jit_enabled = jit_enabled
+    cpu.recompiler.threshold = 1
+    # CLI, INX three times, then JMP to itself, the irq handler STX $10 then loops in place
+    load_program(cpu, 0x0500, [0x86, 0x10, 0x4C, 0x02, 0x05])
+    load_program(cpu, 0x0300, [0x58, 0xE8, 0xE8, 0xE8, 0x4C, 0x04, 0x03])
+    cpu.set_irq(IrqSource.mapper)
+
+    # taken right after the cli, as when stepping one instruction at a time
+    cpu.run(max_cycles=100)
+    assert cpu.get_memory(0x10) == 0
+
+
+@pytest.mark.parametrize('jit_enabled', [True, False])
+def test_irq_unmasked_by_plp_inside_a_block(cpu, jit_enabled):
+    cpu.jit_enabled = jit_enabled
+    cpu.recompiler.threshold = 1
+    # LDA #$00, PHA, PLP, INX three times, then JMP to itself, the irq handler STX $10 then loops in place
+    load_program(cpu, 0x0500, [0x86, 0x10, 0x4C, 0x02, 0x05])
+    load_program(cpu, 0x0300, [0xA9, 0x00, 0x48, 0x28, 0xE8, 0xE8, 0xE8, 0x4C, 0x07, 0x03])
+    cpu.set_memory(0x10, 0xFF)
+    cpu.set_irq(IrqSource.mapper)
+
+    # taken right after the plp, as when stepping one instruction at a time
+    cpu.run(max_cycles=100)
+    assert cpu.get_memory(0x10) == 0
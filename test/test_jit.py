@@ -0,0 +1,55 @@
+from test.conftest import load_program, make_cpu, registers
+import pytest
+
+
+@pytest.fixture()
+def cpu(cpu):
+    cpu.recompiler.threshold = 1
+    return cpu
+
+
+# LDX #$0A, LDA #$00, CLC, loop: ADC $00,X, STA $10, ASL A, ROL $11, DEX, BNE loop
+SUM_PROGRAM = [0xA2, 0x0A, 0xA9, 0x00, 0x18,
+               0x75, 0x00, 0x85, 0x10, 0x0A, 0x26, 0x11, 0xCA, 0xD0, 0xF6]
+
+
+# LDX #$0A, loop: TXA, PHA, PHP, PLA, PLP, PHA, DEX, BNE loop
+STACK_PROGRAM = [0xA2, 0x0A, 0x8A, 0x48, 0x08, 0x68, 0x28, 0x48, 0xCA, 0xD0, 0xF7]
+
+
+@pytest.mark.parametrize('program', [SUM_PROGRAM, STACK_PROGRAM])
+@pytest.mark.parametrize('jit_enabled', [True, False])
+def test_recompiled_loop(cpu, jit_enabled, program):
+    cpu.jit_enabled = jit_enabled
+    load_program(cpu, 0x0300, program)
+    for i in range(1, 11):
+        cpu.set_memory(i, i)
+
+    end = 0x0300 + len(program)
+    while cpu.pc_reg != end:
+        cpu.execute_block()
+
+    assert any(block.compiled is not None for block in cpu.block_cache.blocks.values()) == jit_enabled
+    interpreted = make_cpu()
+    load_program(interpreted, 0x0300, program)
+    for i in range(1, 11):
+        interpreted.set_memory(i, i)
+    while interpreted.pc_reg != end:
+        interpreted.identify()
+        interpreted.execute()
+
+    assert registers(cpu) == registers(interpreted)
+    assert bytes(cpu.ram.memory) == bytes(interpreted.ram.memory)
+
+
+def test_recompiled_self_modifying_code(cpu):
+    # STX operand of the following LDA through a mirror, LDA #$07, JMP $0300
+    load_program(cpu, 0x0300, [0x8E, 0x04, 0x0B, 0xA9, 0x07, 0x4C, 0x00, 0x03])
+    cpu.x_reg = 0x09
+
+    cpu.execute_block()
+    assert cpu.pc_reg == 0x0303
+
+    cpu.execute_block()
+    assert cpu.a_reg == 0x09
+    assert cpu.pc_reg == 0x0300
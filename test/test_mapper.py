@@ -0,0 +1,154 @@
+from cpu import IrqSource
+from mapper import Mirroring
+from rom import Header, ROM
+from test.conftest import ines_header, make_cpu
+import pytest
+
+
+def numbered_rom(mapper, prg_banks, chr_banks, flags6=0, nes2=False):
+    """
+    every 8KB of prg is filled with its number, every 1KB of chr with its number
+    """
+    prg = b''.join(bytes([i]) * 0x2000 for i in range(prg_banks * 2))
+    chr_data = b''.join(bytes([i]) * 0x0400 for i in range(chr_banks * 8))
+    return ines_header(prg_banks, chr_banks, mapper, flags6, nes2) + prg + chr_data
+
+
+def load(rom_bytes):
+    cpu = make_cpu()
+    rom = ROM(rom_bytes)
+    cpu.load_rom(rom, True)
+    return cpu, rom
+
+
+def prg_banks(cpu):
+    # the 8KB bank showing at $8000, $A000, $C000 and $E000
+    return [cpu.get_memory(address) for address in (0x8000, 0xA000, 0xC000, 0xE000)]
+
+
+def chr_banks(rom):
+    return [rom.mapper.chr_pages[page][0] for page in range(0, 0x20, 4)]
+
+
+def test_ines_header():
+    header = Header.parse(numbered_rom(0x42, 8, 4, flags6=0x03))
+    assert (header.mapper, header.prg_rom_size, header.chr_rom_size) == (0x42, 0x20000, 0x8000)
+    assert (header.mirroring, header.battery, header.nes2) == (Mirroring.vertical, True, False)
+    assert (header.prg_ram_size, header.prg_nvram_size, header.chr_ram_size) == (0, 0x2000, 0)
+
+
+def test_ines_header_ignores_garbage_in_padding():
+    rom = bytearray(numbered_rom(0x41, 1, 0))
+    rom[12:16] = b'Dude'
+    header = Header.parse(rom)
+    assert header.mapper == 0x01
+    assert header.chr_ram_size == 0x2000
+
+
+def test_nes2_header():
+    rom = bytearray(numbered_rom(0x04, 2, 1, nes2=True))
+    rom[8] = 0x31
+    rom[9] = 0x10
+    rom[10] = 0x70
+    header = Header.parse(rom)
+    assert (header.mapper, header.submapper, header.nes2) == (0x104, 3, True)
+    assert (header.prg_rom_size, header.chr_rom_size) == (0x8000, 0x202000)
+    assert (header.prg_ram_size, header.prg_nvram_size) == (0, 0x2000)
+
+
+def test_not_a_rom():
+    with pytest.raises(Exception, match='Not an iNES rom'):
+        ROM(bytes(16))
+
+
+def test_unsupported_mapper():
+    with pytest.raises(Exception, match='Mapper 5 is not supported'):
+        ROM(numbered_rom(5, 2, 1))
+
+
+def test_nrom_mirrors_16kb():
+    cpu, rom = load(numbered_rom(0, 1, 1))
+    assert prg_banks(cpu) == [0, 1, 0, 1]
+    with pytest.raises(Exception, match='Trying to write to Read only Memory'):
+        cpu.set_memory(0x8000, 0)
+
+
+def test_banks_are_views_of_the_rom():
+    cpu, rom = load(numbered_rom(2, 4, 0))
+    assert all(page.obj is rom.prg_bytes.obj for page in rom.mapper.prg_pages)
+    assert cpu.bus.read_pages[0x80].obj is rom.prg_bytes.obj
+
+
+def test_uxrom():
+    cpu, rom = load(numbered_rom(2, 4, 0))
+    assert prg_banks(cpu) == [0, 1, 6, 7]
+    cpu.set_memory(0x8000, 2)
+    assert prg_banks(cpu) == [4, 5, 6, 7]
+    # blocks are keyed by the bank they were decoded from
+    assert cpu.bus.physical_pages[0x80] == 0x40 * 4 // 2
+
+
+def test_cnrom():
+    cpu, rom = load(numbered_rom(3, 2, 4))
+    cpu.set_memory(0x8000, 3)
+    assert chr_banks(rom) == [24, 25, 26, 27, 28, 29, 30, 31]
+
+
+def mmc1_write(cpu, address, value):
+    for bit in range(5):
+        cpu.set_memory(address, (value >> bit) & 1)
+
+
+def test_mmc1():
+    cpu, rom = load(numbered_rom(1, 8, 2))
+    # powers up with the last bank fixed at $C000
+    assert prg_banks(cpu) == [0, 1, 14, 15]
+
+    mmc1_write(cpu, 0xE000, 3)
+    assert prg_banks(cpu) == [6, 7, 14, 15]
+
+    # fix the first bank at $8000, vertical mirroring, 4KB chr banks
+    mmc1_write(cpu, 0x8000, 0x1A)
+    mmc1_write(cpu, 0xA000, 3)
+    mmc1_write(cpu, 0xC000, 1)
+    assert prg_banks(cpu) == [0, 1, 6, 7]
+    assert rom.mapper.mirroring == Mirroring.vertical
+    assert chr_banks(rom) == [12, 13, 14, 15, 4, 5, 6, 7]
+
+    # a write with bit 7 set resets the shift register part way through
+    cpu.set_memory(0x8000, 1)
+    cpu.set_memory(0x8000, 0x80)
+    assert prg_banks(cpu) == [6, 7, 14, 15]
+
+
+def test_mmc3_banks():
+    cpu, rom = load(numbered_rom(4, 8, 8))
+    for register, value in enumerate([4, 10, 20, 21, 22, 23, 3, 5]):
+        cpu.set_memory(0x8000, register)
+        cpu.set_memory(0x8001, value)
+    assert prg_banks(cpu) == [3, 5, 14, 15]
+    assert [rom.mapper.chr_pages[page][0] for page in range(0, 0x20, 4)] == [4, 5, 10, 11, 20, 21, 22, 23]
+
+    # swap the prg banks at $8000 and $C000 and the chr halves
+    cpu.set_memory(0x8000, 0xC0)
+    assert prg_banks(cpu) == [14, 5, 3, 15]
+    assert chr_banks(rom) == [20, 21, 22, 23, 4, 5, 10, 11]
+
+    cpu.set_memory(0xA000, 1)
+    assert rom.mapper.mirroring == Mirroring.horizontal
+
+
+def test_mmc3_irq():
+    cpu, rom = load(numbered_rom(4, 2, 1))
+    cpu.set_memory(0xC000, 2)
+    cpu.set_memory(0xC001, 0)
+    cpu.set_memory(0xE001, 0)
+
+    rom.mapper.clock_scanline()
+    rom.mapper.clock_scanline()
+    assert not cpu.irq_sources
+    rom.mapper.clock_scanline()
+    assert cpu.irq_sources == IrqSource.mapper
+
+    cpu.set_memory(0xE000, 0)
+    assert not cpu.irq_sources
@@ -0,0 +1,46 @@
+from test.conftest import make_rom
+import pytest
+
+
+def test_ram_mirrors(cpu):
+    cpu.set_memory(0x0012, 0x34)
+    for mirror in (0x0812, 0x1012, 0x1812):
+        assert cpu.get_memory(mirror) == 0x34
+
+    cpu.set_memory(0x1FFF, 0x56)
+    assert cpu.get_memory(0x07FF) == 0x56
+
+
+def test_ppu_register_mirrors(cpu):
+    cpu.set_memory(0x3FFE, 0x78)
+    assert cpu.ppu.get_memory()[6] == 0x78
+    assert cpu.get_memory(0x2006) == 0x78
+
+
+def test_rom_pages(cpu):
+    prg = bytearray(0x4000)
+    prg[0x0000] = 0xAB
+    prg[0x3FFC:0x3FFE] = bytes([0x00, 0xC0])
+    cpu.load_rom(make_rom(prg), False)
+
+    # a single 16KB block shows up at both $8000 and $C000
+    assert cpu.get_memory(0x8000) == 0xAB
+    assert cpu.get_memory(0xC000) == 0xAB
+    assert cpu.pc_reg == 0xC000
+
+
+@pytest.mark.parametrize('location', [0x6000, 0x4020, 0x40FF])
+def test_unmapped_memory(cpu, location):
+    with pytest.raises(Exception, match='Cannot find memory owner'):
+        cpu.get_memory(location)
+    with pytest.raises(Exception, match='Cannot find memory owner'):
+        cpu.set_memory(location, 0x01)
+
+
+def test_stack_wraps_around_page_one(cpu):
+    cpu.sp_reg = 0x00
+    cpu.stack_push(0x1234, 2)
+    assert cpu.get_memory(0x0100) == 0x12
+    assert cpu.get_memory(0x01FF) == 0x34
+    assert cpu.stack_pop(2) == 0x1234
+    assert cpu.sp_reg == 0x00
@@ -0,0 +1,102 @@
+from ppu import DOTS_PER_FRAME, VBLANK_START_DOT
+from test.conftest import make_nes, make_prg
+import pytest
+
+
+def program_nes(program, nmi_handler=(0x40,)):
+    # program at $8000, nmi handler at $8100
+    return make_nes(make_prg({0x0000: program, 0x0100: nmi_handler}, nmi=0x8100))
+
+
+# LDA #$80, STA $2000, loop: JMP loop
+NMI_PROGRAM = [0xA9, 0x80, 0x8D, 0x00, 0x20, 0x4C, 0x05, 0x80]
+# INC $10, RTI
+COUNT_HANDLER = [0xE6, 0x10, 0x40]
+# wait: BIT $2002, BPL wait, INC $10, JMP wait
+POLL_PROGRAM = [0x2C, 0x02, 0x20, 0x10, 0xFB, 0xE6, 0x10, 0x4C, 0x00, 0x80]
+
+
+def test_run_cycles_keeps_ppu_in_step():
+    nes = program_nes(NMI_PROGRAM)
+    nes.run_cycles(1000)
+    assert nes.ppu.dots == nes.cpu.cycles * 3
+    assert nes.apu.cycles == nes.cpu.cycles
+    assert 1000 <= nes.cpu.cycles < 1003
+
+
+def test_run_frame_vblank_nmi():
+    nes = program_nes(NMI_PROGRAM, COUNT_HANDLER)
+    for frame in range(1, 4):
+        assert nes.run_frame() == frame
+        assert nes.ram.memory[0x10] == frame
+        assert nes.ppu.frame_start == frame * DOTS_PER_FRAME
+        assert nes.ppu.scanline == 0
+        assert nes.cpu.cycles * 3 - nes.ppu.frame_start < 3 + 7 * 3
+
+
+def test_vblank_polling():
+    nes = program_nes(POLL_PROGRAM)
+    nes.run_frame()
+    nes.run_frame()
+    assert nes.ram.memory[0x10] == 2
+
+
+def test_vblank_flag_cleared_by_read():
+    nes = program_nes(NMI_PROGRAM)
+    nes.run_cycles(VBLANK_START_DOT // 3 + 1)
+    assert nes.ppu.memory[2] & 0x80
+    assert nes.cpu.get_memory(0x2002) & 0x80
+    assert not nes.cpu.get_memory(0x2002) & 0x80
+
+
+def test_ppu_catches_up_on_access():
+    nes = program_nes(NMI_PROGRAM)
+    # the cpu runs past the start of vblank without the ppu
+    nes.cpu.cycles = VBLANK_START_DOT // 3 + 1
+    assert nes.ppu.dots < VBLANK_START_DOT
+    assert nes.cpu.get_memory(0x2002) & 0x80
+    assert nes.ppu.dots == nes.cpu.cycles * 3
+
+
+@pytest.mark.parametrize('jit', [False, True])
+def test_oam_dma(jit):
+    # LDA #$02, STA $4014, loop: JMP loop
+    nes = program_nes([0xA9, 0x02, 0x8D, 0x14, 0x40, 0x4C, 0x05, 0x80])
+    nes.cpu.jit_enabled = jit
+    nes.ram.memory[0x200:0x300] = bytes(range(0x100))
+    nes.ppu.memory[3] = 0x10
+    start = nes.cpu.cycles
+    nes.cpu.run(max_instructions=2)
+    # copied starting at OAMADDR, the cpu stalls 513 cycles and one more starting on an odd one
+    assert nes.ppu.oam == bytes(range(0xF0, 0x100)) + bytes(range(0xF0))
+    assert nes.cpu.cycles - start == 2 + 4 + 513 + ((start + 2) & 1)
+
+
+@pytest.mark.parametrize('jit', [False, True])
+def test_nmi_enabled_in_vblank_is_taken_straight_away(jit):
+    # loop: JMP loop, at $8003 LDA #$80, STA $2000, INX four times, JMP loop, the nmi handler stores x
+    nes = program_nes([0x4C, 0x00, 0x80, 0xA9, 0x80, 0x8D, 0x00, 0x20, 0xE8, 0xE8, 0xE8, 0xE8, 0x4C, 0x00, 0x80],
+                      [0x86, 0x10, 0x4C, 0x02, 0x81])
+    nes.cpu.jit_enabled = jit
+    nes.cpu.recompiler.threshold = 1
+    nes.ram.memory[0x10] = 0xFF
+    nes.run_cycles(VBLANK_START_DOT // 3 + 1)
+    nes.cpu.pc_reg = 0x8003
+    nes.cpu.run(max_cycles=100)
+    assert nes.ram.memory[0x10] == 0
+
+
+def test_mmc3_scanline_irq():
+    # LDA #$18, STA $2001, LDA #$0A, STA $C000, STA $C001, STA $E001, CLI, loop: JMP loop
+    program = [0xA9, 0x18, 0x8D, 0x01, 0x20, 0xA9, 0x0A, 0x8D, 0x00, 0xC0, 0x8D, 0x01, 0xC0, 0x8D, 0x01, 0xE0,
+               0x58, 0x4C, 0x11, 0x80]
+    # irq handler: STA $E000, INC $10, RTI
+    handler = [0x8D, 0x00, 0xE0, 0xE6, 0x10, 0x40]
+    nes = make_nes(make_prg({0x0000: program, 0x0100: handler}, size=0x8000, irq=0x8100), mapper=4)
+
+    # the counter is loaded on scanline 0 and gets to 0 at dot 260 of scanline 10
+    nes.run_cycles((10 * 341 + 260) // 3 - 10)
+    assert nes.ram.memory[0x10] == 0
+    nes.run_cycles(40)
+    assert nes.ram.memory[0x10] == 1
+    assert not nes.cpu.irq_sources
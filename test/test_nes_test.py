@@ -0,0 +1,72 @@
+import io
+import os
+
+from nes_test import NesTestLog, read_log, run_log
+from test.conftest import load_program, make_cpu
+from tracing import TextTrace
+import pytest
+
+
+# LDX #$08, loop: TXA, ADC $10,X, STA $0200,X, DEX, BNE loop, JMP $0300
+PROGRAM = [0xA2, 0x08, 0x8A, 0x75, 0x10, 0x9D, 0x00, 0x02, 0xCA, 0xD0, 0xF7, 0x4C, 0x00, 0x03]
+
+
+def program_cpu():
+    c = make_cpu()
+    load_program(c, 0x0300, PROGRAM)
+    return c
+
+
+@pytest.fixture()
+def log_lines():
+    output = io.StringIO()
+    c = program_cpu()
+    c.tracer = TextTrace(output)
+    c.run(max_instructions=100)
+    return output.getvalue().splitlines(keepends=True)
+
+
+def write_log(tmp_path, lines):
+    path = str(tmp_path / 'test_log.log')
+    with open(path, 'w') as log_file:
+        log_file.writelines(lines)
+    return path
+
+
+@pytest.mark.parametrize('chunk_lines', [7, 0x1000])
+def test_log_matches(tmp_path, log_lines, chunk_lines):
+    log_path = write_log(tmp_path, log_lines)
+    assert run_log(program_cpu(), log_path, str(tmp_path / 'trace.npy'), chunk_lines) is None
+
+    # the parsed log was cached and is read back from there
+    assert os.path.exists(log_path + '.npy')
+    assert sum(len(chunk) for chunk in read_log(log_path, chunk_lines)) == len(log_lines)
+    assert run_log(program_cpu(), log_path, str(tmp_path / 'trace.npy'), chunk_lines) is None
+
+
+@pytest.mark.parametrize('field, replaced, replacement', [
+    ('a', 'A:', 'A:FF X:'),
+    ('cyc', 'CYC:', 'CYC:340'),
+])
+def test_first_divergence(tmp_path, log_lines, field, replaced, replacement):
+    line = log_lines[42]
+    start = line.index(replaced)
+    log_lines[42] = line[:start] + replacement + line[start + len(replacement):]
+    log_path = write_log(tmp_path, log_lines)
+
+    divergence = run_log(program_cpu(), log_path, str(tmp_path / 'trace.npy'), 16)
+    assert divergence.line == 42
+    assert [name for name, _, _ in divergence.fields] == [field]
+    assert str(divergence).startswith('line 42\n')
+
+
+def test_log_line_by_line(log_lines):
+    c = program_cpu()
+    log_lines[3] = log_lines[3].replace('SP:FD', 'SP:FC')
+    log = NesTestLog(log_lines)
+    with pytest.raises(Exception, match='sp: expected 252 got 253'):
+        for _ in range(10):
+            c.identify()
+            log.compare(c)
+            c.run(max_instructions=1)
+    assert log.index == 3
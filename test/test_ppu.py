@@ -0,0 +1,390 @@
+from ppu import DOTS_PER_SCANLINE, VBLANK_START_DOT
+from test.conftest import make_nes, make_prg
+import pytest
+
+
+# loop: JMP loop
+LOOP_PRG = make_prg({0x0000: [0x4C, 0x00, 0x80]})
+
+# at $8010, hit: BIT $2002, BVC hit
+# at $8020, overflow: LDA $2002, AND #$20, BEQ overflow
+POLL_PRG = make_prg({0x0000: [0x4C, 0x00, 0x80], 0x0010: [0x2C, 0x02, 0x20, 0x50, 0xFB],
+                     0x0020: [0xAD, 0x02, 0x20, 0x29, 0x20, 0xF0, 0xF9]})
+
+
+def tiles_nes(mirroring=0x00, prg=LOOP_PRG):
+    """
+    chr rom with tile 1 in colour 1, tile 2 in colour 3, tile 3 in colour 2 on its left half only
+    and tile 4 in colour 1 on its top row only
+    """
+    chr_rom = bytearray(0x2000)
+    chr_rom[0x0010:0x0018] = b'\xFF' * 8
+    chr_rom[0x0020:0x0030] = b'\xFF' * 16
+    chr_rom[0x0038:0x0040] = b'\xF0' * 8
+    chr_rom[0x0040] = 0xFF
+    return make_nes(prg, chr_rom, flags6=mirroring)
+
+
+def write_vram(nes, address, data):
+    nes.cpu.set_memory(0x2006, address >> 8)
+    nes.cpu.set_memory(0x2006, address & 0xFF)
+    for value in data:
+        nes.cpu.set_memory(0x2007, value)
+
+
+def read_vram(nes, address, count):
+    nes.cpu.set_memory(0x2006, address >> 8)
+    nes.cpu.set_memory(0x2006, address & 0xFF)
+    nes.cpu.get_memory(0x2007)
+    return [nes.cpu.get_memory(0x2007) for _ in range(count)]
+
+
+def set_up_screen(nes, scroll_x=0, scroll_y=0, mask=0x0A, ctrl=0x00):
+    write_vram(nes, 0x3F00, [0x0F, 0x01, 0x02, 0x03, 0x0F, 0x11, 0x12, 0x13])
+    # tiles 1, 2, 3 at the top left, then tile 2 a row down, the top left quadrant takes palette 1
+    write_vram(nes, 0x2000, [1, 2, 3])
+    write_vram(nes, 0x2020, [2])
+    write_vram(nes, 0x23C0, [0x01])
+    nes.cpu.set_memory(0x2000, ctrl)
+    nes.cpu.set_memory(0x2005, scroll_x)
+    nes.cpu.set_memory(0x2005, scroll_y)
+    nes.cpu.set_memory(0x2001, mask)
+    # the first frame starts with the address the vram writes left, the next one with the scroll
+    nes.run_frame()
+    nes.run_frame()
+
+
+def test_vram_reads_are_buffered():
+    nes = tiles_nes()
+    write_vram(nes, 0x2100, [0x12, 0x34])
+    write_vram(nes, 0x3F01, [0x25])
+    nes.cpu.set_memory(0x2006, 0x21)
+    nes.cpu.set_memory(0x2006, 0x00)
+    assert nes.cpu.get_memory(0x2007) == 0x00
+    assert nes.cpu.get_memory(0x2007) == 0x12
+    assert nes.cpu.get_memory(0x2007) == 0x34
+
+    # the palette isn't buffered
+    nes.cpu.set_memory(0x2006, 0x3F)
+    nes.cpu.set_memory(0x2006, 0x01)
+    assert nes.cpu.get_memory(0x2007) == 0x25
+
+    # nor is the chr rom writable
+    write_vram(nes, 0x0010, [0x00])
+    assert read_vram(nes, 0x0010, 1) == [0xFF]
+
+
+def test_vram_increment_and_mirroring():
+    nes = tiles_nes()
+    nes.cpu.set_memory(0x2000, 0x04)
+    write_vram(nes, 0x2001, [0xAA, 0xBB])
+    nes.cpu.set_memory(0x2000, 0x00)
+    # horizontal mirroring shows the first nametable at $2400 too
+    assert read_vram(nes, 0x2401, 1) == [0xAA]
+    assert read_vram(nes, 0x2021, 1) == [0xBB]
+
+    write_vram(nes, 0x3F10, [0x30])
+    nes.cpu.set_memory(0x2006, 0x3F)
+    nes.cpu.set_memory(0x2006, 0x00)
+    assert nes.cpu.get_memory(0x2007) == 0x30
+
+    nes = tiles_nes(mirroring=0x01)
+    write_vram(nes, 0x2001, [0xCC])
+    assert read_vram(nes, 0x2801, 1) == [0xCC]
+
+
+def test_background():
+    nes = tiles_nes()
+    set_up_screen(nes)
+    line = nes.ppu.framebuffer[0]
+    assert list(line[0:8]) == [0x11] * 8
+    assert list(line[8:16]) == [0x13] * 8
+    # the next attribute quadrant has palette 0
+    assert list(line[16:24]) == [0x02] * 4 + [0x0F] * 4
+    assert list(line[24:32]) == [0x0F] * 8
+    assert list(nes.ppu.framebuffer[7, 0:8]) == [0x11] * 8
+    assert list(nes.ppu.framebuffer[8, 0:8]) == [0x13] * 8
+    assert (nes.ppu.framebuffer[16:] == 0x0F).all()
+
+
+def test_scroll():
+    nes = tiles_nes()
+    set_up_screen(nes, scroll_x=3, scroll_y=4)
+    line = nes.ppu.framebuffer[0]
+    assert list(line[0:5]) == [0x11] * 5
+    assert list(line[5:13]) == [0x13] * 8
+    assert list(nes.ppu.framebuffer[3, 0:5]) == [0x11] * 5
+    assert list(nes.ppu.framebuffer[4, 0:5]) == [0x13] * 5
+
+    # scrolled a whole screen to the right the second nametable shows, a mirror of the first unless vertical
+    nes = tiles_nes()
+    set_up_screen(nes, ctrl=0x01)
+    assert nes.ppu.framebuffer[0, 0] == 0x11
+    nes = tiles_nes(mirroring=0x01)
+    set_up_screen(nes, ctrl=0x01)
+    assert nes.ppu.framebuffer[0, 0] == 0x0F
+
+
+def test_left_column_and_rendering_off():
+    nes = tiles_nes()
+    set_up_screen(nes, mask=0x08)
+    assert list(nes.ppu.framebuffer[0, 0:9]) == [0x0F] * 8 + [0x13]
+
+    nes = tiles_nes()
+    set_up_screen(nes, mask=0x00)
+    assert (nes.ppu.framebuffer == 0x0F).all()
+
+    # greyscale keeps the brightness of each colour
+    nes = tiles_nes()
+    set_up_screen(nes, mask=0x0B)
+    assert nes.ppu.framebuffer[0, 0] == 0x10
+
+
+def test_mid_frame_write_splits_the_picture():
+    nes = tiles_nes()
+    set_up_screen(nes)
+    # turn the background off halfway through scanline 4, the lines before it stay drawn
+    nes.run_cycles((4 * 341 + 170) // 3 - (nes.ppu.dots - nes.ppu.frame_start) // 3)
+    assert nes.ppu.scanline == 4
+    nes.cpu.set_memory(0x2001, 0x00)
+    nes.run_frame()
+    assert list(nes.ppu.framebuffer[0:6, 0]) == [0x11] * 5 + [0x0F]
+
+
+def test_tiles_are_decoded_once():
+    nes = tiles_nes()
+    set_up_screen(nes)
+    assert not nes.ppu.dirty_tiles.any()
+    assert (nes.ppu.tiles[2] == 3).all()
+    assert list(nes.ppu.tiles[3, 7]) == [2] * 4 + [0] * 4
+
+
+def test_chr_ram_writes_decode_their_tile():
+    nes = make_nes(LOOP_PRG)
+    nes.ppu.pattern_tiles()
+
+    # the high plane of the top row of tile 1
+    write_vram(nes, 0x0018, [0x81])
+    assert list(nes.ppu.dirty_tiles.nonzero()[0]) == [1]
+    assert list(nes.ppu.pattern_tiles()[1, 0]) == [2] + [0] * 6 + [2]
+    assert read_vram(nes, 0x0018, 1) == [0x81]
+
+
+def test_bank_switch_decodes_the_new_tiles():
+    # CNROM with two chr banks, tile 1 is colour 1 in the first and colour 2 in the second
+    prg = make_prg({0x0000: [0x4C, 0x00, 0x80]}, size=0x8000)
+    chr_rom = bytearray(0x4000)
+    chr_rom[0x0010:0x0018] = b'\xFF' * 8
+    chr_rom[0x2018:0x2020] = b'\xFF' * 8
+    nes = make_nes(prg, chr_rom, mapper=3)
+    assert (nes.ppu.pattern_tiles()[1] == 1).all()
+
+    nes.cpu.set_memory(0x8000, 0x01)
+    assert nes.ppu.dirty_tiles.all()
+    assert (nes.ppu.pattern_tiles()[1] == 2).all()
+
+    # a bank already in place changes nothing
+    nes.cpu.set_memory(0x8000, 0x01)
+    assert not nes.ppu.dirty_tiles.any()
+
+
+def set_up_column(nes, ctrl=0x00):
+    """
+    tile 1 down the left column of the first nametable in colour 1, run to the middle of scanline 120 showing it
+    """
+    write_vram(nes, 0x3F00, [0x0F, 0x01, 0x02, 0x03])
+    for row in range(30):
+        write_vram(nes, 0x2000 + row * 32, [1])
+    nes.cpu.set_memory(0x2000, ctrl)
+    nes.cpu.set_memory(0x2005, 0)
+    nes.cpu.set_memory(0x2005, 0)
+    nes.cpu.set_memory(0x2001, 0x0A)
+    nes.run_frame()
+    nes.run_frame()
+    nes.run_cycles((120 * 341 + 170) // 3 - (nes.ppu.dots - nes.ppu.frame_start) // 3)
+    assert nes.ppu.scanline == 120
+
+
+def test_mid_frame_bank_switch_splits_the_picture():
+    # CNROM, tile 1 is colour 1 in the first chr bank and empty in the second
+    prg = make_prg({0x0000: [0x4C, 0x00, 0x80]}, size=0x8000)
+    chr_rom = bytearray(0x4000)
+    chr_rom[0x0010:0x0018] = b'\xFF' * 8
+    nes = make_nes(prg, chr_rom, mapper=3)
+    set_up_column(nes)
+    nes.cpu.set_memory(0x8000, 0x01)
+    nes.run_frame()
+    assert list(nes.ppu.framebuffer[[10, 119, 121, 200], 0]) == [0x01, 0x01, 0x0F, 0x0F]
+
+
+def test_mid_frame_mirroring_switch_splits_the_picture():
+    # MMC3 showing the second nametable, a mirror of the first until $A000 switches to vertical mirroring
+    chr_rom = bytearray(0x2000)
+    chr_rom[0x0010:0x0018] = b'\xFF' * 8
+    nes = make_nes(make_prg({0x0000: [0x4C, 0x00, 0x80]}, size=0x8000), chr_rom, mapper=4)
+    set_up_column(nes, ctrl=0x01)
+    nes.cpu.set_memory(0xA000, 0x00)
+    nes.run_frame()
+    assert list(nes.ppu.framebuffer[[10, 119, 121, 200], 0]) == [0x01, 0x01, 0x0F, 0x0F]
+
+
+def test_writes_that_cant_be_seen_dont_draw():
+    nes = tiles_nes()
+    nes.run_cycles(1000)
+    # with rendering off the nametables and scroll don't show
+    write_vram(nes, 0x2000, [1])
+    nes.cpu.set_memory(0x2005, 0x08)
+    nes.cpu.set_memory(0x2005, 0x08)
+    assert nes.ppu.lines_drawn == 0
+    # the backdrop colour does
+    write_vram(nes, 0x3F00, [0x21])
+    assert nes.ppu.lines_drawn == nes.ppu.scanline + 1
+
+
+def status_at(nes, frame_dot):
+    """
+    read the status with the cpu moved on to a dot of the frame
+    """
+    nes.cpu.cycles = (nes.ppu.frame_start + frame_dot + 2) // 3
+    return nes.cpu.get_memory(0x2002)
+
+
+def test_sprite_zero_hit_is_predicted():
+    nes = tiles_nes()
+    # over the opaque tile 1 at the top left, from scanline 1
+    nes.ppu.oam[0:4] = bytes([0, 1, 0, 4])
+    set_up_screen(nes, mask=0x1E)
+    hit = DOTS_PER_SCANLINE + 5
+    assert not status_at(nes, hit - 3) & 0x40
+    assert status_at(nes, hit) & 0x40
+    # polling drew nothing
+    assert nes.ppu.lines_drawn == 0
+    assert status_at(nes, VBLANK_START_DOT + 3) & 0xC0 == 0xC0
+
+
+def test_sprite_zero_hit_follows_oam_writes():
+    nes = tiles_nes()
+    nes.ppu.oam[0:4] = bytes([0, 1, 0, 4])
+    set_up_screen(nes, mask=0x1E)
+    assert nes.ppu.sprite_zero_hit() == DOTS_PER_SCANLINE + 5
+
+    # over the transparent right half of tile 3, then flipped onto its opaque left half
+    nes.cpu.set_memory(0x2003, 0x02)
+    nes.cpu.set_memory(0x2004, 0x00)
+    nes.cpu.set_memory(0x2004, 20)
+    assert not status_at(nes, VBLANK_START_DOT - 1) & 0x40
+    nes.run_frame()
+    nes.cpu.set_memory(0x2003, 0x02)
+    nes.cpu.set_memory(0x2004, 0x40)
+    nes.cpu.set_memory(0x2004, 17)
+    assert nes.ppu.sprite_zero_hit() == DOTS_PER_SCANLINE + 18
+
+    # no hit in the left 8 pixels while sprites are hidden there
+    nes.cpu.set_memory(0x2003, 0x02)
+    nes.cpu.set_memory(0x2004, 0x00)
+    nes.cpu.set_memory(0x2004, 6)
+    assert nes.ppu.sprite_zero_hit() == DOTS_PER_SCANLINE + 7
+    nes.cpu.set_memory(0x2001, 0x1A)
+    assert nes.ppu.sprite_zero_hit() == DOTS_PER_SCANLINE + 9
+
+
+def test_sprite_zero_hit_on_drawn_scanlines_is_kept():
+    nes = tiles_nes()
+    nes.ppu.oam[0:4] = bytes([0, 1, 0, 4])
+    set_up_screen(nes, mask=0x1E)
+    # the background is turned off after the hit, the scanlines before are drawn with it
+    nes.cpu.cycles = (nes.ppu.frame_start + 100 * DOTS_PER_SCANLINE) // 3 + 1
+    nes.cpu.set_memory(0x2001, 0x14)
+    assert nes.ppu.lines_drawn == 101
+    assert status_at(nes, 101 * DOTS_PER_SCANLINE) & 0x40
+
+
+def set_up_sprites(nes, sprites, mask=0x1E, ctrl=0x00):
+    """
+    sprites as (y, tile, attributes, x), the second sprite palette has colours $21-$23
+    """
+    for index, sprite in enumerate(sprites):
+        nes.ppu.oam[index * 4:index * 4 + 4] = bytes(sprite)
+    nes.ppu.oam[len(sprites) * 4:] = b'\xF0' * (0x100 - len(sprites) * 4)
+    write_vram(nes, 0x3F14, [0x0F, 0x21, 0x22, 0x23])
+    set_up_screen(nes, mask=mask, ctrl=ctrl)
+
+
+def test_sprites():
+    nes = tiles_nes()
+    set_up_sprites(nes, [(20, 1, 0x01, 40), (30, 3, 0x41, 40), (40, 4, 0x81, 40)])
+    assert (nes.ppu.framebuffer[21:29, 40:48] == 0x21).all()
+    assert (nes.ppu.framebuffer[[20, 29], 40:48] == 0x0F).all()
+    # flipped across, then upside down
+    assert list(nes.ppu.framebuffer[31, 40:48]) == [0x0F] * 4 + [0x22] * 4
+    assert list(nes.ppu.framebuffer[41:49, 40]) == [0x0F] * 7 + [0x21]
+
+    # 8x16 sprites take the tile below for their bottom half
+    nes = tiles_nes()
+    set_up_sprites(nes, [(20, 2, 0x01, 40)], ctrl=0x20)
+    assert list(nes.ppu.framebuffer[21:37, 40]) == [0x23] * 8 + [0x22] * 8
+
+    # hidden in the left 8 pixels, or with sprites off
+    nes = tiles_nes()
+    set_up_sprites(nes, [(20, 1, 0x01, 4)], mask=0x1A)
+    assert list(nes.ppu.framebuffer[21, 4:12]) == [0x0F] * 4 + [0x21] * 4
+    nes = tiles_nes()
+    set_up_sprites(nes, [(20, 1, 0x01, 40)], mask=0x0A)
+    assert (nes.ppu.framebuffer[21:29, 40:48] == 0x0F).all()
+
+
+def test_sprite_priority():
+    nes = tiles_nes()
+    set_up_sprites(nes, [
+        # behind the background, over tile 3 at the top left so only its right half shows
+        (0, 2, 0x21, 16),
+        # behind the opaque tile 2 below the top left, hiding the sprite after it that would be in front
+        (7, 1, 0x21, 0), (7, 2, 0x01, 0),
+        # the lower sprite is in front of the other
+        (30, 2, 0x01, 40), (30, 1, 0x01, 40),
+    ])
+    assert list(nes.ppu.framebuffer[1, 16:24]) == [0x02] * 4 + [0x23] * 4
+    assert (nes.ppu.framebuffer[8:16, 0:8] == 0x13).all()
+    assert (nes.ppu.framebuffer[31:39, 40:48] == 0x23).all()
+
+    # over the background in front of it
+    nes = tiles_nes()
+    set_up_sprites(nes, [(0, 2, 0x01, 16)])
+    assert list(nes.ppu.framebuffer[1, 16:24]) == [0x23] * 8
+
+
+def test_sprites_per_line_and_overflow():
+    nes = tiles_nes()
+    # nine sprites side by side, the last isn't shown
+    set_up_sprites(nes, [(20, 1, 0x01, 16 * index) for index in range(9)])
+    assert (nes.ppu.framebuffer[21, 0:128:16] == 0x21).all()
+    assert nes.ppu.framebuffer[21, 128] == 0x0F
+
+    assert not status_at(nes, 21 * DOTS_PER_SCANLINE - 3) & 0x20
+    assert status_at(nes, 21 * DOTS_PER_SCANLINE) & 0x20
+    assert nes.ppu.lines_drawn == 0
+    nes.run_frame()
+    assert not nes.ppu.memory[2] & 0x20
+
+    # eight is fine
+    nes = tiles_nes()
+    set_up_sprites(nes, [(20, 1, 0x01, 16 * index) for index in range(8)])
+    assert not status_at(nes, VBLANK_START_DOT - 1) & 0x20
+
+
+@pytest.mark.parametrize('sprites, loop, end', [
+    # sprite 0 over tile 2 below the top left
+    ([(8, 1, 0x00, 4)], 0x8010, 0x8015),
+    ([(50, 1, 0x00, 16 * index) for index in range(9)], 0x8020, 0x8027),
+])
+def test_polling_loops_stop_at_the_flag(sprites, loop, end):
+    dots = []
+    for skip_idle_loops in (False, True):
+        nes = tiles_nes(prg=POLL_PRG)
+        set_up_sprites(nes, sprites)
+        nes.cpu.skip_idle_loops = skip_idle_loops
+        nes.cpu.pc_reg = loop
+        nes.cpu.run(until_pc=end, max_cycles=30000)
+        assert nes.cpu.pc_reg == end
+        dots.append(nes.current_dot() - nes.ppu.frame_start)
+    assert dots[0] == dots[1] < VBLANK_START_DOT
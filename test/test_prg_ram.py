@@ -0,0 +1,34 @@
+from nes import NES
+from test.conftest import make_prg, make_rom
+
+
+def storing_rom(battery):
+    # LDA #$42, STA $6010, STA $7FFF, loop: JMP loop
+    prg = make_prg({0x0000: [0xA9, 0x42, 0x8D, 0x10, 0x60, 0x8D, 0xFF, 0x7F, 0x4C, 0x08, 0x80]})
+    return make_rom(prg, flags6=0x02 if battery else 0x00)
+
+
+def test_prg_ram_without_battery(tmp_path):
+    save_path = tmp_path / 'game.sav'
+    nes = NES(storing_rom(False), str(save_path))
+    nes.run_cycles(20)
+    assert nes.cpu.get_memory(0x6010) == 0x42
+    nes.close()
+    assert not save_path.exists()
+
+
+def test_battery_ram_is_saved(tmp_path):
+    save_path = tmp_path / 'game.sav'
+    nes = NES(storing_rom(True), str(save_path))
+    # writes go straight into the mapped file
+    assert nes.cpu.bus.write_pages[0x60] is not None
+    nes.run_cycles(20)
+    nes.flush()
+    data = save_path.read_bytes()
+    assert (len(data), data[0x10], data[0x1FFF]) == (0x2000, 0x42, 0x42)
+    nes.close()
+
+    # the next power up starts with the saved ram
+    nes = NES(storing_rom(True), str(save_path))
+    assert nes.cpu.get_memory(0x7FFF) == 0x42
+    nes.close()
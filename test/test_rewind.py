@@ -0,0 +1,94 @@
+from rewind import Rewind
+from test.conftest import make_nes, make_prg
+
+
+def counting_nes():
+    # loop: INC $0300, LDX $0300, INC $10, STX $6000, STA $0500,X, JMP loop
+    program = [0xEE, 0x00, 0x03, 0xAE, 0x00, 0x03, 0xE6, 0x10, 0x8E, 0x00, 0x60, 0x9D, 0x00, 0x05,
+               0x4C, 0x00, 0x80]
+    return make_nes(make_prg({0x0000: program}))
+
+
+def run(rewind, frames):
+    # the full save state after each frame
+    states = {}
+    for _ in range(frames):
+        frame = rewind.run_frame()
+        states[frame] = bytes(rewind.nes.save_state())
+    return states
+
+
+def test_rewind_to_earlier_frames():
+    nes = counting_nes()
+    rewind = Rewind(nes, keyframe_interval=4)
+    states = run(rewind, 10)
+
+    # only pages written since the capture before are kept between keyframes
+    assert [capture.keyframe for capture in rewind.captures][:5] == [True, False, False, False, True]
+    assert rewind.captures[1].size < nes.save_states.size // 4
+
+    assert rewind.rewind(3) == 7
+    assert bytes(nes.save_state()) == states[7]
+    assert len(rewind.captures) == 7
+
+    # carrying on from there captures against the restored state
+    states.update(run(rewind, 3))
+    assert rewind.rewind(2) == 8
+    assert bytes(nes.save_state()) == states[8]
+
+
+def test_ring_drops_oldest_captures():
+    nes = counting_nes()
+    rewind = Rewind(nes, interval=2, keyframe_interval=3, capacity=nes.save_state_layout().size * 5)
+    states = run(rewind, 60)
+
+    assert sum(capture.size for capture in rewind.captures) <= len(rewind.buffer)
+    assert rewind.captures[0].keyframe
+    assert rewind.captures[-1].frame == 60
+
+    # asking for more than there is goes back to the oldest
+    oldest = rewind.captures[0].frame
+    assert oldest > 2
+    assert rewind.rewind(1000) == oldest
+    assert bytes(nes.save_state()) == states[oldest]
+
+
+def test_loading_a_state_makes_a_keyframe():
+    nes = counting_nes()
+    rewind = Rewind(nes)
+    run(rewind, 2)
+    nes.load_state(nes.save_state())
+    run(rewind, 1)
+    assert [capture.keyframe for capture in rewind.captures] == [True, False, True]
+
+
+def test_ring_smaller_than_a_keyframe_interval():
+    nes = counting_nes()
+    rewind = Rewind(nes, keyframe_interval=60, capacity=nes.save_state_layout().size * 2)
+    states = run(rewind, 50)
+
+    # wrapping around dropped the only keyframe, so the ring starts again with one
+    assert rewind.captures[0].keyframe
+    assert rewind.rewind(1) == 49
+    assert bytes(nes.save_state()) == states[49]
+
+
+def test_ppu_writes_mark_their_pages():
+    nes = counting_nes()
+    rewind = Rewind(nes)
+    # only chr ram is compared against a copy
+    assert len(rewind.compared) == 1
+
+    run(rewind, 1)
+    # a nametable byte through PPUDATA and a sprite byte through OAMDATA
+    for address, value in ((0x2006, 0x21), (0x2006, 0x00), (0x2007, 0x5A), (0x2004, 0x77)):
+        nes.cpu.set_memory(address, value)
+    states = run(rewind, 1)
+    nes.cpu.set_memory(0x2006, 0x21)
+    nes.cpu.set_memory(0x2006, 0x00)
+    nes.cpu.set_memory(0x2007, 0xA5)
+    run(rewind, 1)
+
+    assert rewind.rewind(1) == 2
+    assert bytes(nes.save_state()) == states[2]
+    assert (nes.ppu.vram[0x100], nes.ppu.oam[0]) == (0x5A, 0x77)
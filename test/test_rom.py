@@ -0,0 +1,30 @@
+from nes import NES
+from rom import ROM
+from test.conftest import ines_header, make_prg
+import pytest
+
+
+@pytest.fixture()
+def rom_path(tmp_path):
+    # JMP $8000 at the reset vector, 8KB of chr ram
+    path = tmp_path / 'test.nes'
+    path.write_bytes(ines_header(1, 0) + make_prg({0x0000: [0x4C, 0x00, 0x80]}))
+    return str(path)
+
+
+def test_roms_share_the_mapped_file(rom_path):
+    first = ROM.from_file(rom_path)
+    second = ROM.from_file(rom_path)
+    assert first.rom_bytes is second.rom_bytes
+    assert first.prg_bytes.obj is second.prg_bytes.obj
+    assert first.prg_bytes.readonly
+
+    # chr ram is not part of the file, every rom gets its own
+    assert first.chr_bytes.obj is not second.chr_bytes.obj
+
+
+def test_mapped_rom_runs(rom_path):
+    nes = NES(ROM.from_file(rom_path))
+    nes.run_frame()
+    assert nes.cpu.pc_reg == 0x8000
+    assert nes.cpu.bus.read_pages[0x80].obj is nes.rom.rom_bytes
@@ -0,0 +1,79 @@
+from cpu import StopReason
+from test.conftest import load_program, make_cpu
+import pytest
+
+
+# loop: INX, INY, NOP, JMP loop, 2 + 2 + 2 + 3 cycles
+LOOP_PROGRAM = [0xE8, 0xC8, 0xEA, 0x4C, 0x00, 0x03]
+
+
+def test_run_cycle_budget(cpu):
+    load_program(cpu, 0x0300, LOOP_PROGRAM)
+    result = cpu.run(max_cycles=21)
+
+    # stops at the first instruction boundary at or past the budget
+    assert result.reason == StopReason.cycles
+    assert result.cycles == 22
+    assert result.instructions == 10
+    assert (cpu.x_reg, cpu.y_reg, cpu.pc_reg) == (3, 3, 0x0302)
+    assert result.pc_reg == cpu.pc_reg
+
+
+def test_run_until_pc(cpu):
+    load_program(cpu, 0x0300, LOOP_PROGRAM)
+    result = cpu.run(until_pc=0x0302)
+    assert result.reason == StopReason.pc
+    assert (result.instructions, cpu.x_reg, cpu.pc_reg) == (2, 1, 0x0302)
+
+    # continuing from the breakpoint runs once around the loop
+    result = cpu.run(until_pc=0x0302)
+    assert (result.instructions, cpu.x_reg, cpu.pc_reg) == (4, 2, 0x0302)
+
+
+@pytest.mark.parametrize('jit_enabled', [True, False])
+def test_run_max_instructions(cpu, jit_enabled):
+    cpu.jit_enabled = jit_enabled
+    cpu.recompiler.threshold = 1
+    load_program(cpu, 0x0300, LOOP_PROGRAM)
+    result = cpu.run(max_instructions=4001)
+    assert result.reason == StopReason.instructions
+    assert (result.instructions, result.cycles) == (4001, 1000 * 9 + 2)
+    assert (cpu.x_reg, cpu.y_reg, cpu.pc_reg) == (1001 & 0xFF, 1000 & 0xFF, 0x0301)
+
+
+@pytest.mark.parametrize('program, idle', [
+    # LDA $2002, BPL loop
+    ([0xAD, 0x02, 0x20, 0x10, 0xFB], True),
+    # JMP loop
+    ([0x4C, 0x00, 0x03], True),
+    # LDA $10, BEQ loop
+    ([0xA5, 0x10, 0xF0, 0xFC], True),
+    # LDA $4016, BEQ loop, reading the controller is not idle
+    ([0xAD, 0x16, 0x40, 0xF0, 0xFB], False),
+    # INX, BNE loop, JMP loop, changes the registers every time round
+    ([0xE8, 0xD0, 0xFD, 0x4C, 0x00, 0x03], True),
+])
+@pytest.mark.parametrize('limits', [{'max_cycles': 100003}, {'max_instructions': 12345}])
+def test_run_skips_idle_loops(cpu, program, idle, limits):
+    load_program(cpu, 0x0300, program)
+    assert cpu.block_cache.lookup(0x0300).idle == idle
+
+    results = []
+    for skip_idle_loops in (False, True):
+        c = make_cpu()
+        c.skip_idle_loops = skip_idle_loops
+        load_program(c, 0x0300, program)
+        result = c.run(**limits)
+        results.append((result, c.a_reg, c.x_reg, c.y_reg, c.sp_reg, c.status_reg.to_int(), c.cycles))
+    assert results[0] == results[1]
+
+
+def test_idle_loop_runs_few_blocks(cpu, monkeypatch):
+    load_program(cpu, 0x0300, [0xAD, 0x02, 0x20, 0x10, 0xFB])
+    blocks = []
+    run_block = cpu.run_block
+    monkeypatch.setattr(cpu, 'run_block', lambda block: blocks.append(block) or run_block(block))
+
+    result = cpu.run(max_cycles=1000000)
+    assert result.cycles >= 1000000
+    assert len(blocks) < 5
@@ -0,0 +1,75 @@
+from test.conftest import make_nes, make_prg
+
+
+def uxrom_nes():
+    """
+    UxROM with chr ram, the program counts in ram, switches banks and runs a routine it copies into ram
+    """
+    # loop: INC $10, LDA $10, STA $8000, STA $6000, STA $0301, JSR $0300, JMP loop
+    program = [0xE6, 0x10, 0xA5, 0x10, 0x8D, 0x00, 0x80, 0x8D, 0x00, 0x60, 0x8D, 0x01, 0x03, 0x20, 0x00, 0x03,
+               0x4C, 0x00, 0xC0]
+    # reset: copy LDX #$00, RTS to $0300, JMP loop
+    reset = [0xA9, 0xA2, 0x8D, 0x00, 0x03, 0xA9, 0x60, 0x8D, 0x02, 0x03, 0x4C, 0x00, 0xC0]
+    return make_nes(make_prg({0xC000: program, 0xC100: reset}, size=0x10000, reset=0xC100), mapper=2)
+
+
+def machine(nes):
+    return (nes.cpu.get_state(), nes.ppu.get_state(), nes.rom.mapper.get_state(), bytes(nes.ram.memory),
+            bytes(nes.prg_ram.memory))
+
+
+def test_restore_runs_the_same():
+    nes = uxrom_nes()
+    nes.run_frame()
+    state = nes.save_state()
+    assert len(state) == nes.save_states.size
+
+    nes.run_cycles(10000)
+    after = machine(nes)
+    assert nes.ram.memory[0x0301] != state[nes.save_states.struct.size + 0x0301]
+
+    # the routine in ram was changed after it was decoded, restoring has to drop it
+    nes.load_state(state)
+    assert nes.cpu.status_reg.to_int() == state[6]
+    nes.run_cycles(10000)
+    assert machine(nes) == after
+
+
+def test_restore_into_another_machine():
+    nes = uxrom_nes()
+    nes.run_cycles(5000)
+    buffer = nes.save_state()
+
+    other = uxrom_nes()
+    other.load_state(buffer)
+    assert machine(other) == machine(nes)
+    assert other.cpu.bus.physical_pages[0x80] == nes.cpu.bus.physical_pages[0x80]
+
+    nes.run_frame()
+    other.run_frame()
+    assert machine(other) == machine(nes)
+
+
+def test_save_into_preallocated_buffer():
+    nes = uxrom_nes()
+    buffer = nes.save_state()
+    nes.run_cycles(1000)
+    assert nes.save_state(buffer) is buffer
+    assert bytes(buffer) == bytes(nes.save_state())
+
+
+def test_restore_drops_code_decoded_from_ram():
+    nes = uxrom_nes()
+    # LDX #$05, JMP $0300
+    for i, value in enumerate([0xA2, 0x05, 0x4C, 0x00, 0x03]):
+        nes.cpu.set_memory(0x0300 + i, value)
+    nes.cpu.pc_reg = 0x0300
+    state = nes.save_state()
+
+    nes.cpu.set_memory(0x0301, 0x07)
+    nes.run_cycles(100)
+    assert nes.cpu.x_reg == 0x07
+
+    nes.load_state(state)
+    nes.run_cycles(100)
+    assert nes.cpu.x_reg == 0x05
@@ -0,0 +1,42 @@
+from scheduler import Scheduler
+
+
+def test_events_run_in_cycle_order():
+    scheduler = Scheduler()
+    fired = []
+    scheduler.schedule('dma', 30, lambda cycle: fired.append(('dma', cycle)))
+    scheduler.schedule('nmi', 10, lambda cycle: fired.append(('nmi', cycle)))
+    scheduler.schedule('irq', 10, lambda cycle: fired.append(('irq', cycle)))
+    assert scheduler.deadline == 10
+
+    assert scheduler.run_due(20) == 2
+    assert fired == [('nmi', 10), ('irq', 10)]
+    assert scheduler.deadline == 30
+
+
+def test_reschedule_and_cancel():
+    scheduler = Scheduler()
+    fired = []
+    scheduler.schedule('nmi', 10, fired.append)
+    scheduler.schedule('nmi', 50, fired.append)
+    scheduler.schedule('irq', 20, fired.append)
+    scheduler.cancel('irq')
+    assert scheduler.deadline == 50
+    assert not scheduler.is_scheduled('irq')
+
+    scheduler.run_due(100)
+    assert fired == [50]
+    assert scheduler.deadline == float('inf')
+
+
+def test_callbacks_can_schedule_due_events():
+    scheduler = Scheduler()
+    fired = []
+
+    def first(cycle):
+        fired.append(cycle)
+        scheduler.schedule('second', cycle + 5, fired.append)
+
+    scheduler.schedule('first', 10, first)
+    scheduler.run_due(15)
+    assert fired == [10, 15]
@@ -0,0 +1,45 @@
+from instructions.base_instructions import Bit, Lda
+from instructions.stack_instructions import Txs
+from status import Status
+
+
+def test_start_up_value():
+    assert Status().to_int() == 0x24
+
+
+def test_negative_and_zero_follow_last_result():
+    status = Status()
+    status.update(Lda, 0x80)
+    assert status.negative is True
+    assert status.zero is False
+    assert status.to_int() == 0xA4
+
+    status.update(Lda, 0x100)
+    assert status.negative is False
+    assert status.zero is True
+    assert status.to_int() == 0x26
+
+
+def test_bit_takes_negative_and_overflow_from_operand():
+    status = Status()
+    status.zero = True
+    status.update(Bit, 0xC0)
+    assert status.to_int() == 0xE6
+
+
+def test_instructions_without_flags_leave_status():
+    status = Status()
+    status.update(Lda, 0)
+    status.update(Txs, 0x80)
+    assert status.to_int() == 0x26
+
+
+def test_from_int_ignores_bits():
+    status = Status()
+    status.from_int(0xFF, [4, 5])
+    assert status.to_int() == 0xEF
+    assert status.status_of_flag(Status.StatusTypes.zero) is True
+    assert status.status_of_flag(Status.StatusTypes.negative) is True
+
+    status.from_int(0x00, [4, 5])
+    assert status.to_int() == 0x20
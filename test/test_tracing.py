@@ -0,0 +1,92 @@
+import io
+
+from test.conftest import load_program
+from tracing import BinaryTrace, CallbackTrace, TextTrace, TraceSink, read_trace, trace_lines
+import pytest
+
+
+def test_text_trace(cpu):
+    # JMP $0305, NOP, LDA #$01, PHA, BNE $0305
+    load_program(cpu, 0x0300, [0x4C, 0x05, 0x03, 0xEA, 0xEA, 0xA9, 0x01, 0x48, 0xD0, 0xFB])
+    output = io.StringIO()
+    cpu.tracer = TextTrace(output)
+    cpu.run(max_instructions=4)
+
+    assert output.getvalue().splitlines() == [
+        '0300  4C 05 03  JMP $0305                       A:00 X:00 Y:00 P:24 SP:FD CYC:  0',
+        '0305  A9 01     LDA #$01                        A:00 X:00 Y:00 P:24 SP:FD CYC:  9',
+        '0307  48        PHA                             A:01 X:00 Y:00 P:24 SP:FD CYC: 15',
+        '0308  D0 FB     BNE $0305                       A:01 X:00 Y:00 P:24 SP:FC CYC: 24',
+    ]
+
+
+def test_text_trace_of_an_undefined_opcode(cpu):
+    # NOP, then 0x02, a jam opcode with no instruction behind it
+    load_program(cpu, 0x0300, [0xEA, 0x02])
+    output = io.StringIO()
+    cpu.tracer = TextTrace(output)
+    with pytest.raises(Exception, match='Instruction not found: 02'):
+        cpu.run(max_instructions=2)
+
+    assert output.getvalue().splitlines()[-1] == \
+        '0301  02        UND                             A:00 X:00 Y:00 P:24 SP:FD CYC:  6'
+
+
+def test_sink_without_trace_cant_be_made():
+    class Sink(TraceSink):
+        pass
+
+    with pytest.raises(TypeError):
+        Sink()
+
+
+def test_callback_trace(cpu, capsys):
+    # LDX #$03, loop: DEX, BNE loop
+    load_program(cpu, 0x0300, [0xA2, 0x03, 0xCA, 0xD0, 0xFD])
+    traced = []
+    cpu.tracer = CallbackTrace(lambda c, pc_reg, opcode, data_bytes: traced.append(pc_reg))
+    result = cpu.run(until_pc=0x0305)
+
+    assert traced == [0x0300] + [0x0302, 0x0303] * 3
+    assert result.instructions == len(traced)
+
+    # nothing is printed while running
+    assert capsys.readouterr().out == ''
+
+
+@pytest.mark.parametrize('buffer_records, file_records', [(0x100, 0x1000), (3, 4)])
+def test_binary_trace(cpu, tmp_path, buffer_records, file_records):
+    # LDX #$20, loop: TXA, PHA, STA $10,X, DEX, BNE loop
+    program = [0xA2, 0x20, 0x8A, 0x48, 0x95, 0x10, 0xCA, 0xD0, 0xF9]
+    path = str(tmp_path / 'trace.npy')
+    load_program(cpu, 0x0300, program)
+    cpu.tracer = BinaryTrace(path, buffer_records, file_records)
+    result = cpu.run(until_pc=0x0309)
+    cpu.tracer.close()
+
+    load_program(cpu, 0x0300, program)
+    cpu.start_up()
+    cpu.pc_reg = 0x0300
+    output = io.StringIO()
+    cpu.tracer = TextTrace(output)
+    cpu.run(until_pc=0x0309)
+
+    records = read_trace(path)
+    assert len(records) == result.instructions
+    assert records['pc'][-1] == 0x0307
+    assert (records['opcode'][:2] == [0xA2, 0x8A]).all()
+    assert list(trace_lines(records, cpu.opcodes)) == output.getvalue().splitlines()
+
+
+def test_binary_trace_of_an_undefined_opcode(cpu, tmp_path):
+    # NOP, then 0x02, a jam opcode with no instruction behind it
+    path = str(tmp_path / 'trace.npy')
+    load_program(cpu, 0x0300, [0xEA, 0x02])
+    cpu.tracer = BinaryTrace(path)
+    with pytest.raises(Exception, match='Instruction not found: 02'):
+        cpu.run(max_instructions=2)
+    cpu.tracer.close()
+
+    records = read_trace(path)
+    assert list(records['opcode']) == [0xEA, 0x02]
+    assert list(trace_lines(records, cpu.opcodes))[-1].startswith('0301  02        UND')
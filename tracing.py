@@ -0,0 +1,221 @@
+from typing import Callable, Iterator, List, TextIO
+from abc import abstractmethod, ABC
+import struct
+
+import numpy as np
+
+from addressing import ImmediateReadAddressing, ZeroPageAddressing, ZeroPageAddressingWithX, \
+    ZeroPageAddressingWithY, AbsoluteAddressing, AbsoluteAddressingXOffset, AbsoluteAddressingYOffset, \
+    IndirectAddressing, IndirectAddressingWithX, IndirectAddressingWithY, AccumulatorAdressing, RelativeAddressing
+from instructions.base_instructions import Lax, Sax, Dcp, Isb, Slo, Rla, Rra, Sre, Nop, Sbc
+
+"""
+  trace sinks get every instruction the cpu runs, before it runs
+
+  a sink is attached with cpu.tracer = sink, while it is None the cpu runs whole blocks and
+  recompiled code without looking at it
+"""
+
+# one record of a binary trace, the data bytes are zero padded
+TRACE_DTYPE = np.dtype([
+    ('pc', '<u2'),
+    ('opcode', 'u1'),
+    ('data', 'u1', (2,)),
+    ('a', 'u1'),
+    ('x', 'u1'),
+    ('y', 'u1'),
+    ('p', 'u1'),
+    ('sp', 'u1'),
+    ('cycles', '<u8'),
+])
+TRACE_STRUCT = struct.Struct('<HB2sBBBBBQ')
+
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+
+# how nestest writes the operand of each addressing mode
+OPERAND_FORMATS = {
+    ImmediateReadAddressing: '#${:02X}',
+    ZeroPageAddressing: '${:02X}',
+    ZeroPageAddressingWithX: '${:02X},X',
+    ZeroPageAddressingWithY: '${:02X},Y',
+    AbsoluteAddressing: '${:04X}',
+    AbsoluteAddressingXOffset: '${:04X},X',
+    AbsoluteAddressingYOffset: '${:04X},Y',
+    IndirectAddressing: '(${:04X})',
+    IndirectAddressingWithX: '(${:02X},X)',
+    IndirectAddressingWithY: '(${:02X}),Y',
+    AccumulatorAdressing: 'A',
+}
+
+
+def is_unofficial(opcode: 'cpu.Opcode') -> bool:
+    """
+    opcodes outside the documented instruction set, nestest marks them with a *
+    """
+    instruction = opcode.instruction
+    if issubclass(instruction, (Lax, Sax, Dcp, Isb, Slo, Rla, Rra, Sre)):
+        return True
+    if issubclass(instruction, Nop):
+        return instruction.identifier_byte != bytes([0xEA])
+    return issubclass(instruction, Sbc) and instruction.identifier_byte == bytes([0xEB])
+
+
+def disassemble(opcode: 'cpu.Opcode', pc_reg: int, data_bytes: bytes) -> str:
+    """
+    the mnemonic and operand of an instruction
+    example: JMP $C5F5
+    """
+    mnemonic = opcode.instruction.__name__[:3].upper()
+    if issubclass(opcode.instruction, RelativeAddressing):
+        offset = data_bytes[0] - 0x100 if data_bytes[0] & 0x80 else data_bytes[0]
+        return '{} ${:04X}'.format(mnemonic, (pc_reg + 2 + offset) & 0xFFFF)
+
+    operand_format = OPERAND_FORMATS.get(opcode.addressing)
+    if operand_format is None:
+        return mnemonic
+    return '{} {}'.format(mnemonic, operand_format.format(int.from_bytes(data_bytes, byteorder='little')))
+
+
+def ppu_dot(cycles: int) -> int:
+    """
+    the dot along the scanline nestest logs as CYC, three to a cpu cycle and 341 to a line
+    """
+    return (cycles * 3) % 341
+
+
+def format_line(pc_reg: int, opcode: 'cpu.Opcode', data_bytes: bytes, a_reg: int, x_reg: int, y_reg: int,
+                status: int, sp_reg: int, dot: int) -> str:
+    """
+    a nestest log line
+    example: C000  4C F5 C5  JMP $C5F5                       A:00 X:00 Y:00 P:24 SP:FD CYC:  0
+    """
+    instruction_bytes = ' '.join('{:02X}'.format(b) for b in bytes([opcode.identifier_byte]) + data_bytes)
+    return '{:04X}  {:<9}{}{:<32}A:{:02X} X:{:02X} Y:{:02X} P:{:02X} SP:{:02X} CYC:{:>3}'.format(
+        pc_reg, instruction_bytes, '*' if is_unofficial(opcode) else ' ', disassemble(opcode, pc_reg, data_bytes),
+        a_reg, x_reg, y_reg, status, sp_reg, dot)
+
+
+class TraceSink(ABC):
+    """
+    receives each instruction before the cpu runs it, pc_reg is the address of its opcode,
+    opcode.identifier_byte the byte fetched there
+    """
+    @abstractmethod
+    def trace(self, cpu: 'cpu.CPU', pc_reg: int, opcode: 'cpu.Opcode', data_bytes: bytes):
+        pass
+
+    def close(self):
+        pass
+
+
+class TextTrace(TraceSink):
+    """
+    writes nestest style lines to a text file
+    """
+    def __init__(self, file: TextIO):
+        self.file = file
+
+    def trace(self, cpu: 'cpu.CPU', pc_reg: int, opcode: 'cpu.Opcode', data_bytes: bytes):
+        self.file.write(format_line(pc_reg, opcode, data_bytes, cpu.a_reg, cpu.x_reg, cpu.y_reg,
+                                    cpu.status_reg.to_int(), cpu.sp_reg, ppu_dot(cpu.cycles)) + '\n')
+
+    def close(self):
+        self.file.flush()
+
+
+class CallbackTrace(TraceSink):
+    """
+    hands each instruction to a function
+    """
+    def __init__(self, callback: Callable[['cpu.CPU', int, 'cpu.Opcode', bytes], None]):
+        self.callback = callback
+
+    def trace(self, cpu: 'cpu.CPU', pc_reg: int, opcode: 'cpu.Opcode', data_bytes: bytes):
+        self.callback(cpu, pc_reg, opcode, data_bytes)
+
+
+class BinaryTrace(TraceSink):
+    """
+    records every instruction as a TRACE_DTYPE record in a .npy file
+
+    records are packed into a preallocated buffer and copied in bulk into the memory mapped file,
+    which grows as needed, the header only gets the real record count on close
+    """
+    def __init__(self, path: str, buffer_records: int = 0x10000, file_records: int = 0x100000):
+        self.path = path
+        self.buffer = bytearray(buffer_records * TRACE_DTYPE.itemsize)
+        self.offset = 0
+        self.count = 0
+
+        # leave room for a header with the largest record count there can be
+        self.header_length = len(npy_header(10 ** 19))
+        self.file = open(path, 'w+b')
+        self.file.write(npy_header(0, self.header_length))
+        self.records = None  # type: np.memmap
+        self.grow(file_records)
+
+    def trace(self, cpu: 'cpu.CPU', pc_reg: int, opcode: 'cpu.Opcode', data_bytes: bytes):
+        TRACE_STRUCT.pack_into(self.buffer, self.offset, pc_reg, opcode.identifier_byte, data_bytes,
+                               cpu.a_reg, cpu.x_reg, cpu.y_reg, cpu.status_reg.to_int(), cpu.sp_reg, cpu.cycles)
+        self.offset += TRACE_STRUCT.size
+        if self.offset == len(self.buffer):
+            self.flush()
+
+    def grow(self, file_records: int):
+        if self.records is not None:
+            self.records.flush()
+        self.file.truncate(self.header_length + file_records * TRACE_DTYPE.itemsize)
+        self.records = np.memmap(self.file, dtype=TRACE_DTYPE, mode='r+', offset=self.header_length,
+                                 shape=(file_records,))
+
+    def flush(self):
+        """
+        copy the buffered records into the file
+        """
+        buffered = self.offset // TRACE_DTYPE.itemsize
+        if self.count + buffered > len(self.records):
+            self.grow(max(2 * len(self.records), self.count + buffered))
+        self.records[self.count:self.count + buffered] = np.frombuffer(self.buffer, TRACE_DTYPE, buffered)
+        self.count += buffered
+        self.offset = 0
+
+    def close(self):
+        self.flush()
+        self.records.flush()
+        self.records = None
+        self.file.truncate(self.header_length + self.count * TRACE_DTYPE.itemsize)
+        self.file.seek(0)
+        self.file.write(npy_header(self.count, self.header_length))
+        self.file.close()
+
+
+def npy_header(count: int, length: int = None) -> bytes:
+    """
+    the .npy header of count trace records, padded with spaces to length or to the 64 byte alignment
+    """
+    header = "{{'descr': {!r}, 'fortran_order': False, 'shape': ({},), }}".format(
+        np.lib.format.dtype_to_descr(TRACE_DTYPE), count)
+    if length is None:
+        length = -(-(len(NPY_MAGIC) + 2 + len(header) + 1) // 64) * 64
+    header = header.ljust(length - len(NPY_MAGIC) - 2 - 1) + '\n'
+    return NPY_MAGIC + struct.pack('<H', len(header)) + header.encode('latin1')
+
+
+def read_trace(path: str) -> np.ndarray:
+    """
+    the records of a binary trace, memory mapped
+    """
+    return np.load(path, mmap_mode='r')
+
+
+def trace_lines(records: np.ndarray, opcodes: List['cpu.Opcode']) -> Iterator[str]:
+    """
+    turn binary trace records back into nestest lines, one at a time
+    opcodes is the dispatch table of a cpu
+    """
+    for start in range(0, len(records), 0x10000):
+        for pc_reg, identifier_byte, data, a_reg, x_reg, y_reg, status, sp_reg, cycles in \
+                records[start:start + 0x10000].tolist():
+            opcode = opcodes[identifier_byte]
+            yield format_line(pc_reg, opcode, bytes(data[:opcode.data_length]), a_reg, x_reg, y_reg, status, sp_reg,
+                              ppu_dot(cycles))